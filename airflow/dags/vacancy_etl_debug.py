@@ -0,0 +1,68 @@
+import pendulum
+from datetime import timedelta
+from airflow.operators.python import PythonOperator
+from airflow.providers.common.sql.operators.sql import SQLExecuteQueryOperator
+from airflow.operators.empty import EmptyOperator
+from airflow import DAG
+from functools import partial
+from hh_parsing.core import STEPS, load_core_step
+from hh_parsing.details import load_details
+from hh_parsing.process import load_data
+
+#vacancy_etl with every core step as its own task, for debugging single steps. manual runs only,
+#the stage partition of the run is kept for inspection, drop it with stage.drop_run_partition(run_id)
+default_args = {
+    'owner': 'airflow',
+    'depends_on_past': False,
+    'email': 'a@a.ru',
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 0,
+    'retry_delay': timedelta(minutes=1),
+}
+
+with DAG(dag_id='vacancy_etl_debug',
+         default_args=default_args,
+         start_date=pendulum.datetime(2024, 1, 1, tz=pendulum.timezone('Europe/Moscow')),
+         schedule=None,
+         catchup=False,
+         ) as dag:
+
+    t_start = EmptyOperator(task_id='Start')
+
+    t_prepare_stage = SQLExecuteQueryOperator(
+        task_id = 'prepare_stage',
+        conn_id='postgres_vacancy_db',
+        sql =   """ SELECT stage.create_run_partition(%(run_id)s);
+                    DELETE FROM proc.crawl_checkpoint WHERE run_id = %(run_id)s;""",
+        parameters = {'run_id': '{{ run_id }}'})
+
+    t_load_data = PythonOperator(
+        task_id='load_data',
+        python_callable = partial(load_data, conn_id='postgres_vacancy_db'),
+        op_kwargs = {'replay_from': '{{ dag_run.conf.get("replay_from", "") if dag_run.conf else "" }}',
+                     'replay_to': '{{ dag_run.conf.get("replay_to", "") if dag_run.conf else "" }}'})
+
+    #new and changed vacancies of the run enriched from /vacancies/{id}, nothing is fetched for a replay run
+    t_load_details = PythonOperator(
+        task_id='load_details',
+        python_callable = partial(load_details, conn_id='postgres_vacancy_db'),
+        op_kwargs = {'replay': '{{ "1" if dag_run.conf and (dag_run.conf.get("replay_from") or dag_run.conf.get("replay_to")) else "" }}'})
+
+    t_end = EmptyOperator(task_id='End')
+
+    t_start >> t_prepare_stage >> t_load_data >> t_load_details
+
+    tasks = {}
+    for step in STEPS:
+        tasks[step.name] = PythonOperator(
+            task_id = step.name,
+            python_callable = partial(load_core_step, conn_id='postgres_vacancy_db', name=step.name))
+
+    for step in STEPS:
+        if step.depends:
+            [tasks[dependency] for dependency in step.depends] >> tasks[step.name]
+        else:
+            t_load_details >> tasks[step.name]
+        if not any(step.name in other.depends for other in STEPS):
+            tasks[step.name] >> t_end
@@ -0,0 +1,36 @@
+import pendulum
+from datetime import timedelta, datetime
+from airflow.providers.common.sql.operators.sql import SQLExecuteQueryOperator
+from airflow.operators.empty import EmptyOperator
+from airflow import DAG
+
+default_args = {
+    'owner': 'airflow',
+    'depends_on_past': False,
+    'email': 'a@a.ru',
+    'email_on_failure': False,
+    'email_on_retry': False,
+    'retries': 1,
+    'retry_delay': timedelta(minutes=5),
+}
+
+#monthly partitions of sat_vacancy and the links older than retention go to the archive schema.
+#trigger with {"retention": "6 months"} to keep less
+with DAG(dag_id='vacancy_retention',
+         default_args=default_args,
+         start_date=pendulum.datetime(datetime.now().year, datetime.now().month, 1, tz=pendulum.timezone('Europe/Moscow')),
+         schedule='@monthly',
+         catchup=False,
+         ) as dag:
+
+    t_start = EmptyOperator(task_id='Start')
+
+    t_archive_partitions = SQLExecuteQueryOperator(
+        task_id = 'archive_partitions',
+        conn_id='postgres_vacancy_db',
+        sql =   """ SELECT core.archive_partitions(%(retention)s::interval);""",
+        parameters = {'retention': '{{ dag_run.conf.get("retention", "12 months") if dag_run.conf else "12 months" }}'})
+
+    t_end = EmptyOperator(task_id='End')
+
+    t_start >> t_archive_partitions >> t_end
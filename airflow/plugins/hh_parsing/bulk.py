@@ -0,0 +1,44 @@
+import tempfile
+from datetime import date, datetime
+from hh_parsing.db import executemany_prepared
+
+#buffer stays in memory up to this size, then spills to a temp file
+SPOOL_MAX_SIZE = 64 * 1024 * 1024
+
+#encode one value in postgres COPY text format
+def encode_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, str):
+        return (value.replace('\\', '\\\\')
+                     .replace('\t', '\\t')
+                     .replace('\n', '\\n')
+                     .replace('\r', '\\r'))
+    return str(value)
+
+def encode_row(row):
+    return '\t'.join([encode_value(value) for value in row]) + '\n'
+
+#load rows with COPY ... FROM STDIN
+def copy_rows(cur, table, columns, rows):
+    count = 0
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE, mode='w+', encoding='utf-8') as buf:
+        for row in rows:
+            buf.write(encode_row(row))
+            count += 1
+        buf.seek(0)
+        sql = f"""COPY {table} ({', '.join(columns)}) FROM STDIN"""
+        cur.copy_expert(sql, buf)
+    return count
+
+#load rows with INSERT, one round trip per row of a statement prepared once per session
+def insert_rows(cur, table, columns, rows):
+    rows = list(rows)
+    sql = f"""INSERT INTO {table} ({', '.join(columns)})
+              VALUES ({', '.join(['%s'] * len(columns))})"""
+    executemany_prepared(cur, sql, rows)
+    return len(rows)
@@ -0,0 +1,97 @@
+import gzip
+import json
+import os
+import time
+from datetime import date
+from hh_parsing.db import connection
+from hh_parsing.metrics import Metrics, export_metrics
+from hh_parsing.raw import safe_name
+
+#changes of every run: {CHANGES_DIR}/dt=YYYY-MM-DD/run=<run_id>/changes.ndjson.gz, one json line per core.change_log row.
+#dt is the day of the first change of the run, a file is replaced at once when a run is exported again
+CHANGES_DIR = os.environ.get('HH_CHANGES_DIR', '/opt/airflow/data/changes')
+
+#rows per round trip of the export cursor
+FETCH_SIZE = 10000
+
+#fields of an exported change, vacancy attributes are the current ones of its vacancy
+CHANGE_FIELDS = ('run_id'
+                 , 'entity'
+                 , 'hk'
+                 , 'vacancy_hk'
+                 , 'change_type'
+                 , 'changed_at'
+                 , 'vacancy_id'
+                 , 'vacancy_name'
+                 , 'published_at'
+                 , 'is_open'
+                 , 'type'
+                 , 'grade'
+                 , 'deleted_at')
+
+#changes of the run with their vacancies, read by change_log_run_id_idx and the current satellite index,
+#so an export takes time in proportion to the changes of the run and not to the whole core
+EXPORT_SQL = """SELECT      cl.run_id
+                          , cl.entity
+                          , cl.hk
+                          , cl.vacancy_hk
+                          , cl.change_type
+                          , cl.changed_at
+                          , hv.external_id
+                          , sv.vacancy_name
+                          , sv.published_at
+                          , sv.is_open
+                          , sv.type
+                          , sv.grade
+                          , sv.deleted_at
+                FROM        core.change_log AS cl
+                LEFT JOIN   core.hub_vacancy AS hv ON hv.vacancy_hk = cl.vacancy_hk
+                LEFT JOIN   LATERAL
+                            (   SELECT  s.*
+                                FROM    core.sat_vacancy AS s
+                                WHERE   s.vacancy_hk = cl.vacancy_hk
+                                        AND s.load_end_date IS NULL
+                                LIMIT   1
+                            ) AS sv ON TRUE
+                WHERE       cl.run_id = %s
+                ORDER BY    cl.changed_at, cl.entity;
+             """
+
+def encode_value(value):
+    return value.isoformat() if isinstance(value, date) else str(value)
+
+def first_change_day(conn, run_id):
+    with conn.cursor() as cur:
+        sql = """SELECT min(changed_at)::date
+                 FROM core.change_log
+                 WHERE run_id = %s;
+              """
+        cur.execute(sql, (run_id,))
+        return cur.fetchone()[0] or date.today()
+
+#write the changes of run_id as gzipped ndjson, returns the file path.
+#a run without changes gets an empty file, so consumers can tell it from a run not exported yet
+def export_changes(conn_id, run_id, changes_dir=CHANGES_DIR):
+    metrics = Metrics()
+    start = time.perf_counter()
+    count = 0
+    try:
+        with connection(conn_id) as conn:
+            path = os.path.join(changes_dir, f'dt={first_change_day(conn, run_id):%Y-%m-%d}',
+                                f'run={safe_name(run_id)}', 'changes.ndjson.gz')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            #server side cursor, the changes of a run are never held in memory at once
+            with conn.cursor(name='export_changes') as cur, gzip.open(path + '.tmp', 'wt', encoding='utf-8') as file:
+                cur.itersize = FETCH_SIZE
+                cur.execute(EXPORT_SQL, (run_id,))
+                for row in cur:
+                    file.write(json.dumps(dict(zip(CHANGE_FIELDS, row)), ensure_ascii=False, default=encode_value) + '\n')
+                    count += 1
+            conn.commit()
+            os.replace(path + '.tmp', path)
+        metrics.incr('changes_exported_total', count)
+        print(f'{count} changes exported to {path}')
+        return path
+    finally:
+        metrics.set('task_seconds', time.perf_counter() - start)
+        export_metrics(conn_id, run_id, 'export_changes', metrics)
@@ -0,0 +1,62 @@
+import re
+
+#attributes of a vacancy classified by its title, in the order of the stage.vacancy columns
+CLASS_COLUMNS = ('type', 'grade')
+
+#value of an attribute when no rule matches
+DEFAULTS = {'type': 'Another', 'grade': None}
+
+#titles repeat a lot across pages and runs, results of this many distinct titles are kept
+CACHE_SIZE = 100000
+
+REGEX_CHARS = set('.^$*+?{}[]\\|()')
+
+#a pattern without regex syntax is a plain substring, matched on the case-folded title
+def compile_pattern(pattern):
+    if REGEX_CHARS.isdisjoint(pattern):
+        return pattern.casefold()
+    return re.compile(pattern, re.IGNORECASE)
+
+#title classifier built from proc.vacancy_rules, rules are compiled once per load.
+#for every attribute the first rule in priority order found anywhere in the title wins, like a CASE chain,
+#but case-insensitive, with substring search for plain patterns and results cached per title
+class Classifier:
+    def __init__(self, rules, defaults=DEFAULTS):
+        self.matchers = [(attribute,
+                          [(compile_pattern(pattern), value) for rule_attribute, pattern, value in rules
+                           if rule_attribute == attribute],
+                          defaults.get(attribute))
+                         for attribute in CLASS_COLUMNS]
+        self.cache = {}
+
+    #(type, grade) of a vacancy title
+    def classify(self, title):
+        if title in self.cache:
+            return self.cache[title]
+        folded = (title or '').casefold()
+        result = []
+        for attribute, rules, default in self.matchers:
+            for pattern, value in rules:
+                if pattern in folded if isinstance(pattern, str) else pattern.search(title or ''):
+                    result.append(value)
+                    break
+            else:
+                result.append(default)
+        result = tuple(result)
+        if len(self.cache) >= CACHE_SIZE:
+            self.cache.clear()
+        self.cache[title] = result
+        return result
+
+def get_rules(conn):
+    with conn.cursor() as cur:
+        sql = """SELECT attribute, pattern, value
+                 FROM proc.vacancy_rules
+                 WHERE is_active
+                 ORDER BY attribute, priority, pattern;
+              """
+        cur.execute(sql)
+        return cur.fetchall()
+
+def get_classifier(conn):
+    return Classifier(get_rules(conn))
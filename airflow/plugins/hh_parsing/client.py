@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+import fake_useragent
+import requests
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from hh_parsing.metrics import NullMetrics
+
+HH_API_URL = 'https://api.hh.ru/vacancies'
+
+#responses retried with backoff, other error statuses raise unless the caller allows them
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRIES = 5
+
+#backoff delay: BACKOFF_BASE * 2 ** attempt with jitter, capped by BACKOFF_MAX, Retry-After wins when sent
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 60.0
+
+#(connect, read) timeout of a request
+TIMEOUT = (5, 30)
+
+#user agents sampled once per process
+USER_AGENTS = 50
+
+_user_agents = None
+_user_agents_lock = threading.Lock()
+
+#fake_useragent loads its whole browser database on creation, so it is done once
+def get_user_agents():
+    global _user_agents
+    with _user_agents_lock:
+        if _user_agents is None:
+            user_agent = fake_useragent.UserAgent()
+            _user_agents = list({user_agent.random for _ in range(USER_AGENTS)})
+    return _user_agents
+
+#seconds to wait from a Retry-After header, delta-seconds or http-date
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max((retry_at - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+#limits request rate shared by all crawl threads
+class RateLimiter:
+    def __init__(self, rps):
+        self.interval = 1.0 / rps if rps else 0.0
+        self.next_time = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+#api.hh.ru client: one keep-alive connection pool of pool_size connections shared by all threads,
+#optional rate limit, retries of 429/5xx and connection errors with exponential backoff honoring Retry-After.
+#requests, latency, retries and bytes received are also recorded to metrics
+class HHClient:
+    def __init__(self, pool_size=10, max_rps=None, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF_BASE, backoff_max=BACKOFF_MAX, timeout=TIMEOUT, metrics=None):
+        self.session = requests.Session()
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self.limiter = RateLimiter(max_rps)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.user_agents = get_user_agents()
+        self.metrics = metrics or NullMetrics()
+
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.wait_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def headers(self):
+        return {'user-agent': random.choice(self.user_agents)}
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return min(self.backoff * 2 ** attempt, self.backoff_max) * random.uniform(0.5, 1.0)
+
+    def count(self, latency, size=0, retry=False, error=False):
+        with self.lock:
+            self.requests += 1
+            self.retries += retry
+            self.errors += error
+            self.latency += latency
+            self.max_latency = max(self.max_latency, latency)
+        self.metrics.observe('hh_http_request_seconds', latency)
+        self.metrics.incr('hh_http_response_bytes_total', size)
+        if retry:
+            self.metrics.incr('hh_http_retries_total')
+        if error:
+            self.metrics.incr('hh_http_errors_total')
+
+    #response body of a GET request, None for a status in allow (like 404 of a removed vacancy).
+    #other 4xx/5xx responses raise, so a ban or a rejected query never reads as an empty result.
+    #429/5xx raise once retries are exhausted
+    def get(self, url, params=None, allow=()):
+        attempt = 0
+        while True:
+            self.limiter.wait()
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, headers=self.headers(), timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                retry = attempt < self.max_retries
+                self.count(time.perf_counter() - start, retry=retry, error=not retry)
+                if not retry:
+                    raise
+                retry_after = None
+            else:
+                data = response.content
+                retry = response.status_code in RETRY_STATUSES
+                failed = response.status_code >= 400 and response.status_code not in allow
+                self.count(time.perf_counter() - start, len(data), retry=retry and attempt < self.max_retries,
+                           error=failed and not (retry and attempt < self.max_retries))
+                if not retry:
+                    if response.status_code in allow:
+                        return None
+                    response.raise_for_status()
+                    return data
+                if attempt >= self.max_retries:
+                    response.raise_for_status()
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+            delay = self.delay(attempt, retry_after)
+            with self.lock:
+                self.wait_time += delay
+            self.metrics.incr('hh_http_backoff_seconds_total', delay)
+            time.sleep(delay)
+            attempt += 1
+
+    #connections opened by the pool so far
+    def connections(self):
+        pools = self.adapter.poolmanager.pools
+        return sum(pools[key].num_connections for key in pools.keys())
+
+    def stats(self):
+        with self.lock:
+            return {'requests': self.requests,
+                    'retries': self.retries,
+                    'errors': self.errors,
+                    'connections': self.connections(),
+                    'avg_latency': self.latency / self.requests if self.requests else 0.0,
+                    'max_latency': self.max_latency,
+                    'backoff_wait': self.wait_time}
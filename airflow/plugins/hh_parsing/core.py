@@ -0,0 +1,849 @@
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from hh_parsing.db import connection, executemany_prepared
+from hh_parsing.metrics import Metrics, NullMetrics, export_metrics
+from hh_parsing.plans import explain_statement, get_regressions, print_regressions, save_plans
+
+#steps running at the same time, each on its own pooled connection
+CORE_WORKERS = 4
+
+#one sql statement batch of the core load, runs once all steps in depends succeeded.
+#statements end with ; at the end of a line
+class Step:
+    __slots__ = ('name', 'sql', 'depends', 'statements')
+
+    def __init__(self, name, sql, depends=()):
+        self.name = name
+        self.sql = sql
+        self.depends = tuple(depends)
+        self.statements = [statement.strip() + ';' for statement in re.split(r';[ \t]*$', sql, flags=re.MULTILINE)
+                           if statement.strip()]
+
+HUB_VACANCY_SQL = """
+INSERT INTO core.hub_vacancy (vacancy_hk, record_source, load_date, external_id)
+SELECT      DISTINCT
+              v.vacancy_hk
+            , 'hh' as record_source
+            , now() as load_date
+            , v.id::varchar as external_id
+FROM        stage.vacancy AS v
+WHERE       v.run_id = %(run_id)s
+            AND v.vacancy_hk IS NOT NULL
+ON CONFLICT (vacancy_hk) DO NOTHING;
+"""
+
+HUB_EMPLOYER_SQL = """
+INSERT INTO core.hub_employer (employer_hk, record_source, load_date, external_id)
+SELECT      DISTINCT
+              v.employer_hk
+            , 'hh' as record_source
+            , now() as load_date
+            , v.employer_id::varchar as external_id
+FROM        stage.vacancy AS v
+WHERE       v.run_id = %(run_id)s
+            AND v.employer_hk IS NOT NULL
+ON CONFLICT (employer_hk) DO NOTHING;
+"""
+
+HUB_EXPERIENCE_SQL = """
+INSERT INTO core.hub_experience (experience_hk, record_source, load_date, external_id)
+SELECT      DISTINCT
+              v.experience_hk
+            , 'hh' as record_source
+            , now() as load_date
+            , v.experience_id as external_id
+FROM        stage.vacancy AS v
+WHERE       v.run_id = %(run_id)s
+            AND v.experience_hk IS NOT NULL
+ON CONFLICT (experience_hk) DO NOTHING;
+"""
+
+HUB_AREA_SQL = """
+INSERT INTO core.hub_area (area_hk, record_source, load_date, external_id)
+SELECT      DISTINCT
+              v.area_hk
+            , 'hh' as record_source
+            , now() as load_date
+            , v.area_id::varchar as external_id
+FROM        stage.vacancy AS v
+WHERE       v.run_id = %(run_id)s
+            AND v.area_hk IS NOT NULL
+ON CONFLICT (area_hk) DO NOTHING;
+"""
+
+HUB_SALARY_SQL = """
+INSERT INTO core.hub_salary (salary_hk, record_source, load_date, external_id)
+SELECT      DISTINCT
+              v.salary_hk
+            , 'hh' as record_source
+            , now() as load_date
+            , concat(coalesce(v.salary_from, 0.0)::varchar, coalesce(v.salary_to, 0.0)::varchar, coalesce(v.salary_currency::varchar, ''), coalesce(v.is_gross, FALSE)) as external_id
+FROM        stage.vacancy AS v
+WHERE       v.run_id = %(run_id)s
+            AND v.salary_hk IS NOT NULL
+ON CONFLICT (salary_hk) DO NOTHING;
+"""
+
+SAT_VACANCY_SQL = """
+WITH src AS (   SELECT  DISTINCT ON (v.vacancy_hk)
+                          v.vacancy_hk
+                        , v.vacancy_hd
+                        , v.vacancy_name
+                        , v.published_at
+                        , v.is_archive
+                        , v.is_open
+                        , v.type
+                        , v.grade
+
+                FROM    stage.vacancy AS v
+                WHERE   v.run_id = %(run_id)s
+                        AND v.vacancy_hk IS NOT NULL
+                        AND v.published_at IS NOT NULL
+                ORDER BY v.vacancy_hk, v.vacancy_hd
+            )
+, changed AS (  SELECT  src.*
+                FROM    src
+                LEFT JOIN core.sat_vacancy AS trg ON trg.vacancy_hk = src.vacancy_hk AND trg.load_end_date IS NULL
+                WHERE   trg.hash_diff IS DISTINCT FROM src.vacancy_hd
+            )
+, closed AS (   UPDATE  core.sat_vacancy AS trg
+                SET     load_end_date = now()
+                FROM    changed
+                WHERE   trg.vacancy_hk = changed.vacancy_hk
+                        AND trg.load_end_date IS NULL
+                RETURNING trg.vacancy_hk
+            )
+, inserted AS ( INSERT INTO core.sat_vacancy (vacancy_hk, record_source, load_date, hash_diff, vacancy_name, published_at, is_archive, is_open, type, grade, created_at)
+                SELECT        c.vacancy_hk
+                            , 'hh'
+                            , now()
+                            , c.vacancy_hd
+                            , c.vacancy_name
+                            , c.published_at
+                            , c.is_archive
+                            , c.is_open
+                            , c.type
+                            , c.grade
+                            , now()
+                FROM        changed AS c
+                RETURNING vacancy_hk
+            )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_vacancy'
+            , i.vacancy_hk
+            , i.vacancy_hk
+            , CASE WHEN c.vacancy_hk IS NULL THEN 'new' ELSE 'changed' END
+            , now()
+FROM        inserted AS i
+LEFT JOIN   (SELECT DISTINCT vacancy_hk FROM closed) AS c ON c.vacancy_hk = i.vacancy_hk;
+
+WITH expired AS (  UPDATE  core.sat_vacancy
+                   SET     deleted_at = now()
+                   WHERE   published_at <= now() - interval '31 days'
+                           AND deleted_at IS NULL
+                           AND load_end_date IS NULL
+                   RETURNING vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_vacancy'
+            , e.vacancy_hk
+            , e.vacancy_hk
+            , 'closed'
+            , now()
+FROM        expired AS e;
+"""
+
+SAT_EMPLOYER_SQL = """
+WITH src AS (   SELECT  DISTINCT ON (v.employer_hk)
+                          v.employer_hk
+                        , v.employer_hd
+                        , v.employer_name
+                        , v.is_accredited_it_employer
+
+                FROM    stage.vacancy AS v
+                WHERE   v.run_id = %(run_id)s
+                        AND v.employer_hk IS NOT NULL
+                ORDER BY v.employer_hk, v.employer_hd
+            )
+, changed AS (  SELECT  src.*
+                FROM    src
+                LEFT JOIN core.sat_employer AS trg ON trg.employer_hk = src.employer_hk AND trg.load_end_date IS NULL
+                WHERE   trg.hash_diff IS DISTINCT FROM src.employer_hd
+            )
+, closed AS (   UPDATE  core.sat_employer AS trg
+                SET     load_end_date = now()
+                FROM    changed
+                WHERE   trg.employer_hk = changed.employer_hk
+                        AND trg.load_end_date IS NULL
+                RETURNING trg.employer_hk
+            )
+, inserted AS ( INSERT INTO core.sat_employer (employer_hk, record_source, load_date, hash_diff, employer_name, is_accredited_it_employer, created_at)
+                SELECT        c.employer_hk
+                            , 'hh'
+                            , now()
+                            , c.employer_hd
+                            , c.employer_name
+                            , c.is_accredited_it_employer
+                            , now()
+                FROM        changed AS c
+                RETURNING employer_hk
+            )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_employer'
+            , i.employer_hk
+            , null::uuid
+            , CASE WHEN c.employer_hk IS NULL THEN 'new' ELSE 'changed' END
+            , now()
+FROM        inserted AS i
+LEFT JOIN   (SELECT DISTINCT employer_hk FROM closed) AS c ON c.employer_hk = i.employer_hk;
+"""
+
+SAT_EXPERIENCE_SQL = """
+WITH src AS (   SELECT  DISTINCT ON (v.experience_hk)
+                          v.experience_hk
+                        , v.experience_hd
+                        , v.experience_name
+
+                FROM    stage.vacancy AS v
+                WHERE   v.run_id = %(run_id)s
+                        AND v.experience_hk IS NOT NULL
+                ORDER BY v.experience_hk, v.experience_hd
+            )
+, changed AS (  SELECT  src.*
+                FROM    src
+                LEFT JOIN core.sat_experience AS trg ON trg.experience_hk = src.experience_hk AND trg.load_end_date IS NULL
+                WHERE   trg.hash_diff IS DISTINCT FROM src.experience_hd
+            )
+, closed AS (   UPDATE  core.sat_experience AS trg
+                SET     load_end_date = now()
+                FROM    changed
+                WHERE   trg.experience_hk = changed.experience_hk
+                        AND trg.load_end_date IS NULL
+                RETURNING trg.experience_hk
+            )
+, inserted AS ( INSERT INTO core.sat_experience (experience_hk, record_source, load_date, hash_diff, experience_name, created_at)
+                SELECT        c.experience_hk
+                            , 'hh'
+                            , now()
+                            , c.experience_hd
+                            , c.experience_name
+                            , now()
+                FROM        changed AS c
+                RETURNING experience_hk
+            )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_experience'
+            , i.experience_hk
+            , null::uuid
+            , CASE WHEN c.experience_hk IS NULL THEN 'new' ELSE 'changed' END
+            , now()
+FROM        inserted AS i
+LEFT JOIN   (SELECT DISTINCT experience_hk FROM closed) AS c ON c.experience_hk = i.experience_hk;
+"""
+
+SAT_AREA_SQL = """
+WITH src AS (   SELECT  DISTINCT ON (v.area_hk)
+                          v.area_hk
+                        , v.area_hd
+                        , v.area_name
+
+                FROM    stage.vacancy AS v
+                WHERE   v.run_id = %(run_id)s
+                        AND v.area_hk IS NOT NULL
+                ORDER BY v.area_hk, v.area_hd
+            )
+, changed AS (  SELECT  src.*
+                FROM    src
+                LEFT JOIN core.sat_area AS trg ON trg.area_hk = src.area_hk AND trg.load_end_date IS NULL
+                WHERE   trg.hash_diff IS DISTINCT FROM src.area_hd
+            )
+, closed AS (   UPDATE  core.sat_area AS trg
+                SET     load_end_date = now()
+                FROM    changed
+                WHERE   trg.area_hk = changed.area_hk
+                        AND trg.load_end_date IS NULL
+                RETURNING trg.area_hk
+            )
+, inserted AS ( INSERT INTO core.sat_area (area_hk, record_source, load_date, hash_diff, area_name, created_at)
+                SELECT        c.area_hk
+                            , 'hh'
+                            , now()
+                            , c.area_hd
+                            , c.area_name
+                            , now()
+                FROM        changed AS c
+                RETURNING area_hk
+            )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_area'
+            , i.area_hk
+            , null::uuid
+            , CASE WHEN c.area_hk IS NULL THEN 'new' ELSE 'changed' END
+            , now()
+FROM        inserted AS i
+LEFT JOIN   (SELECT DISTINCT area_hk FROM closed) AS c ON c.area_hk = i.area_hk;
+"""
+
+#the payload of a salary never changes, a new version is added once its currency gets a rate
+SAT_SALARY_SQL = """
+WITH src AS (   SELECT    s.*
+                        , r.rate AS exchange_rate
+                        , core.gross_rub(s.salary_from, r.rate, s.is_gross) AS salary_from_gross_rub
+                        , core.gross_rub(s.salary_to, r.rate, s.is_gross) AS salary_to_gross_rub
+                        , core.net_rub(s.salary_from, r.rate, s.is_gross) AS salary_from_net_rub
+                        , core.net_rub(s.salary_to, r.rate, s.is_gross) AS salary_to_net_rub
+                FROM    (   SELECT  DISTINCT ON (v.salary_hk)
+                                      v.salary_hk
+                                    , v.salary_hd
+                                    , v.salary_from
+                                    , v.salary_to
+                                    , v.salary_currency
+                                    , v.is_gross
+
+                            FROM    stage.vacancy AS v
+                            WHERE   v.run_id = %(run_id)s
+                                    AND v.salary_hk IS NOT NULL
+                            ORDER BY v.salary_hk, v.salary_hd
+                        ) AS s
+                LEFT JOIN LATERAL
+                        (   SELECT  er.rate
+                            FROM    core.ref_exchange_rate AS er
+                            WHERE   er.currency = s.salary_currency
+                            ORDER BY er.rate_date DESC
+                            LIMIT   1
+                        ) AS r ON TRUE
+            )
+, changed AS (  SELECT  src.*
+                FROM    src
+                LEFT JOIN core.sat_salary AS trg ON trg.salary_hk = src.salary_hk AND trg.load_end_date IS NULL
+                WHERE   trg.hash_diff IS DISTINCT FROM src.salary_hd
+                        OR (trg.exchange_rate IS NULL AND src.exchange_rate IS NOT NULL)
+            )
+, closed AS (   UPDATE  core.sat_salary AS trg
+                SET     load_end_date = now()
+                FROM    changed
+                WHERE   trg.salary_hk = changed.salary_hk
+                        AND trg.load_end_date IS NULL
+                RETURNING trg.salary_hk
+            )
+, inserted AS ( INSERT INTO core.sat_salary (salary_hk, record_source, load_date, hash_diff, salary_from, salary_to, salary_currency, is_gross,
+                                             exchange_rate, salary_from_gross_rub, salary_to_gross_rub, salary_from_net_rub, salary_to_net_rub,
+                                             salary_mid_gross_rub, created_at)
+                SELECT        c.salary_hk
+                            , 'hh'
+                            , now()
+                            , c.salary_hd
+                            , COALESCE(c.salary_from, 0.0)
+                            , COALESCE(c.salary_to, 0.0)
+                            , c.salary_currency
+                            , c.is_gross
+                            , c.exchange_rate
+                            , c.salary_from_gross_rub
+                            , c.salary_to_gross_rub
+                            , c.salary_from_net_rub
+                            , c.salary_to_net_rub
+                            , (COALESCE(c.salary_from_gross_rub, c.salary_to_gross_rub) + COALESCE(c.salary_to_gross_rub, c.salary_from_gross_rub)) / 2
+                            , now()
+                FROM        changed AS c
+                RETURNING salary_hk
+            )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_salary'
+            , i.salary_hk
+            , null::uuid
+            , CASE WHEN c.salary_hk IS NULL THEN 'new' ELSE 'changed' END
+            , now()
+FROM        inserted AS i
+LEFT JOIN   (SELECT DISTINCT salary_hk FROM closed) AS c ON c.salary_hk = i.salary_hk;
+"""
+
+SAT_VACANCY_DETAIL_SQL = """
+WITH src AS (   SELECT  DISTINCT ON (d.vacancy_hk)
+                          d.vacancy_hk
+                        , d.detail_hd
+                        , d.description
+                        , d.schedule_id
+                        , d.schedule_name
+                        , d.employment_id
+                        , d.employment_name
+
+                FROM    stage.vacancy_detail AS d
+                WHERE   d.run_id = %(run_id)s
+                        AND d.is_found
+                ORDER BY d.vacancy_hk, d.detail_hd
+            )
+, changed AS (  SELECT  src.*
+                FROM    src
+                LEFT JOIN core.sat_vacancy_detail AS trg ON trg.vacancy_hk = src.vacancy_hk AND trg.load_end_date IS NULL
+                WHERE   trg.hash_diff IS DISTINCT FROM src.detail_hd
+            )
+, closed AS (   UPDATE  core.sat_vacancy_detail AS trg
+                SET     load_end_date = now()
+                FROM    changed
+                WHERE   trg.vacancy_hk = changed.vacancy_hk
+                        AND trg.load_end_date IS NULL
+                RETURNING trg.vacancy_hk
+            )
+, inserted AS ( INSERT INTO core.sat_vacancy_detail (vacancy_hk, record_source, load_date, hash_diff, description, schedule_id, schedule_name,
+                                                     employment_id, employment_name, created_at)
+                SELECT        c.vacancy_hk
+                            , 'hh'
+                            , now()
+                            , c.detail_hd
+                            , c.description
+                            , c.schedule_id
+                            , c.schedule_name
+                            , c.employment_id
+                            , c.employment_name
+                            , now()
+                FROM        changed AS c
+                RETURNING vacancy_hk
+            )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_vacancy_detail'
+            , i.vacancy_hk
+            , i.vacancy_hk
+            , CASE WHEN c.vacancy_hk IS NULL THEN 'new' ELSE 'changed' END
+            , now()
+FROM        inserted AS i
+LEFT JOIN   (SELECT DISTINCT vacancy_hk FROM closed) AS c ON c.vacancy_hk = i.vacancy_hk;
+"""
+
+#skills of the enriched vacancies: current skills missing from the detail are closed, new ones added.
+#the change log gets one row per vacancy with a skill added or removed
+SAT_VACANCY_SKILL_SQL = """
+WITH src AS (   SELECT  DISTINCT
+                          d.vacancy_hk
+                        , s.skill
+
+                FROM    stage.vacancy_detail AS d
+                CROSS JOIN LATERAL jsonb_array_elements_text(d.key_skills) AS s (skill)
+                WHERE   d.run_id = %(run_id)s
+                        AND d.is_found
+            )
+, closed AS (   UPDATE  core.sat_vacancy_skill AS trg
+                SET     load_end_date = now()
+                FROM    stage.vacancy_detail AS d
+                WHERE   d.run_id = %(run_id)s
+                        AND d.is_found
+                        AND trg.vacancy_hk = d.vacancy_hk
+                        AND trg.load_end_date IS NULL
+                        AND NOT EXISTS (SELECT 1 FROM src WHERE src.vacancy_hk = trg.vacancy_hk AND src.skill = trg.skill)
+                RETURNING trg.vacancy_hk
+            )
+, inserted AS ( INSERT INTO core.sat_vacancy_skill (vacancy_hk, skill, record_source, load_date)
+                SELECT        src.vacancy_hk
+                            , src.skill
+                            , 'hh'
+                            , now()
+                FROM        src
+                WHERE       NOT EXISTS (SELECT 1 FROM core.sat_vacancy_skill AS trg
+                                        WHERE trg.vacancy_hk = src.vacancy_hk AND trg.skill = src.skill AND trg.load_end_date IS NULL)
+                RETURNING vacancy_hk
+            )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'sat_vacancy_skill'
+            , s.vacancy_hk
+            , s.vacancy_hk
+            , 'changed'
+            , now()
+FROM        (SELECT vacancy_hk FROM closed UNION SELECT vacancy_hk FROM inserted) AS s;
+"""
+
+#enriched vacancies are fetched again only after their marker changes, see hh_parsing.details
+SAVE_DETAIL_STATE_SQL = """
+INSERT INTO proc.vacancy_detail_state (vacancy_hk, marker, is_found, enriched_at)
+SELECT      DISTINCT ON (d.vacancy_hk)
+              d.vacancy_hk
+            , d.marker
+            , d.is_found
+            , now()
+FROM        stage.vacancy_detail AS d
+WHERE       d.run_id = %(run_id)s
+ORDER BY    d.vacancy_hk
+ON CONFLICT (vacancy_hk) DO UPDATE
+SET         marker = EXCLUDED.marker
+          , is_found = EXCLUDED.is_found
+          , enriched_at = EXCLUDED.enriched_at;
+"""
+
+#a link a vacancy goes back to gets a new row from now(), its closed rows keep the earlier intervals.
+#new and reopened links are told apart by a row of the link existing before the insert
+LINK_VACANCY_EMPLOYER_SQL = """
+WITH inserted AS ( INSERT INTO core.link_vacancy_employer (link_hk, vacancy_hk, employer_hk, date_from, date_to)
+                   SELECT      DISTINCT
+                                 v.vacancy_employer_hk
+                               , v.vacancy_hk
+                               , v.employer_hk
+                               , now()
+                               , null::timestamp
+
+                   FROM        stage.vacancy AS v
+                   WHERE       v.run_id = %(run_id)s
+                               AND v.vacancy_employer_hk IS NOT NULL
+                               AND NOT EXISTS (SELECT 1 FROM core.link_vacancy_employer AS lve WHERE lve.link_hk = v.vacancy_employer_hk AND lve.date_to IS NULL)
+                   RETURNING link_hk, vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_employer'
+            , x.link_hk
+            , x.vacancy_hk
+            , CASE WHEN EXISTS (SELECT 1 FROM core.link_vacancy_employer AS lve WHERE lve.link_hk = x.link_hk) THEN 'reopened' ELSE 'new' END
+            , now()
+FROM        inserted AS x;
+
+WITH closed AS (   UPDATE  core.link_vacancy_employer AS lve
+                   SET     date_to = now()
+                   FROM    stage.vacancy AS v
+                   WHERE   v.run_id = %(run_id)s
+                           AND lve.vacancy_hk = v.vacancy_hk
+                           AND lve.date_to IS NULL
+                           AND lve.link_hk IS DISTINCT FROM v.vacancy_employer_hk
+                   RETURNING lve.link_hk, lve.vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_employer'
+            , x.link_hk
+            , x.vacancy_hk
+            , 'closed'
+            , now()
+FROM        closed AS x;
+"""
+
+LINK_VACANCY_EXPERIENCE_SQL = """
+WITH inserted AS ( INSERT INTO core.link_vacancy_experience (link_hk, vacancy_hk, experience_hk, date_from, date_to)
+                   SELECT      DISTINCT
+                                 v.vacancy_experience_hk
+                               , v.vacancy_hk
+                               , v.experience_hk
+                               , now()
+                               , null::timestamp
+
+                   FROM        stage.vacancy AS v
+                   WHERE       v.run_id = %(run_id)s
+                               AND v.vacancy_experience_hk IS NOT NULL
+                               AND NOT EXISTS (SELECT 1 FROM core.link_vacancy_experience AS lve WHERE lve.link_hk = v.vacancy_experience_hk AND lve.date_to IS NULL)
+                   RETURNING link_hk, vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_experience'
+            , x.link_hk
+            , x.vacancy_hk
+            , CASE WHEN EXISTS (SELECT 1 FROM core.link_vacancy_experience AS lve WHERE lve.link_hk = x.link_hk) THEN 'reopened' ELSE 'new' END
+            , now()
+FROM        inserted AS x;
+
+WITH closed AS (   UPDATE  core.link_vacancy_experience AS lve
+                   SET     date_to = now()
+                   FROM    stage.vacancy AS v
+                   WHERE   v.run_id = %(run_id)s
+                           AND lve.vacancy_hk = v.vacancy_hk
+                           AND lve.date_to IS NULL
+                           AND lve.link_hk IS DISTINCT FROM v.vacancy_experience_hk
+                   RETURNING lve.link_hk, lve.vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_experience'
+            , x.link_hk
+            , x.vacancy_hk
+            , 'closed'
+            , now()
+FROM        closed AS x;
+"""
+
+LINK_VACANCY_AREA_SQL = """
+WITH inserted AS ( INSERT INTO core.link_vacancy_area (link_hk, vacancy_hk, area_hk, date_from, date_to)
+                   SELECT      DISTINCT
+                                 v.vacancy_area_hk
+                               , v.vacancy_hk
+                               , v.area_hk
+                               , now()
+                               , null::timestamp
+
+                   FROM        stage.vacancy AS v
+                   WHERE       v.run_id = %(run_id)s
+                               AND v.vacancy_area_hk IS NOT NULL
+                               AND NOT EXISTS (SELECT 1 FROM core.link_vacancy_area AS lve WHERE lve.link_hk = v.vacancy_area_hk AND lve.date_to IS NULL)
+                   RETURNING link_hk, vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_area'
+            , x.link_hk
+            , x.vacancy_hk
+            , CASE WHEN EXISTS (SELECT 1 FROM core.link_vacancy_area AS lve WHERE lve.link_hk = x.link_hk) THEN 'reopened' ELSE 'new' END
+            , now()
+FROM        inserted AS x;
+
+WITH closed AS (   UPDATE  core.link_vacancy_area AS lve
+                   SET     date_to = now()
+                   FROM    stage.vacancy AS v
+                   WHERE   v.run_id = %(run_id)s
+                           AND lve.vacancy_hk = v.vacancy_hk
+                           AND lve.date_to IS NULL
+                           AND lve.link_hk IS DISTINCT FROM v.vacancy_area_hk
+                   RETURNING lve.link_hk, lve.vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_area'
+            , x.link_hk
+            , x.vacancy_hk
+            , 'closed'
+            , now()
+FROM        closed AS x;
+"""
+
+LINK_VACANCY_SALARY_SQL = """
+WITH inserted AS ( INSERT INTO core.link_vacancy_salary (link_hk, vacancy_hk, salary_hk, date_from, date_to)
+                   SELECT      DISTINCT
+                                 v.vacancy_salary_hk
+                               , v.vacancy_hk
+                               , v.salary_hk
+                               , now()
+                               , null::timestamp
+
+                   FROM        stage.vacancy AS v
+                   WHERE       v.run_id = %(run_id)s
+                               AND v.vacancy_salary_hk IS NOT NULL
+                               AND NOT EXISTS (SELECT 1 FROM core.link_vacancy_salary AS lve WHERE lve.link_hk = v.vacancy_salary_hk AND lve.date_to IS NULL)
+                   RETURNING link_hk, vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_salary'
+            , x.link_hk
+            , x.vacancy_hk
+            , CASE WHEN EXISTS (SELECT 1 FROM core.link_vacancy_salary AS lve WHERE lve.link_hk = x.link_hk) THEN 'reopened' ELSE 'new' END
+            , now()
+FROM        inserted AS x;
+
+WITH closed AS (   UPDATE  core.link_vacancy_salary AS lve
+                   SET     date_to = now()
+                   FROM    stage.vacancy AS v
+                   WHERE   v.run_id = %(run_id)s
+                           AND lve.vacancy_hk = v.vacancy_hk
+                           AND lve.date_to IS NULL
+                           AND lve.link_hk IS DISTINCT FROM v.vacancy_salary_hk
+                   RETURNING lve.link_hk, lve.vacancy_hk
+                )
+INSERT INTO core.change_log (run_id, entity, hk, vacancy_hk, change_type, changed_at)
+SELECT        %(run_id)s
+            , 'link_vacancy_salary'
+            , x.link_hk
+            , x.vacancy_hk
+            , 'closed'
+            , now()
+FROM        closed AS x;
+"""
+
+#monthly partitions of sat_vacancy, the links and the change log for the vacancies in stage and the current load
+CREATE_PARTITIONS_SQL = """
+SELECT  core.create_partitions(least(min(v.published_at), now())::date)
+FROM    stage.vacancy AS v
+WHERE   v.run_id = %(run_id)s;
+"""
+
+REFRESH_MART_SQL = """
+SELECT mart.refresh_vacancy_stats(FALSE, %(run_id)s);
+"""
+
+REFRESH_SEARCH_SQL = """
+SELECT mart.refresh_vacancy_search(FALSE, %(run_id)s);
+"""
+
+#satellites and links the mart refreshes read
+CORE_LOADED = ['load_sat_vacancy', 'load_sat_employer', 'load_sat_experience', 'load_sat_area', 'load_sat_salary',
+               'load_link_vacancy_employer', 'load_link_vacancy_experience', 'load_link_vacancy_area', 'load_link_vacancy_salary']
+
+#hub -> satellite -> link graph, the mart refreshes need the whole core loaded.
+#satellites and links write to the partitioned core.change_log, so they wait for create_partitions
+STEPS = [Step('create_partitions', CREATE_PARTITIONS_SQL)
+         , Step('load_hub_vacancy', HUB_VACANCY_SQL)
+         , Step('load_hub_employer', HUB_EMPLOYER_SQL)
+         , Step('load_hub_experience', HUB_EXPERIENCE_SQL)
+         , Step('load_hub_area', HUB_AREA_SQL)
+         , Step('load_hub_salary', HUB_SALARY_SQL)
+         , Step('load_sat_vacancy', SAT_VACANCY_SQL, ['create_partitions', 'load_hub_vacancy'])
+         , Step('load_sat_employer', SAT_EMPLOYER_SQL, ['create_partitions', 'load_hub_employer'])
+         , Step('load_sat_experience', SAT_EXPERIENCE_SQL, ['create_partitions', 'load_hub_experience'])
+         , Step('load_sat_area', SAT_AREA_SQL, ['create_partitions', 'load_hub_area'])
+         , Step('load_sat_salary', SAT_SALARY_SQL, ['create_partitions', 'load_hub_salary'])
+         , Step('load_sat_vacancy_detail', SAT_VACANCY_DETAIL_SQL, ['create_partitions', 'load_hub_vacancy'])
+         , Step('load_sat_vacancy_skill', SAT_VACANCY_SKILL_SQL, ['create_partitions', 'load_hub_vacancy'])
+         , Step('save_detail_state', SAVE_DETAIL_STATE_SQL, ['load_sat_vacancy_detail', 'load_sat_vacancy_skill'])
+         , Step('load_link_vacancy_employer', LINK_VACANCY_EMPLOYER_SQL, ['create_partitions', 'load_hub_vacancy', 'load_hub_employer'])
+         , Step('load_link_vacancy_experience', LINK_VACANCY_EXPERIENCE_SQL, ['create_partitions', 'load_hub_vacancy', 'load_hub_experience'])
+         , Step('load_link_vacancy_area', LINK_VACANCY_AREA_SQL, ['create_partitions', 'load_hub_vacancy', 'load_hub_area'])
+         , Step('load_link_vacancy_salary', LINK_VACANCY_SALARY_SQL, ['create_partitions', 'load_hub_vacancy', 'load_hub_salary'])
+         , Step('refresh_mart', REFRESH_MART_SQL, CORE_LOADED)
+         , Step('refresh_search', REFRESH_SEARCH_SQL, CORE_LOADED)]
+
+#read-only mart functions, timed after the core steps of a profiled load. a function is one statement,
+#its plan shows the function scan with the time and buffers of the whole call
+MART_STEPS = [Step('mart.get_vacancies', """SELECT * FROM mart.get_vacancies();""")
+              , Step('mart.get_vacancies_by_region', """SELECT * FROM mart.get_vacancies_by_region(ARRAY['Data Engineer', 'Data Analyst', 'Data Scientist']);""")
+              , Step('mart.get_vacancies_by_employer', """SELECT * FROM mart.get_vacancies_by_employer(ARRAY['Data Engineer', 'Data Analyst', 'Data Scientist']);""")
+              , Step('mart.search_vacancies', """SELECT * FROM mart.search_vacancies('data engineer');""")]
+
+#steps in dependency order, raises on unknown or circular dependencies
+def sort_steps(steps):
+    steps = {step.name: step for step in steps}
+    order = []
+    state = {}
+
+    def visit(name):
+        if name not in steps:
+            raise ValueError(f'unknown core step {name}')
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f'circular dependency at core step {name}')
+        state[name] = 'visiting'
+        for dependency in steps[name].depends:
+            visit(dependency)
+        state[name] = 'done'
+        order.append(steps[name])
+
+    for name in steps:
+        visit(name)
+    return order
+
+#run one step on cur for the stage of run_id, returns its timing (step, started_at, duration in seconds, rows of all statements).
+#duration and rows also go to metrics. with plans every statement runs under EXPLAIN ANALYZE and its plan is appended to plans
+def run_step(cur, step, run_id, metrics=None, plans=None):
+    metrics = metrics or NullMetrics()
+    started_at = datetime.now()
+    start = time.perf_counter()
+    rows = 0
+    try:
+        for statement_no, statement in enumerate(step.statements):
+            if plans is None:
+                cur.execute(statement, {'run_id': run_id})
+                rows += max(cur.rowcount, 0)
+            else:
+                rows += explain_statement(cur, step.name, statement_no, statement, {'run_id': run_id}, plans)
+    except Exception:
+        metrics.incr('core_step_failures_total', step=step.name)
+        raise
+    timing = (step.name, started_at, time.perf_counter() - start, rows)
+    metrics.set('core_step_duration_seconds', timing[2], step=step.name)
+    metrics.set('core_step_rows', timing[3], step=step.name)
+    print(f'{step.name}: {timing[2]:.3f}s, {timing[3]} rows')
+    return timing
+
+def run_step_committed(conn_id, step, run_id, metrics=None, plans=None):
+    with connection(conn_id) as conn:
+        with conn.cursor() as cur:
+            timing = run_step(cur, step, run_id, metrics, plans)
+        conn.commit()
+    return timing
+
+#steps whose dependencies are done run concurrently on max_workers pooled connections,
+#each step commits on its own. after a failure no new steps start and the first error is raised
+def run_concurrent(conn_id, steps, run_id, max_workers=CORE_WORKERS, metrics=None, plans=None):
+    pending = sort_steps(steps)
+    done = set()
+    running = {}
+    timings = []
+    error = None
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if error is None:
+                ready = [step for step in pending if all(dependency in done for dependency in step.depends)]
+                for step in ready:
+                    pending.remove(step)
+                    running[executor.submit(run_step_committed, conn_id, step, run_id, metrics, plans)] = step
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                step = running.pop(future)
+                try:
+                    timings.append(future.result())
+                    done.add(step.name)
+                except Exception as exc:
+                    error = error or exc
+    return timings, error
+
+#all steps one after another in dependency order on one connection, committed together
+def run_single_transaction(conn_id, steps, run_id, metrics=None, plans=None):
+    timings = []
+    with connection(conn_id) as conn:
+        try:
+            with conn.cursor() as cur:
+                for step in sort_steps(steps):
+                    timings.append(run_step(cur, step, run_id, metrics, plans))
+            conn.commit()
+        except Exception as exc:
+            conn.rollback()
+            return [], exc
+    return timings, None
+
+def save_timings(conn_id, run_id, timings):
+    with connection(conn_id) as conn:
+        with conn.cursor() as cur:
+            sql = """INSERT INTO proc.core_step_log (run_id, step, started_at, duration, rows_affected)
+                     VALUES (%s, %s, %s, %s, %s);
+                  """
+            executemany_prepared(cur, sql, [(run_id, *timing) for timing in timings])
+        conn.commit()
+
+#plans of a profiled load to proc.query_plan, statements that got slower or read more than in earlier profiled runs are printed
+def save_profile(conn_id, run_id, plans, metrics):
+    save_plans(conn_id, run_id, plans)
+    regressions = get_regressions(conn_id, run_id)
+    metrics.set('plan_regressions', len(regressions))
+    print_regressions(regressions)
+
+#load the stage of run_id into the core layer and refresh the mart, step timings go to proc.core_step_log,
+#step rows and durations to proc.run_metrics and the metrics sinks.
+#single_transaction runs the steps sequentially in one transaction, so a failure leaves core untouched.
+#profile runs every statement and then the mart functions under EXPLAIN ANALYZE and keeps their plans, see hh_parsing.plans
+def load_core(conn_id, run_id, steps=STEPS, max_workers=CORE_WORKERS, single_transaction=False, profile=False):
+    metrics = Metrics()
+    start = time.perf_counter()
+    plans = [] if profile else None
+    try:
+        if single_transaction:
+            timings, error = run_single_transaction(conn_id, steps, run_id, metrics, plans)
+        else:
+            timings, error = run_concurrent(conn_id, steps, run_id, max_workers, metrics, plans)
+        if profile and error is None:
+            for step in MART_STEPS:
+                run_step_committed(conn_id, step, run_id, metrics, plans)
+        metrics.set('task_seconds', time.perf_counter() - start)
+        save_timings(conn_id, run_id, timings)
+        if plans:
+            save_profile(conn_id, run_id, plans, metrics)
+    finally:
+        export_metrics(conn_id, run_id, 'load_core', metrics)
+    if error is not None:
+        raise error
+    print(f'core load: {len(timings)} steps, {time.perf_counter() - start:.3f}s')
+    return timings
+
+#one core step as its own task, used by the debug dag
+def load_core_step(conn_id, name, run_id):
+    step = {step.name: step for step in STEPS}[name]
+    metrics = Metrics()
+    try:
+        timing = run_step_committed(conn_id, step, run_id, metrics)
+        save_timings(conn_id, run_id, [timing])
+    finally:
+        export_metrics(conn_id, run_id, name, metrics)
+    return timing
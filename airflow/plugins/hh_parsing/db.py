@@ -0,0 +1,122 @@
+import atexit
+import hashlib
+import itertools
+import re
+import threading
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+from contextlib import contextmanager
+from functools import lru_cache
+from airflow.hooks.base_hook import BaseHook
+
+#connections per pool, checkout waits when all of them are in use
+POOL_MIN = 1
+POOL_MAX = 4
+
+#connection that remembers the statements prepared in its session,
+#prepared statements live until the session ends whatever happens to the transaction
+class PreparingConnection(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+
+#airflow connection lookup hits the metadata db, so it is resolved once per process
+@lru_cache(maxsize=None)
+def get_connection_params(conn_id):
+    hook = BaseHook.get_connection(conn_id)
+    return {'host': hook.host,
+            'port': hook.port,
+            'user': hook.login,
+            'password': hook.password,
+            'dbname': hook.schema}
+
+#ThreadedConnectionPool that blocks on checkout instead of raising when exhausted
+class ConnectionPool:
+    def __init__(self, params, minconn=POOL_MIN, maxconn=POOL_MAX):
+        self.pool = psycopg2.pool.ThreadedConnectionPool(minconn, maxconn, connection_factory=PreparingConnection, **params)
+        self.slots = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self):
+        self.slots.acquire()
+        try:
+            return self.pool.getconn()
+        except Exception:
+            self.slots.release()
+            raise
+
+    def putconn(self, conn, close=False):
+        try:
+            self.pool.putconn(conn, close=close)
+        finally:
+            self.slots.release()
+
+    def closeall(self):
+        self.pool.closeall()
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(conn_id):
+    with _pools_lock:
+        if conn_id not in _pools:
+            _pools[conn_id] = ConnectionPool(get_connection_params(conn_id))
+        return _pools[conn_id]
+
+@atexit.register
+def close_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+#pooled connection of an airflow connection id.
+#an exception rolls the open transaction back, the connection goes back to the pool idle
+@contextmanager
+def connection(conn_id):
+    pool = get_pool(conn_id)
+    conn = pool.getconn()
+    broken = False
+    try:
+        yield conn
+    finally:
+        try:
+            if conn.closed:
+                broken = True
+            elif conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+        except psycopg2.Error:
+            broken = True
+        pool.putconn(conn, close=broken)
+
+#%s placeholders to $1, $2, ... for PREPARE
+def to_positional(sql):
+    position = itertools.count(1)
+    return re.sub(r'%s', lambda match: f'${next(position)}', sql)
+
+def prepare(cur, sql):
+    name = 'stmt_' + hashlib.md5(sql.encode()).hexdigest()[:16]
+    if name not in cur.connection.prepared:
+        cur.execute(f"""PREPARE {name} AS {to_positional(sql)}""")
+        cur.connection.prepared.add(name)
+    return name
+
+#execute sql as a server-side prepared statement, prepared once per session.
+#connections not made by the pool execute it as is
+def execute_prepared(cur, sql, params=()):
+    if not hasattr(cur.connection, 'prepared'):
+        return cur.execute(sql, params)
+    name = prepare(cur, sql)
+    if params:
+        cur.execute(f"""EXECUTE {name} ({', '.join(['%s'] * len(params))})""", params)
+    else:
+        cur.execute(f"""EXECUTE {name}""")
+
+def executemany_prepared(cur, sql, rows):
+    if not hasattr(cur.connection, 'prepared'):
+        return cur.executemany(sql, rows)
+    rows = list(rows)
+    if not rows:
+        return
+    name = prepare(cur, sql)
+    cur.executemany(f"""EXECUTE {name} ({', '.join(['%s'] * len(rows[0]))})""", rows)
@@ -0,0 +1,183 @@
+import json
+from typing import List, Optional, Union
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+#columns of stage.vacancy in the order of the vacancy records
+VACANCY_COLUMNS = ('id'
+                   , 'vacancy_name'
+                   , 'published_at'
+                   , 'is_archive'
+                   , 'is_open'
+                   , 'employer_id'
+                   , 'employer_name'
+                   , 'is_accredited_it_employer'
+                   , 'experience_id'
+                   , 'experience_name'
+                   , 'area_id'
+                   , 'area_name'
+                   , 'salary_from'
+                   , 'salary_to'
+                   , 'salary_currency'
+                   , 'is_gross')
+
+#decoded search page, records are tuples in VACANCY_COLUMNS order
+class Page:
+    __slots__ = ('found', 'pages', 'clusters', 'records')
+
+    def __init__(self, found, pages, clusters, records):
+        self.found = found
+        self.pages = pages
+        self.clusters = clusters
+        self.records = records
+
+if msgspec is not None:
+    #only the fields stage.vacancy needs, everything else in the response is skipped by the decoder
+    class _Ref(msgspec.Struct):
+        id: Optional[str] = None
+        name: Optional[str] = None
+
+    class _Employer(msgspec.Struct):
+        id: Optional[str] = None
+        name: Optional[str] = None
+        accredited_it_employer: Optional[bool] = None
+
+    class _Salary(msgspec.Struct):
+        salary_from: Union[int, float, None] = msgspec.field(name='from', default=None)
+        salary_to: Union[int, float, None] = msgspec.field(name='to', default=None)
+        currency: Optional[str] = None
+        gross: Optional[bool] = None
+
+    class _Vacancy(msgspec.Struct):
+        id: Union[int, str]
+        name: Optional[str] = None
+        published_at: Optional[str] = None
+        archived: Optional[bool] = None
+        type: Optional[_Ref] = None
+        employer: Optional[_Employer] = None
+        experience: Optional[_Ref] = None
+        area: Optional[_Ref] = None
+        salary: Optional[_Salary] = None
+
+    class _Page(msgspec.Struct):
+        items: List[_Vacancy] = []
+        found: int = 0
+        pages: int = 0
+        clusters: Optional[list] = None
+
+    _page_decoder = msgspec.json.Decoder(_Page)
+    _NO_REF = _Ref()
+    _NO_EMPLOYER = _Employer()
+    _NO_SALARY = _Salary()
+
+    def _record(vacancy):
+        employer = vacancy.employer or _NO_EMPLOYER
+        experience = vacancy.experience or _NO_REF
+        area = vacancy.area or _NO_REF
+        salary = vacancy.salary or _NO_SALARY
+        return (int(vacancy.id),
+                vacancy.name,
+                vacancy.published_at,
+                bool(vacancy.archived),
+                vacancy.type is not None and vacancy.type.id == 'open',
+                employer.id,
+                employer.name,
+                employer.accredited_it_employer,
+                experience.id,
+                experience.name,
+                area.id,
+                area.name,
+                salary.salary_from,
+                salary.salary_to,
+                salary.currency,
+                salary.gross)
+
+    def decode_page(data):
+        page = _page_decoder.decode(data)
+        return Page(page.found, page.pages, page.clusters, [_record(vacancy) for vacancy in page.items])
+
+else:
+    _EMPTY = {}
+
+    def _record(vacancy):
+        employer = vacancy.get('employer') or _EMPTY
+        experience = vacancy.get('experience') or _EMPTY
+        area = vacancy.get('area') or _EMPTY
+        salary = vacancy.get('salary') or _EMPTY
+        return (int(vacancy['id']),
+                vacancy.get('name'),
+                vacancy.get('published_at'),
+                bool(vacancy.get('archived')),
+                (vacancy.get('type') or _EMPTY).get('id') == 'open',
+                employer.get('id'),
+                employer.get('name'),
+                employer.get('accredited_it_employer'),
+                experience.get('id'),
+                experience.get('name'),
+                area.get('id'),
+                area.get('name'),
+                salary.get('from'),
+                salary.get('to'),
+                salary.get('currency'),
+                salary.get('gross'))
+
+    def decode_page(data):
+        page = json.loads(data)
+        return Page(page.get('found', 0), page.get('pages', 0), page.get('clusters'),
+                    [_record(vacancy) for vacancy in page.get('items') or []])
+
+#columns of a decoded /vacancies/{id} response, key_skills is a sorted list of distinct skill names
+DETAIL_COLUMNS = ('id'
+                  , 'description'
+                  , 'schedule_id'
+                  , 'schedule_name'
+                  , 'employment_id'
+                  , 'employment_name'
+                  , 'key_skills')
+
+if msgspec is not None:
+    class _Skill(msgspec.Struct):
+        name: Optional[str] = None
+
+    #an error response (404 of a removed vacancy) has no id
+    class _Detail(msgspec.Struct):
+        id: Union[int, str, None] = None
+        description: Optional[str] = None
+        schedule: Optional[_Ref] = None
+        employment: Optional[_Ref] = None
+        key_skills: Optional[List[_Skill]] = None
+
+    _detail_decoder = msgspec.json.Decoder(_Detail)
+
+    #detail record in DETAIL_COLUMNS order, None for a body without id
+    def decode_detail(data):
+        detail = _detail_decoder.decode(data)
+        if detail.id is None:
+            return None
+        schedule = detail.schedule or _NO_REF
+        employment = detail.employment or _NO_REF
+        return (int(detail.id),
+                detail.description,
+                schedule.id,
+                schedule.name,
+                employment.id,
+                employment.name,
+                sorted({skill.name for skill in detail.key_skills or [] if skill.name}))
+
+else:
+    def decode_detail(data):
+        detail = json.loads(data)
+        if detail.get('id') is None:
+            return None
+        schedule = detail.get('schedule') or _EMPTY
+        employment = detail.get('employment') or _EMPTY
+        return (int(detail['id']),
+                detail.get('description'),
+                schedule.get('id'),
+                schedule.get('name'),
+                employment.get('id'),
+                employment.get('name'),
+                sorted({skill.get('name') for skill in detail.get('key_skills') or [] if skill.get('name')}))
@@ -0,0 +1,136 @@
+import json
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from hh_parsing.bulk import copy_rows
+from hh_parsing.client import HH_API_URL, HHClient
+from hh_parsing.db import connection
+from hh_parsing.decode import decode_detail
+from hh_parsing.keys import hash_diff
+from hh_parsing.metrics import Metrics, NullMetrics, export_metrics
+from hh_parsing.process import analyze_stage
+from hh_parsing.state import get_stage_table
+
+#concurrent /vacancies/{id} requests and their rate, shared by all threads of the task
+MAX_WORKERS = 8
+MAX_RPS = 10
+
+#details per flush to the stage partition, every flush is committed so a retried task fetches only the rest
+CHUNK_SIZE = 1000
+
+#columns of the rows loaded to stage.vacancy_detail
+STAGE_DETAIL_COLUMNS = ('vacancy_hk'
+                        , 'marker'
+                        , 'is_found'
+                        , 'description'
+                        , 'schedule_id'
+                        , 'schedule_name'
+                        , 'employment_id'
+                        , 'employment_name'
+                        , 'key_skills'
+                        , 'detail_hd')
+
+#(id, vacancy_hk, marker) of the vacancies of the run never enriched or enriched for another marker.
+#proc.vacancy_detail_state keeps the marker every enriched vacancy was fetched for, it moves with load_core.
+#the marker covers the search payload only, so reclassified vacancies are not fetched again.
+#vacancies already in the detail stage of the run were fetched by an earlier attempt
+def get_candidates(conn, run_id):
+    with conn.cursor() as cur:
+        sql = """SELECT     v.id
+                          , v.vacancy_hk
+                          , m.marker
+                 FROM       stage.vacancy AS v
+                 CROSS JOIN proc.detail_marker(v.vacancy_name, v.published_at, v.is_archive, v.is_open) AS m (marker)
+                 LEFT JOIN  proc.vacancy_detail_state AS s ON s.vacancy_hk = v.vacancy_hk
+                 WHERE      v.run_id = %(run_id)s
+                            AND v.vacancy_hk IS NOT NULL
+                            AND s.marker IS DISTINCT FROM m.marker
+                            AND NOT EXISTS (SELECT 1 FROM stage.vacancy_detail AS d
+                                            WHERE d.run_id = %(run_id)s AND d.vacancy_hk = v.vacancy_hk)
+                 ORDER BY   v.id;
+              """
+        cur.execute(sql, {'run_id': run_id})
+        return cur.fetchall()
+
+#fetch and decode the detail of one vacancy, None when the api answers 404 for it.
+#any other error raises, so a ban or a rate limit fails the task instead of marking live vacancies removed
+def fetch_detail(client, vacancy_id, url, metrics):
+    data = client.get(f'{url}/{vacancy_id}', allow=(404,))
+    if data is None:
+        metrics.incr('hh_details_not_found_total')
+        return None
+    with metrics.timer('hh_decode_seconds'):
+        detail = decode_detail(data)
+    if detail is None:
+        raise ValueError(f'detail of vacancy {vacancy_id} has no id')
+    metrics.incr('hh_details_fetched_total')
+    return detail
+
+#details fetched concurrently on max_workers threads at most max_rps requests per second.
+#at most max_workers * 2 requests are in flight, (candidate, detail) are yielded in candidate order
+def iter_details(candidates, max_workers=MAX_WORKERS, max_rps=MAX_RPS, url=HH_API_URL, metrics=None):
+    metrics = metrics or NullMetrics()
+    client = HHClient(pool_size=max_workers, max_rps=max_rps, metrics=metrics)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            window = deque()
+            for candidate in candidates:
+                window.append((candidate, executor.submit(fetch_detail, client, candidate[0], url, metrics)))
+                if len(window) >= max_workers * 2:
+                    candidate, future = window.popleft()
+                    yield candidate, future.result()
+            while window:
+                candidate, future = window.popleft()
+                yield candidate, future.result()
+    finally:
+        client.close()
+
+#stage row of a fetched detail, a removed vacancy is kept with is_found false so it is not asked again
+def detail_row(candidate, detail):
+    _, vacancy_hk, marker = candidate
+    if detail is None:
+        return (vacancy_hk, marker, False) + (None,) * (len(STAGE_DETAIL_COLUMNS) - 3)
+    return (vacancy_hk, marker, True, *detail[1:6],
+            json.dumps(detail[6], ensure_ascii=False),
+            hash_diff(*detail[1:6]))
+
+def load_detail_rows(cur, table, rows, metrics):
+    if not rows:
+        return
+    with metrics.timer('stage_load_seconds'):
+        count = copy_rows(cur, table, STAGE_DETAIL_COLUMNS, rows)
+    metrics.incr('stage_rows_loaded_total', count)
+
+#enrich the vacancies of the stage of run_id with /vacancies/{id}: description, schedule, employment and key skills.
+#only new vacancies and vacancies changed since their last enrichment are fetched,
+#the details go to the unlogged stage.vacancy_detail partition of the run, load_core takes them to the detail satellites.
+#a replay run does not call the api, its vacancies keep the details they have in core.
+#fetch and load metrics of the run go to proc.run_metrics and the configured sinks
+def load_details(conn_id, run_id, max_workers=MAX_WORKERS, max_rps=MAX_RPS, url=HH_API_URL, chunk_size=CHUNK_SIZE,
+                 replay=False):
+    if replay:
+        print('replay run, details not fetched')
+        return
+    metrics = Metrics()
+    start = time.perf_counter()
+    try:
+        with connection(conn_id) as conn:
+            table = get_stage_table(conn, run_id, 'vacancy_detail')
+            candidates = get_candidates(conn, run_id)
+            metrics.set('detail_candidates', len(candidates))
+            print(f'{len(candidates)} vacancies to enrich')
+
+            rows = []
+            with conn.cursor() as cur:
+                for candidate, detail in iter_details(candidates, max_workers, max_rps, url, metrics):
+                    rows.append(detail_row(candidate, detail))
+                    if len(rows) >= chunk_size:
+                        load_detail_rows(cur, table, rows, metrics)
+                        conn.commit()
+                        rows = []
+                load_detail_rows(cur, table, rows, metrics)
+                analyze_stage(cur, table)
+                conn.commit()
+    finally:
+        metrics.set('task_seconds', time.perf_counter() - start)
+        export_metrics(conn_id, run_id, 'load_details', metrics)
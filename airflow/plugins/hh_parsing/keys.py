@@ -0,0 +1,66 @@
+import hashlib
+import uuid
+
+#hash key columns of stage.vacancy in the order added by with_keys
+KEY_COLUMNS = ('vacancy_hk'
+               , 'employer_hk'
+               , 'experience_hk'
+               , 'area_hk'
+               , 'salary_hk'
+               , 'vacancy_employer_hk'
+               , 'vacancy_experience_hk'
+               , 'vacancy_area_hk'
+               , 'vacancy_salary_hk')
+
+#satellite hashdiff columns of stage.vacancy in the order returned by hash_diffs
+DIFF_COLUMNS = ('vacancy_hd'
+                , 'employer_hd'
+                , 'experience_hd'
+                , 'area_hd'
+                , 'salary_hd')
+
+#md5 of the business key parts joined with '|', same as md5(concat_ws('|', ...))::uuid in postgres.
+#no key when a part is missing
+def hash_key(*parts):
+    if any(part is None for part in parts):
+        return None
+    return str(uuid.UUID(hashlib.md5('|'.join(map(str, parts)).encode()).hexdigest()))
+
+#salary business key, same text as
+#concat(coalesce(salary_from, 0.0)::varchar, coalesce(salary_to, 0.0)::varchar, coalesce(salary_currency::varchar, ''), coalesce(is_gross, FALSE))
+def salary_key(salary_from, salary_to, salary_currency, is_gross):
+    return ('0.0' if salary_from is None else str(salary_from)) \
+           + ('0.0' if salary_to is None else str(salary_to)) \
+           + (salary_currency or '') \
+           + ('true' if is_gross else 'false')
+
+#vacancy record with hub and link hash keys appended
+def with_keys(record):
+    vacancy_id = str(record[0])
+    employer_id = record[5]
+    experience_id = record[8]
+    area_id = record[10]
+    salary = salary_key(record[12], record[13], record[14], record[15])
+    return record + (hash_key(vacancy_id),
+                     hash_key(employer_id),
+                     hash_key(experience_id),
+                     hash_key(area_id),
+                     hash_key(salary),
+                     hash_key(vacancy_id, employer_id),
+                     hash_key(vacancy_id, experience_id),
+                     hash_key(vacancy_id, area_id),
+                     hash_key(vacancy_id, salary))
+
+#md5 of a satellite payload joined with '|', a missing value counts as an empty string.
+#the satellite steps compare it with the hashdiff of the current row instead of every column.
+#postgres reads the plain hex digest as uuid, so no uuid object is built
+def hash_diff(*parts):
+    return hashlib.md5('|'.join('' if part is None else str(part) for part in parts).encode()).hexdigest()
+
+#hashdiffs of the vacancy, employer, experience, area and salary satellites of a vacancy record and its (type, grade)
+def hash_diffs(record, classes):
+    return (hash_diff(record[1], record[2], record[3], record[4], *classes),
+            hash_diff(record[6], record[7]),
+            hash_diff(record[9]),
+            hash_diff(record[11]),
+            hash_diff(record[12], record[13], record[14], record[15]))
@@ -0,0 +1,178 @@
+import os
+import socket
+import threading
+import time
+import psycopg2
+from bisect import bisect_left
+from contextlib import contextmanager
+from hh_parsing.db import connection, executemany_prepared
+from hh_parsing.raw import safe_name
+
+#directory of the node_exporter textfile collector, one <task>.prom file per task. not written when unset
+METRICS_DIR = os.environ.get('HH_METRICS_DIR')
+
+#statsd host:port, metrics are sent over udp when set
+STATSD_ADDRESS = os.environ.get('HH_STATSD')
+STATSD_PREFIX = 'hh_parsing'
+
+#upper bounds of histogram buckets, seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    #(upper bound, cumulative count) pairs ending with +Inf
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            total += count
+            yield bound, total
+
+#counters, gauges and histograms of one task run, shared by all threads of the task.
+#a metric is a name and optional labels: metrics.incr('hh_pages_fetched_total'), metrics.set('core_step_rows', 10, step='load_hub_area')
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def incr(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    #duration of the block goes to the histogram name
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    #flat (name, labels, value) samples, histograms as name_count, name_sum and name_max
+    def samples(self):
+        with self.lock:
+            samples = [(name, labels, value) for (name, labels), value in self.counters.items()]
+            samples.extend((name, labels, value) for (name, labels), value in self.gauges.items())
+            for (name, labels), histogram in self.histograms.items():
+                samples.append((f'{name}_count', labels, histogram.count))
+                samples.append((f'{name}_sum', labels, histogram.sum))
+                samples.append((f'{name}_max', labels, histogram.max))
+        return sorted(samples)
+
+#metrics of code run without a task, every call is a no-op
+class NullMetrics(Metrics):
+    def incr(self, name, value=1, **labels):
+        pass
+
+    def set(self, name, value, **labels):
+        pass
+
+    def observe(self, name, value, **labels):
+        pass
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"' for key, value in labels) + '}'
+
+def format_value(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+#prometheus text exposition format, every sample gets the task label.
+#run_id is left out, a label per run would start new series every day
+def to_prometheus(metrics, task):
+    common = (('task', task),)
+    lines = []
+    with metrics.lock:
+        for kind, values in (('counter', metrics.counters), ('gauge', metrics.gauges)):
+            for name in sorted({name for name, _ in values}):
+                lines.append(f'# TYPE {name} {kind}')
+                for (metric, labels), value in sorted(values.items()):
+                    if metric == name:
+                        lines.append(f'{name}{format_labels(labels + common)} {format_value(value)}')
+        for name in sorted({name for name, _ in metrics.histograms}):
+            lines.append(f'# TYPE {name} histogram')
+            for (metric, labels), histogram in sorted(metrics.histograms.items()):
+                if metric != name:
+                    continue
+                for bound, count in histogram.cumulative():
+                    lines.append(f'{name}_bucket{format_labels(labels + common + (("le", format_value(bound)),))} {count}')
+                lines.append(f'{name}_sum{format_labels(labels + common)} {format_value(histogram.sum)}')
+                lines.append(f'{name}_count{format_labels(labels + common)} {histogram.count}')
+    return '\n'.join(lines) + '\n'
+
+#the collector may read the file at any moment, so it is replaced at once
+def write_textfile(metrics, task, metrics_dir=METRICS_DIR):
+    os.makedirs(metrics_dir, exist_ok=True)
+    path = os.path.join(metrics_dir, f'hh_parsing_{task}.prom')
+    with open(path + '.tmp', 'w') as file:
+        file.write(to_prometheus(metrics, task))
+    os.replace(path + '.tmp', path)
+
+#counters as statsd counters, gauges and histogram aggregates as gauges
+def send_statsd(metrics, task, address=STATSD_ADDRESS, prefix=STATSD_PREFIX):
+    host, _, port = address.rpartition(':')
+    with metrics.lock:
+        counters = set(metrics.counters)
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        for name, labels, value in metrics.samples():
+            metric = '.'.join([prefix, task, name] + [safe_name(label) for _, label in labels])
+            kind = 'c' if (name, labels) in counters else 'g'
+            sock.sendto(f'{metric}:{value}|{kind}'.encode(), (host or 'localhost', int(port)))
+
+def save_metrics(conn_id, run_id, task, metrics):
+    rows = [(run_id, task, name, ','.join(f'{key}={value}' for key, value in labels), value)
+            for name, labels, value in metrics.samples()]
+    with connection(conn_id) as conn:
+        with conn.cursor() as cur:
+            sql = """INSERT INTO proc.run_metrics (run_id, task, metric, labels, value, recorded_at)
+                     VALUES (%s, %s, %s, %s, %s, now())
+                     ON CONFLICT (run_id, task, metric, labels) DO UPDATE
+                     SET    value = EXCLUDED.value
+                          , recorded_at = EXCLUDED.recorded_at;
+                  """
+            executemany_prepared(cur, sql, rows)
+        conn.commit()
+
+#metrics of a task to proc.run_metrics and the configured sinks, called for failed runs too.
+#a broken sink is reported, it does not fail the task
+def export_metrics(conn_id, run_id, task, metrics, metrics_dir=METRICS_DIR, statsd=STATSD_ADDRESS):
+    for enabled, sink, args in ((True, save_metrics, (conn_id, run_id, task, metrics)),
+                                (metrics_dir, write_textfile, (metrics, task, metrics_dir)),
+                                (statsd, send_statsd, (metrics, task, statsd))):
+        if enabled:
+            try:
+                sink(*args)
+            except (OSError, psycopg2.Error) as exc:
+                print(f'metrics export to {sink.__name__} failed: {exc}')
@@ -0,0 +1,104 @@
+import hashlib
+import json
+from hh_parsing.db import connection, executemany_prepared
+
+#profiled statements run under this EXPLAIN. ANALYZE executes them, so a profiled load changes core like a normal one
+EXPLAIN = 'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) '
+
+#statements slower or touching more blocks than RATIO times their median over the last HISTORY profiled runs are flagged,
+#statements under MIN_MS and MIN_BLOCKS or with less than MIN_RUNS runs of history are too noisy to compare
+RATIO = 2.0
+HISTORY = 10
+MIN_RUNS = 3
+MIN_MS = 10.0
+MIN_BLOCKS = 1000
+
+#plan node and its children, init plans of CTEs included
+def iter_nodes(node):
+    yield node
+    for child in node.get('Plans') or []:
+        yield from iter_nodes(child)
+
+#largest ratio between estimated and actual rows of a node, both per loop and at least 1
+def max_misestimate(plan):
+    ratio = 1.0
+    for node in iter_nodes(plan):
+        if not node.get('Actual Loops'):
+            continue
+        estimate = max(node['Plan Rows'], 1.0)
+        actual = max(node['Actual Rows'], 1.0)
+        ratio = max(ratio, estimate / actual, actual / estimate)
+    return ratio
+
+#node producing the rows of a statement: the top node, for INSERT/UPDATE/DELETE the node feeding the table
+def result_node(plan):
+    if plan['Node Type'] == 'ModifyTable':
+        for child in plan.get('Plans') or []:
+            if child.get('Parent Relationship') == 'Outer':
+                return child
+    return plan
+
+#rows a statement returned or changed, like cursor.rowcount of an unprofiled run
+def affected_rows(plan):
+    node = result_node(plan)
+    return int(node.get('Actual Rows', 0) * node.get('Actual Loops', 0))
+
+#row of proc.query_plan without run_id from the EXPLAIN output of statement number statement_no of step
+def plan_row(step, statement_no, statement, explain):
+    result = explain[0]
+    plan = result['Plan']
+    return (step,
+            statement_no,
+            hashlib.md5(statement.encode()).hexdigest(),
+            result.get('Planning Time', 0.0),
+            result['Execution Time'],
+            result_node(plan)['Plan Rows'],
+            affected_rows(plan),
+            max_misestimate(plan),
+            plan.get('Shared Hit Blocks'),
+            plan.get('Shared Read Blocks'),
+            plan.get('Shared Dirtied Blocks'),
+            plan.get('Shared Written Blocks'),
+            plan.get('Temp Read Blocks'),
+            plan.get('Temp Written Blocks'),
+            json.dumps(result))
+
+#execute statement under EXPLAIN on cur, its plan row goes to plans. returns the affected rows
+def explain_statement(cur, step, statement_no, statement, params, plans):
+    cur.execute(EXPLAIN + statement, params)
+    explain = cur.fetchone()[0]
+    #json of the plan comes as text when the json type is not registered
+    explain = json.loads(explain) if isinstance(explain, str) else explain
+    plans.append(plan_row(step, statement_no, statement, explain))
+    return affected_rows(explain[0]['Plan'])
+
+#plans of a retried run replace those of its earlier attempt
+def save_plans(conn_id, run_id, plans):
+    with connection(conn_id) as conn:
+        with conn.cursor() as cur:
+            cur.execute("""DELETE FROM proc.query_plan WHERE run_id = %s;""", (run_id,))
+            sql = """INSERT INTO proc.query_plan (run_id, step, statement_no, query_hash, captured_at, planning_ms, execution_ms,
+                                                  plan_rows, actual_rows, max_misestimate, shared_hit, shared_read, shared_dirtied,
+                                                  shared_written, temp_read, temp_written, plan)
+                     VALUES (%s, %s, %s, %s, now(), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+                  """
+            executemany_prepared(cur, sql, [(run_id, *plan) for plan in plans])
+        conn.commit()
+
+#flagged statements of a profiled run: (step, statement_no, execution_ms, median_ms, blocks, median_blocks, runs, slower, more_blocks).
+#a statement with less than min_runs earlier profiled runs is never flagged
+def get_regressions(conn_id, run_id, ratio=RATIO, history=HISTORY, min_runs=MIN_RUNS, min_ms=MIN_MS, min_blocks=MIN_BLOCKS):
+    with connection(conn_id) as conn:
+        with conn.cursor() as cur:
+            sql = """SELECT step, statement_no, execution_ms, median_ms, blocks, median_blocks, runs, slower, more_blocks
+                     FROM proc.plan_regressions(%s, %s, %s, %s, %s, %s)
+                     WHERE slower OR more_blocks;
+                  """
+            cur.execute(sql, (run_id, ratio, history, min_runs, min_ms, min_blocks))
+            return cur.fetchall()
+
+def print_regressions(regressions):
+    for step, statement_no, execution_ms, median_ms, blocks, median_blocks, runs, slower, more_blocks in regressions:
+        print(f'plan regression {step}#{statement_no}: {execution_ms:.1f} ms (median {median_ms:.1f} ms), '
+              f'{blocks} blocks (median {median_blocks:.0f}) over {runs} runs'
+              + (', slower' if slower else '') + (', more blocks' if more_blocks else ''))
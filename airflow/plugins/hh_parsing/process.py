@@ -1,120 +1,288 @@
-import fake_useragent
-import requests
-import json
-import psycopg2
-from airflow.hooks.base_hook import BaseHook
-
-#fake useragent
-def get_headers():
-    user = fake_useragent.UserAgent().random
-    headers = {'user-agent': user}
-    return headers
-
-def get_postgres_conn(conn_id):
-    hook = BaseHook.get_connection(conn_id)
-    conn = psycopg2.connect(host=hook.host,
-                            port=hook.port,
-                            user=hook.login, 
-                            password=hook.password,
-                            dbname=hook.schema)
-    return conn
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlparse
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from hh_parsing.bulk import copy_rows, insert_rows
+from hh_parsing.classify import CLASS_COLUMNS, get_classifier
+from hh_parsing.client import HH_API_URL, HHClient
+from hh_parsing.db import connection
+from hh_parsing.decode import VACANCY_COLUMNS, decode_page
+from hh_parsing.keys import DIFF_COLUMNS, KEY_COLUMNS, hash_diffs, with_keys
+from hh_parsing.metrics import Metrics, NullMetrics, export_metrics
+from hh_parsing.rates import HH_DICTIONARIES_URL, RATES_FILE, load_rates
+from hh_parsing.raw import RAW_DIR, RawWriter, iter_raw_pages
+from hh_parsing.state import shard_key, get_run_queries, get_checkpoints, save_checkpoint, get_loaded_ids, get_stage_table, finish_run
+
+#api.hh.ru returns at most 2000 items per query, deeper pages are rejected
+PER_PAGE = 100
+MAX_FOUND = 2000
+MAX_PAGES = MAX_FOUND // PER_PAGE
+
+#queries over the limit are split into date windows down to this size, then by area
+MIN_WINDOW = timedelta(hours=1)
+
+#concurrent crawl settings, max_workers <= 1 switches to sequential crawl
+MAX_WORKERS = 8
+MAX_RPS = 10
+
+#rows per flush to the stage partition
+CHUNK_SIZE = 5000
+
+#filters
+FILTERS = ['"Data Engineer" OR "Инженер данных" OR "Дата Инженер"'
+           , '"Data Analyst" OR "Аналитик данных"'
+           , '"Data Scientist"']
+
+#columns of the rows loaded to stage.vacancy
+STAGE_VACANCY_COLUMNS = VACANCY_COLUMNS + KEY_COLUMNS + CLASS_COLUMNS + DIFF_COLUMNS
 
 #get pages with data from api.hh.ru
-def get_page(filter, period, pg=0):
+def get_page(client, query, pg=0, url=HH_API_URL):
     params = {
-        'text': filter,
         'page': pg,
-        'per_page': 100,
-        'period': period
+        'per_page': PER_PAGE
     }
-    url = 'https://api.hh.ru/vacancies'
-    req = requests.get(url, params, headers=get_headers())
-    data = req.content.decode()
-    req.close()
-    return data
+    for key, value in query.items():
+        params[key] = value.isoformat() if isinstance(value, datetime) else value
+    return client.get(url, params)
+
+#area ids from the area cluster of a search response
+def get_cluster_areas(page):
+    areas = []
+    for cluster in page.clusters or []:
+        if cluster['id'] == 'area':
+            for item in cluster['items']:
+                areas.extend(parse_qs(urlparse(item['url']).query).get('area', [])[-1:])
+    return areas
+
+#split a query that found more than MAX_FOUND vacancies:
+#halve the date window, below MIN_WINDOW split by area clusters
+def split_query(query, fetch):
+    if query['date_to'] - query['date_from'] > MIN_WINDOW:
+        middle = query['date_from'] + (query['date_to'] - query['date_from']) / 2
+        middle = middle.replace(microsecond=0)
+        return [dict(query, date_to=middle), dict(query, date_from=middle)]
+    if 'area' not in query:
+        areas = get_cluster_areas(fetch(dict(query, clusters='true'), 0)[0])
+        if areas:
+            return [dict(query, area=area) for area in areas]
+    return []
+
+#probe page 0 of every query and split queries over the search depth limit until every shard fits.
+#probes of one level run through map_fn, shards with key in skip are not crawled.
+#a shard that cannot be split any further is crawled up to the limit and counted in hh_shards_truncated_total.
+#fetch returns (decoded page, response body), yields (shard, page 0 of shard, response body)
+def plan_shards(queries, fetch, map_fn=map, skip=(), metrics=None):
+    metrics = metrics or NullMetrics()
+    pending = [query for query in queries if shard_key(query) not in skip]
+    while pending:
+        first_pages = list(map_fn(lambda query: fetch(query, 0), pending))
+        next_pending = []
+        for query, (first_page, data) in zip(pending, first_pages):
+            if first_page.found <= MAX_FOUND:
+                yield query, first_page, data
+                continue
+            shards = split_query(query, fetch)
+            if shards:
+                next_pending.extend(shard for shard in shards if shard_key(shard) not in skip)
+            else:
+                metrics.incr('hh_shards_truncated_total')
+                yield query, first_page, data
+        pending = next_pending
+
+#number of pages crawled for a shard
+def shard_pages(first_page):
+    return max(min(first_page.pages, MAX_PAGES), 1)
+
+#fetch and decode one page of a shard, returns (decoded page, response body)
+def fetch_page(client, query, page, url, metrics):
+    data = get_page(client, query, page, url)
+    with metrics.timer('hh_decode_seconds'):
+        decoded = decode_page(data)
+    metrics.incr('hh_pages_fetched_total')
+    return decoded, data
+
+#sequential crawl, one page after another, yields (shard, page, response body)
+def iter_pages_sequential(queries, url=HH_API_URL, skip=(), metrics=None):
+    metrics = metrics or NullMetrics()
+    client = HHClient(pool_size=1, metrics=metrics)
+
+    def fetch(query, page):
+        return fetch_page(client, query, page, url, metrics)
+
+    try:
+        for query, first_page, data in plan_shards(queries, fetch, skip=skip, metrics=metrics):
+            yield query, first_page, data
+            for page in range(1, shard_pages(first_page)):
+                yield (query, *fetch(query, page))
+    finally:
+        client.close()
+
+#concurrent crawl: shards are planned level by level with parallel probes of page 0,
+#the rest of the pages of every shard are fetched in parallel.
+#at most max_workers * 2 pages are in flight, (shard, page, response body) are yielded in request order
+def iter_pages_concurrent(queries, max_workers=MAX_WORKERS, max_rps=MAX_RPS, url=HH_API_URL, skip=(), metrics=None):
+    metrics = metrics or NullMetrics()
+    client = HHClient(pool_size=max_workers, max_rps=max_rps, metrics=metrics)
+
+    def fetch(query, page):
+        return fetch_page(client, query, page, url, metrics)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            tasks = deque()
+            window = deque()
+
+            def fill():
+                while tasks and len(window) < max_workers * 2:
+                    query, page = tasks.popleft()
+                    window.append((query, executor.submit(fetch, query, page)))
+
+            for query, first_page, data in plan_shards(queries, fetch, executor.map, skip, metrics):
+                tasks.extend((query, page) for page in range(1, shard_pages(first_page)))
+                fill()
+                yield query, first_page, data
+
+            while window:
+                query, future = window.popleft()
+                page, data = future.result()
+                fill()
+                yield query, page, data
+    finally:
+        client.close()
+
+def iter_pages(queries, max_workers=MAX_WORKERS, max_rps=MAX_RPS, url=HH_API_URL, skip=(), metrics=None):
+    if max_workers <= 1:
+        return iter_pages_sequential(queries, url, skip, metrics)
+    return iter_pages_concurrent(queries, max_workers, max_rps, url, skip, metrics)
+
+#vacancy records of decoded pages with hash keys and title classes, vacancies already in seen are skipped
+def iter_vacancies(pages, classifier, seen=None, metrics=None):
+    seen = set() if seen is None else seen
+    metrics = metrics or NullMetrics()
+    for page in pages:
+        metrics.incr('hh_rows_decoded_total', len(page.records))
+        for record in page.records:
+            if record[0] in seen:
+                metrics.incr('hh_rows_deduplicated_total')
+                continue
+            seen.add(record[0])
+            classes = classifier.classify(record[1])
+            yield with_keys(record) + classes + hash_diffs(record, classes)
+
+#load rows to the stage partition table of the run, time and row count go to metrics
+def load_stage(load_rows, cur, table, rows, metrics):
+    if not rows:
+        return
+    with metrics.timer('stage_load_seconds'):
+        count = load_rows(cur, table, STAGE_VACANCY_COLUMNS, rows)
+    metrics.incr('stage_rows_loaded_total', count)
+
+#a new run partition has no statistics until autovacuum gets to it, the core steps would be planned blind
+def analyze_stage(cur, table):
+    cur.execute(f"""ANALYZE {table}""")
 
 #get and transform data
-def get_vacancies(conn_id):
-    #check init setting from db
-    conn = get_postgres_conn(conn_id)
-    cur = conn.cursor()
-    sql = """SELECT value
-             FROM proc.settings
-             WHERE name = 'is_init';
-          """
-    cur.execute(sql)
-    select = cur.fetchall()
-
-    if not select:
-        period = 30 #full load
-        sql = """INSERT INTO proc.settings (id, name, value) VALUES (1, 'is_init', 'False');"""
-        cur.execute(sql)
-        conn.commit()
-    else:
-        period = 1 #incremental load
-
-    cur.close()
-
-    #filters
-    filters = ['"Data Engineer" OR "Инженер данных" OR "Дата Инженер"'
-               , '"Data Analyst" OR "Аналитик данных"'
-               , '"Data Scientist"']
-
-    raw_vacancies = []
-    for filter in filters:
-        for page in range(0, 25):
-            page_dict = json.loads(get_page(filter, period, page))
-            print(page_dict['pages'])
-            if page_dict.get('items') is not None:
-                for vacancy in page_dict.get('items'):
-                    raw_vacancies.append(vacancy)
-
-            if (page_dict['pages'] - page) <= 1:
-                break
-
-    #prep data for load in db
-    vacancies = set()
-    for vacancy in raw_vacancies:
-        vacancies.add((int(vacancy['id']),                                                                                                  #id
-                          vacancy['name'],                                                                                                  #vacancy_name
-                          vacancy['published_at'],                                                                                          #published_at
-                          bool(True if vacancy['archived'] == 'true' else False),                                                           #is_archive
-                          bool(True if vacancy['type']['id'] == 'open' else False),                                                         #is_open
-                          (vacancy['employer']['id'] if 'id' in vacancy['employer'] else None),                                             #employer_id
-                          (vacancy['employer']['name'] if 'name' in vacancy['employer'] else None),                                         #employer_name
-                          bool(vacancy['employer']['accredited_it_employer'] if 'accredited_it_employer' in vacancy['employer'] else None), #is_accredited_it_employer
-                          (vacancy['experience']['id'] if 'id' in vacancy['experience'] else None),                                         #experience_id
-                          (vacancy['experience']['name'] if 'name' in vacancy['experience'] else None),                                     #experience_name
-                          (vacancy['area']['id'] if 'id' in vacancy['experience'] else None),                                               #area_id
-                          (vacancy['area']['name'] if 'name' in vacancy['experience'] else None),                                           #area_name
-                          (vacancy['salary']['from'] if vacancy['salary'] is not None else None),                                           #salary_from
-                          (vacancy['salary']['to'] if vacancy['salary'] is not None else None),                                             #salary_to
-                          (vacancy['salary']['currency'] if vacancy['salary'] is not None else None),                                       #salary_currency
-                          bool(vacancy['salary']['gross'] if vacancy['salary'] is not None else None)))                                     #is_gross
-
-    return vacancies
-
-#load data in db
-def load_data(conn_id):
-    conn = get_postgres_conn(conn_id)
-
-    with conn.cursor() as cur:
-        sql = """INSERT INTO stage.vacancy (   id
-                                             , vacancy_name
-                                             , published_at
-                                             , is_archive
-                                             , is_open
-                                             , employer_id
-                                             , employer_name
-                                             , is_accredited_it_employer
-                                             , experience_id
-                                             , experience_name
-                                             , area_id
-                                             , area_name
-                                             , salary_from
-                                             , salary_to
-                                             , salary_currency
-                                             , is_gross)
-                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
-        cur.executemany(sql, get_vacancies(conn_id))
-        conn.commit()
\ No newline at end of file
+def get_vacancies(conn_id, max_workers=MAX_WORKERS, max_rps=MAX_RPS, url=HH_API_URL):
+    with connection(conn_id) as conn:
+        queries = get_run_queries(conn, FILTERS)
+        classifier = get_classifier(conn)
+    pages = iter_pages(queries, max_workers, max_rps, url)
+    return set(iter_vacancies((page for _, page, _ in pages), classifier))
+
+#load data in db, method: copy (COPY FROM STDIN) or insert (executemany fallback).
+#rows go to the unlogged stage partition of run_id, load_core reads only that partition.
+#rows are flushed in chunks of chunk_size while later pages are still being fetched.
+#every completed shard is committed with a checkpoint, a retried run skips loaded shards.
+#raw responses are kept in the raw landing zone, with replay_from/replay_to set
+#the stage of the run is built from the raw files of that date range instead of the api.
+#exchange rates of the day are refreshed first, a failure leaves the salaries of the run unconverted until the next load.
+#a replay makes no api calls and converts salaries with the rates already saved.
+#crawl and load metrics of the run go to proc.run_metrics and the configured sinks
+def load_data(conn_id, run_id=None, method='copy', chunk_size=CHUNK_SIZE,
+              max_workers=MAX_WORKERS, max_rps=MAX_RPS, url=HH_API_URL,
+              replay_from=None, replay_to=None, raw_dir=RAW_DIR,
+              rates_url=HH_DICTIONARIES_URL, rates_file=RATES_FILE):
+    run_id = run_id or f'manual__{datetime.now().isoformat()}'
+    metrics = Metrics()
+    start = time.perf_counter()
+    try:
+        if replay_from or replay_to:
+            replay_data(conn_id, run_id, replay_from or replay_to, replay_to or replay_from, method, chunk_size, raw_dir, metrics)
+        else:
+            try:
+                with connection(conn_id) as conn:
+                    load_rates(conn, path=rates_file, url=rates_url)
+            except (OSError, ValueError) as exc:
+                metrics.incr('rates_failures_total')
+                print(f'exchange rates not loaded: {exc}')
+            crawl_data(conn_id, run_id, method, chunk_size, max_workers, max_rps, url, raw_dir, metrics)
+    finally:
+        metrics.set('task_seconds', time.perf_counter() - start)
+        export_metrics(conn_id, run_id, 'load_data', metrics)
+
+def crawl_data(conn_id, run_id, method='copy', chunk_size=CHUNK_SIZE, max_workers=MAX_WORKERS,
+               max_rps=MAX_RPS, url=HH_API_URL, raw_dir=RAW_DIR, metrics=None):
+    metrics = metrics or NullMetrics()
+    load_rows = copy_rows if method == 'copy' else insert_rows
+    with connection(conn_id) as conn:
+        queries = get_run_queries(conn, FILTERS, run_id)
+        done = get_checkpoints(conn, run_id)
+        table = get_stage_table(conn, run_id)
+        seen = get_loaded_ids(conn, run_id)
+        classifier = get_classifier(conn)
+        raw = RawWriter(run_id, max(query['date_to'] for query in queries), raw_dir)
+
+        pages_left = {}
+        shard_rows = Counter()
+        rows = []
+        try:
+            with conn.cursor() as cur:
+                for query, page, data in iter_pages(queries, max_workers, max_rps, url, done, metrics):
+                    key = shard_key(query)
+                    if key not in pages_left:
+                        pages_left[key] = shard_pages(page)
+                    pages_left[key] -= 1
+                    raw.write(key, query, data)
+
+                    for row in iter_vacancies([page], classifier, seen, metrics):
+                        rows.append(row)
+                        shard_rows[key] += 1
+                    if len(rows) >= chunk_size or not pages_left[key]:
+                        load_stage(load_rows, cur, table, rows, metrics)
+                        rows = []
+
+                    if not pages_left[key]:
+                        raw.close_shard(key)
+                        save_checkpoint(cur, run_id, query, shard_rows.pop(key, 0))
+                        conn.commit()
+                        metrics.incr('crawl_shards_total')
+
+                load_stage(load_rows, cur, table, rows, metrics)
+                finish_run(cur, run_id)
+                analyze_stage(cur, table)
+                conn.commit()
+        finally:
+            raw.close()
+
+#rebuild stage from the raw landing zone, the newest copy of a vacancy wins
+def replay_data(conn_id, run_id, date_from, date_to, method='copy', chunk_size=CHUNK_SIZE, raw_dir=RAW_DIR, metrics=None):
+    metrics = metrics or NullMetrics()
+    load_rows = copy_rows if method == 'copy' else insert_rows
+    with connection(conn_id) as conn:
+        table = get_stage_table(conn, run_id)
+        seen = get_loaded_ids(conn, run_id)
+        classifier = get_classifier(conn)
+
+        rows = []
+        with conn.cursor() as cur:
+            pages = map(decode_page, iter_raw_pages(date_from, date_to, raw_dir))
+            for row in iter_vacancies(pages, classifier, seen, metrics):
+                rows.append(row)
+                if len(rows) >= chunk_size:
+                    load_stage(load_rows, cur, table, rows, metrics)
+                    rows = []
+            load_stage(load_rows, cur, table, rows, metrics)
+            analyze_stage(cur, table)
+            conn.commit()
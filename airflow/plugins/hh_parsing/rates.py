@@ -0,0 +1,65 @@
+import csv
+import json
+import os
+from datetime import date
+from hh_parsing.client import HHClient
+
+#api.hh.ru reference dictionaries, currency[].rate is the amount of the currency per 1 RUR
+HH_DICTIONARIES_URL = 'https://api.hh.ru/dictionaries'
+
+#local rates file, used instead of the api when present: currency,rate_date,rate with rate in RUR per unit
+RATES_FILE = os.environ.get('HH_RATES_FILE', '/opt/airflow/data/exchange_rates.csv')
+
+BASE_CURRENCY = 'RUR'
+
+#(database, day) with rates already in core.ref_exchange_rate, the api is asked at most once per day and process
+_loaded_days = set()
+
+#{currency: RUR per unit} from the dictionaries response
+def parse_dictionaries(data):
+    rates = {}
+    for currency in json.loads(data).get('currency') or []:
+        if currency.get('code') and currency.get('rate'):
+            rates[currency['code']] = round(1 / currency['rate'], 6)
+    rates[BASE_CURRENCY] = 1.0
+    return rates
+
+def fetch_rates(url=HH_DICTIONARIES_URL):
+    with HHClient(pool_size=1) as client:
+        return parse_dictionaries(client.get(url))
+
+#[(currency, rate_date, rate)] of a rates file
+def read_rates_file(path=RATES_FILE):
+    with open(path, newline='', encoding='utf-8') as file:
+        return [(row['currency'].strip(), date.fromisoformat(row['rate_date'].strip()), float(row['rate']))
+                for row in csv.DictReader(file)]
+
+def has_rates(cur, day):
+    sql = """SELECT EXISTS (SELECT 1 FROM core.ref_exchange_rate WHERE rate_date = %s);"""
+    cur.execute(sql, (day,))
+    return cur.fetchone()[0]
+
+def save_rates(cur, rows, record_source):
+    sql = """INSERT INTO core.ref_exchange_rate (currency, rate_date, rate, record_source, load_date)
+             VALUES (%s, %s, %s, %s, now())
+             ON CONFLICT (currency, rate_date) DO UPDATE
+             SET    rate = EXCLUDED.rate
+                  , record_source = EXCLUDED.record_source
+                  , load_date = EXCLUDED.load_date;
+          """
+    cur.executemany(sql, [(*row, record_source) for row in rows])
+
+#fill core.ref_exchange_rate for day: from the rates file when it exists, otherwise from api.hh.ru
+#unless rates of that day are already saved. sat_salary converts salaries with the latest saved rates
+def load_rates(conn, day=None, path=RATES_FILE, url=HH_DICTIONARIES_URL):
+    day = day or date.today()
+    key = (conn.dsn, day)
+    if key in _loaded_days:
+        return
+    with conn.cursor() as cur:
+        if path and os.path.exists(path):
+            save_rates(cur, read_rates_file(path), 'file')
+        elif not has_rates(cur, day):
+            save_rates(cur, [(currency, day, rate) for currency, rate in fetch_rates(url).items()], 'hh')
+    conn.commit()
+    _loaded_days.add(key)
@@ -0,0 +1,83 @@
+import gzip
+import hashlib
+import os
+from datetime import date, datetime, timedelta
+
+#raw api.hh.ru responses: {RAW_DIR}/dt=YYYY-MM-DD/run=<run_id>/<filter>/<shard>.ndjson.gz,
+#one line per page of the shard in page order
+RAW_DIR = os.environ.get('HH_RAW_DIR', '/opt/airflow/data/raw')
+
+def safe_name(value):
+    return ''.join(char if char.isalnum() or char in '-_.' else '_' for char in str(value))
+
+def short_hash(value):
+    return hashlib.md5(str(value).encode()).hexdigest()[:12]
+
+def shard_name(query):
+    name = f"{query['date_from']:%Y%m%dT%H%M%S}-{query['date_to']:%Y%m%dT%H%M%S}"
+    if query.get('area'):
+        name += f"-area{safe_name(query['area'])}"
+    return name
+
+#writes the pages of every shard of a run, a shard file becomes visible once all its pages are written
+class RawWriter:
+    def __init__(self, run_id, run_date, raw_dir=RAW_DIR):
+        self.path = os.path.join(raw_dir, f'dt={run_date:%Y-%m-%d}', f'run={safe_name(run_id)}')
+        self.files = {}
+
+    def shard_path(self, query):
+        return os.path.join(self.path, short_hash(query['text']), shard_name(query) + '.ndjson.gz')
+
+    def write(self, key, query, data):
+        if key not in self.files:
+            path = self.shard_path(query)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.files[key] = (path, gzip.open(path + '.tmp', 'wb'))
+        #newlines can only be whitespace in a json document
+        self.files[key][1].write(data.replace(b'\n', b' ') + b'\n')
+
+    def close_shard(self, key):
+        path, file = self.files.pop(key)
+        file.close()
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        for path, file in self.files.values():
+            file.close()
+        self.files = {}
+
+def parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(value)
+
+#time a run directory was last written to: the mtime of its newest shard file
+def run_mtime(path):
+    return max((os.path.getmtime(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files),
+               default=0.0)
+
+#run directories of a partition, the run that wrote last first. run ids do not sort by time,
+#scheduled__ ids sort ahead of a later manual__ run of the same day
+def run_dirs(partition):
+    paths = [os.path.join(partition, name) for name in os.listdir(partition)]
+    return sorted((path for path in paths if os.path.isdir(path)), key=run_mtime, reverse=True)
+
+#raw pages of all runs between date_from and date_to, newest partition and within it newest run first,
+#so the first copy of a vacancy is the one a normal run would have loaded last
+def iter_raw_pages(date_from, date_to, raw_dir=RAW_DIR):
+    day = parse_date(date_to)
+    date_from = parse_date(date_from)
+    while day >= date_from:
+        partition = os.path.join(raw_dir, f'dt={day:%Y-%m-%d}')
+        if os.path.isdir(partition):
+            for run in run_dirs(partition):
+                for root, dirs, files in os.walk(run):
+                    dirs.sort()
+                    for name in sorted(files):
+                        if name.endswith('.ndjson.gz'):
+                            with gzip.open(os.path.join(root, name), 'rb') as file:
+                                for line in file:
+                                    yield line
+        day -= timedelta(days=1)
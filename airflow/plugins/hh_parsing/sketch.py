@@ -0,0 +1,69 @@
+import math
+
+#salaries in log-sized buckets: bucket i counts salaries from SKETCH_MIN * GAMMA ** i up to SKETCH_MIN * GAMMA ** (i + 1),
+#lower salaries go to bucket 0 and higher than the last bucket to MAX_BUCKET. a percentile is reported as the middle
+#of its bucket, within (GAMMA - 1) / (GAMMA + 1), 1% with GAMMA 1.02, of the exact one.
+#mart.salary_bucket_value uses the same buckets, mart.vacancy_daily has to be rebuilt when they change
+GAMMA = 1.02
+SKETCH_MIN = 1000.0
+MAX_BUCKET = 600
+
+LOG_GAMMA = math.log(GAMMA)
+
+def bucket(value):
+    if value <= SKETCH_MIN:
+        return 0
+    return min(int(math.log(value / SKETCH_MIN) / LOG_GAMMA), MAX_BUCKET)
+
+def bucket_value(index):
+    return SKETCH_MIN * GAMMA ** index * (1 + GAMMA) / 2
+
+#sparse histogram of salaries, {bucket: count}. sketches of different days and groups merge by adding
+#the counts of equal buckets, so percentiles of any combination need no vacancy rows
+class SalarySketch:
+    __slots__ = ('counts', 'count', 'sum', 'min', 'max')
+
+    def __init__(self, counts=None):
+        self.counts = dict(counts or {})
+        self.count = sum(self.counts.values())
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+
+    #sketch of the salary_buckets and salary_counts arrays of mart.vacancy_daily
+    @classmethod
+    def from_arrays(cls, buckets, counts):
+        return cls(zip(buckets, counts))
+
+    def add(self, value):
+        value = float(value)
+        index = bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    #value of the q-th quantile, 0 <= q <= 1: the first bucket where the running count reaches q of all. None when empty
+    def percentile(self, q):
+        total = 0
+        for index in sorted(self.counts):
+            total += self.counts[index]
+            if total >= q * self.count:
+                return bucket_value(index)
+        return None
+
+    #(buckets, counts) in bucket order
+    def arrays(self):
+        buckets = sorted(self.counts)
+        return buckets, [self.counts[index] for index in buckets]
@@ -0,0 +1,73 @@
+import time
+from datetime import date
+from hh_parsing.db import connection, executemany_prepared
+from hh_parsing.metrics import Metrics, export_metrics
+from hh_parsing.raw import parse_date
+from hh_parsing.sketch import SalarySketch
+
+#rows per round trip of the snapshot cursor
+FETCH_SIZE = 10000
+
+#current vacancies not expired yet with their current area, experience and salary in RUR.
+#'' stands for a missing grade, area or experience so every group has a key
+SNAPSHOT_SQL = """SELECT      sv.type
+                            , coalesce(sv.grade, '')
+                            , coalesce(sa.area_name, '')
+                            , coalesce(se.experience_name, '')
+                            , ss.salary_mid_gross_rub
+                  FROM        core.sat_vacancy AS sv
+                  LEFT JOIN   core.link_vacancy_area AS lva ON lva.vacancy_hk = sv.vacancy_hk AND lva.date_to IS NULL
+                  LEFT JOIN   core.sat_area AS sa ON sa.area_hk = lva.area_hk AND sa.load_end_date IS NULL
+                  LEFT JOIN   core.link_vacancy_experience AS lve ON lve.vacancy_hk = sv.vacancy_hk AND lve.date_to IS NULL
+                  LEFT JOIN   core.sat_experience AS se ON se.experience_hk = lve.experience_hk AND se.load_end_date IS NULL
+                  LEFT JOIN   core.link_vacancy_salary AS lvs ON lvs.vacancy_hk = sv.vacancy_hk AND lvs.date_to IS NULL
+                  LEFT JOIN   core.sat_salary AS ss ON ss.salary_hk = lvs.salary_hk AND ss.load_end_date IS NULL
+                  WHERE       sv.load_end_date IS NULL
+                              AND sv.deleted_at IS NULL
+                              AND sv.type IS NOT NULL;
+               """
+
+#{(type, grade, area_name, experience_name): [vacancies, salary sketch]} of the rows of SNAPSHOT_SQL
+def build_groups(rows):
+    groups = {}
+    for type_, grade, area_name, experience_name, salary in rows:
+        group = groups.get((type_, grade, area_name, experience_name))
+        if group is None:
+            group = groups[(type_, grade, area_name, experience_name)] = [0, SalarySketch()]
+        group[0] += 1
+        if salary is not None:
+            group[1].add(salary)
+    return groups
+
+def snapshot_row(day, key, count, sketch):
+    return (day, *key, count, sketch.count, sketch.sum if sketch.count else None, sketch.min, sketch.max, *sketch.arrays())
+
+#replace the snapshot of day in mart.vacancy_daily with the vacancies open in core now, grouped by type, grade,
+#area and experience with a salary sketch per group. day is the logical date of the dag run ('YYYY-MM-DD' or a date),
+#today without one. a later run of the same day replaces the snapshot of an earlier one
+def snapshot_vacancies(conn_id, run_id, day=None):
+    metrics = Metrics()
+    start = time.perf_counter()
+    day = parse_date(day) if day else date.today()
+    try:
+        with connection(conn_id) as conn:
+            #server side cursor, only the groups are held in memory
+            with conn.cursor(name='snapshot_vacancies') as cur:
+                cur.itersize = FETCH_SIZE
+                cur.execute(SNAPSHOT_SQL)
+                groups = build_groups(cur)
+            with conn.cursor() as cur:
+                cur.execute("""DELETE FROM mart.vacancy_daily WHERE snapshot_date = %s;""", (day,))
+                sql = """INSERT INTO mart.vacancy_daily (snapshot_date, type, grade, area_name, experience_name, cnt, cnt_salary,
+                                                         salary_sum, salary_min, salary_max, salary_buckets, salary_counts)
+                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s);
+                      """
+                executemany_prepared(cur, sql, [snapshot_row(day, key, count, sketch)
+                                                for key, (count, sketch) in groups.items()])
+            conn.commit()
+        metrics.set('snapshot_groups', len(groups))
+        metrics.set('snapshot_vacancies', sum(count for count, _ in groups.values()))
+        print(f'{len(groups)} groups of {day} saved')
+    finally:
+        metrics.set('task_seconds', time.perf_counter() - start)
+        export_metrics(conn_id, run_id, 'snapshot_vacancies', metrics)
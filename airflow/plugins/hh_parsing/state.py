@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+from hh_parsing.db import execute_prepared
+
+#first run of a filter loads this many days
+FULL_PERIOD = 30
+
+#incremental window starts this long before the watermark to catch late indexed vacancies
+WATERMARK_OVERLAP = timedelta(hours=1)
+
+#checkpoint key of a shard
+def shard_key(query):
+    return (query['text'], query['date_from'], query['date_to'], query.get('area') or '')
+
+#date window of every filter for the run.
+#a retried run reuses the windows saved by its first attempt,
+#a new run starts from the filter watermark or loads FULL_PERIOD days
+def get_run_queries(conn, filters, run_id=None, now=None):
+    with conn.cursor() as cur:
+        if run_id is not None:
+            sql = """SELECT filter, date_from, date_to
+                     FROM proc.crawl_window
+                     WHERE run_id = %s;
+                  """
+            cur.execute(sql, (run_id,))
+            windows = {filter: (date_from, date_to) for filter, date_from, date_to in cur.fetchall()}
+            if windows:
+                return [{'text': filter, 'date_from': windows[filter][0], 'date_to': windows[filter][1]}
+                        for filter in filters if filter in windows]
+
+        sql = """SELECT filter, watermark
+                 FROM proc.crawl_state;
+              """
+        cur.execute(sql)
+        watermarks = dict(cur.fetchall())
+
+        date_to = (now or datetime.now()).replace(microsecond=0)
+        queries = []
+        for filter in filters:
+            if filter in watermarks:
+                date_from = watermarks[filter] - WATERMARK_OVERLAP
+            else:
+                date_from = date_to - timedelta(days=FULL_PERIOD)
+            queries.append({'text': filter, 'date_from': date_from, 'date_to': date_to})
+
+        if run_id is not None:
+            sql = """INSERT INTO proc.crawl_window (run_id, filter, date_from, date_to)
+                     VALUES (%s, %s, %s, %s);
+                  """
+            cur.executemany(sql, [(run_id, query['text'], query['date_from'], query['date_to']) for query in queries])
+    conn.commit()
+    return queries
+
+#shards already loaded by a previous attempt of the run
+def get_checkpoints(conn, run_id):
+    with conn.cursor() as cur:
+        sql = """SELECT filter, date_from, date_to, area
+                 FROM proc.crawl_checkpoint
+                 WHERE run_id = %s;
+              """
+        cur.execute(sql, (run_id,))
+        return set(cur.fetchall())
+
+def save_checkpoint(cur, run_id, query, rows_loaded):
+    sql = """INSERT INTO proc.crawl_checkpoint (run_id, filter, date_from, date_to, area, rows_loaded, loaded_at)
+             VALUES (%s, %s, %s, %s, %s, %s, now())
+             ON CONFLICT DO NOTHING;
+          """
+    execute_prepared(cur, sql, (run_id, *shard_key(query), rows_loaded))
+
+#partition of the run of a stage table, the partitions of the run are created when missing.
+#rows are loaded straight into it
+def get_stage_table(conn, run_id, stage_table='vacancy'):
+    with conn.cursor() as cur:
+        sql = """SELECT stage.create_run_partition(%s, FALSE), 'stage.' || stage.run_partition(%s, %s);"""
+        cur.execute(sql, (run_id, run_id, stage_table))
+        table = cur.fetchone()[1]
+    conn.commit()
+    return table
+
+#vacancy ids already in the stage of the run, used to dedup a resumed run
+def get_loaded_ids(conn, run_id):
+    with conn.cursor() as cur:
+        sql = """SELECT id
+                 FROM stage.vacancy
+                 WHERE run_id = %s;
+              """
+        cur.execute(sql, (run_id,))
+        return {row[0] for row in cur}
+
+#move filter watermarks to the end of the run windows
+def finish_run(cur, run_id):
+    sql = """INSERT INTO proc.crawl_state (filter, watermark, updated_at)
+             SELECT     filter
+                      , date_to
+                      , now()
+             FROM       proc.crawl_window
+             WHERE      run_id = %s
+             ON CONFLICT (filter) DO UPDATE
+             SET        watermark = GREATEST(crawl_state.watermark, EXCLUDED.watermark)
+                      , updated_at = EXCLUDED.updated_at;
+          """
+    cur.execute(sql, (run_id,))
@@ -0,0 +1,57 @@
+#pages/sec and connections opened against the local stub server: get_page before HHClient vs HHClient
+#usage: PYTHONPATH=airflow/plugins:bench python bench/bench_client.py
+import argparse
+import time
+import fake_useragent
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from hh_parsing.client import HHClient
+from stub_server import StubServer
+
+#get_page before HHClient, kept as the baseline: new user agent database and new connection per request
+def legacy_get_page(url, page):
+    headers = {'user-agent': fake_useragent.UserAgent().random}
+    req = requests.get(url, params={'page': page, 'per_page': 100}, headers=headers)
+    data = req.content
+    req.close()
+    return data
+
+def client_get_page(client, url, page):
+    return client.get(url, {'page': page, 'per_page': 100})
+
+def run(server, name, fetch, pages, workers):
+    server.reset()
+    start = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            size = sum(map(len, executor.map(fetch, range(pages))))
+    else:
+        size = sum(len(fetch(page)) for page in range(pages))
+    elapsed = time.perf_counter() - start
+    counters = server.counters
+    print(f'{name:<24} workers={workers:<3} {pages / elapsed:9.1f} pages/s '
+          f'{size / elapsed / 2 ** 20:7.1f} MB/s connections={counters["connections"]} '
+          f'requests={counters["requests"]} throttled={counters["throttled"]}')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--workers', default='1,8')
+    parser.add_argument('--latency', type=float, default=0.005)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--skip-legacy', action='store_true')
+    args = parser.parse_args()
+
+    server = StubServer(latency=args.latency, error_rate=args.error_rate).start()
+    try:
+        for workers in map(int, args.workers.split(',')):
+            if not args.skip_legacy:
+                run(server, 'get_page (legacy)', lambda page: legacy_get_page(server.url, page), args.pages, workers)
+            with HHClient(pool_size=workers, backoff=0.01) as client:
+                run(server, 'HHClient', lambda page: client_get_page(client, server.url, page), args.pages, workers)
+                print(' ' * 24, client.stats())
+    finally:
+        server.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#decode+transform throughput per page: json.loads with dict transform vs hh_parsing.decode
+#usage: PYTHONPATH=airflow/plugins:bench python bench/bench_decode.py
+import argparse
+import json
+import time
+from generator import make_page_bytes
+from hh_parsing.decode import decode_page, msgspec
+
+#transform of load_data before the decoder, kept as the baseline
+def legacy_decode(data):
+    page_dict = json.loads(data.decode())
+    vacancies = set()
+    for vacancy in page_dict.get('items'):
+        vacancies.add((int(vacancy['id']),
+                       vacancy['name'],
+                       vacancy['published_at'],
+                       bool(True if vacancy['archived'] == 'true' else False),
+                       bool(True if vacancy['type']['id'] == 'open' else False),
+                       (vacancy['employer']['id'] if 'id' in vacancy['employer'] else None),
+                       (vacancy['employer']['name'] if 'name' in vacancy['employer'] else None),
+                       bool(vacancy['employer']['accredited_it_employer'] if 'accredited_it_employer' in vacancy['employer'] else None),
+                       (vacancy['experience']['id'] if 'id' in vacancy['experience'] else None),
+                       (vacancy['experience']['name'] if 'name' in vacancy['experience'] else None),
+                       (vacancy['area']['id'] if 'id' in vacancy['experience'] else None),
+                       (vacancy['area']['name'] if 'name' in vacancy['experience'] else None),
+                       (vacancy['salary']['from'] if vacancy['salary'] is not None else None),
+                       (vacancy['salary']['to'] if vacancy['salary'] is not None else None),
+                       (vacancy['salary']['currency'] if vacancy['salary'] is not None else None),
+                       bool(vacancy['salary']['gross'] if vacancy['salary'] is not None else None)))
+    return vacancies
+
+def run(decode, pages, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for data in pages:
+            decode(data)
+    return (time.perf_counter() - start) / (repeat * len(pages))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    pages = [make_page_bytes(100, seed) for seed in range(args.pages)]
+    print(f'page size {sum(map(len, pages)) / len(pages) / 1024:.1f} KiB, decoder: {"msgspec" if msgspec else "json"}')
+    legacy = run(legacy_decode, pages, args.repeat)
+    current = run(decode_page, pages, args.repeat)
+    print(f'legacy  {legacy * 1000:8.3f} ms/page {1 / legacy:8.0f} pages/s')
+    print(f'decoder {current * 1000:8.3f} ms/page {1 / current:8.0f} pages/s  x{legacy / current:.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+#synthetic api.hh.ru /vacancies responses
+import json
+import random
+import re
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+AREAS = [('1', 'Москва'), ('2', 'Санкт-Петербург'), ('4', 'Новосибирск'), ('88', 'Казань'), ('66', 'Нижний Новгород')]
+EXPERIENCE = [('noExperience', 'Нет опыта'), ('between1And3', 'От 1 года до 3 лет'),
+              ('between3And6', 'От 3 до 6 лет'), ('moreThan6', 'Более 6 лет')]
+TITLES = ['Data Engineer', 'Senior Data Engineer', 'Инженер данных', 'Data Analyst', 'Junior Data Analyst',
+          'Аналитик данных', 'Data Scientist', 'Middle Data Scientist', 'Team Lead Data Engineer', 'Стажер Data Analyst']
+CURRENCIES = ['RUR', 'RUR', 'RUR', 'USD', 'KZT', 'EUR']
+SKILLS = ['SQL', 'Python', 'Apache Airflow', 'PostgreSQL', 'ETL', 'Apache Spark', 'Hadoop', 'ClickHouse', 'Kafka',
+          'dbt', 'Pandas', 'Tableau', 'Power BI', 'Machine Learning', 'Docker', 'Git', 'Linux', 'Greenplum']
+SCHEDULES = [('fullDay', 'Полный день'), ('remote', 'Удаленная работа'), ('flexible', 'Гибкий график')]
+EMPLOYMENTS = [('full', 'Полная занятость'), ('part', 'Частичная занятость'), ('project', 'Проектная работа')]
+
+#share of vacancies with a salary, of salaries with a lower/upper bound and gross, currencies drawn from,
+#share of optional fields (employer id, experience, accreditation, salary currency) left null
+DEFAULT_MIX = {'salary': 0.4,
+               'salary_from': 0.8,
+               'salary_to': 0.6,
+               'gross': 0.5,
+               'currencies': CURRENCIES,
+               'nulls': 0.0}
+
+#title, area and publication time are drawn by the caller when it needs to index them
+def make_vacancy(vacancy_id, rnd, now=None, mix=DEFAULT_MIX, title=None, area=None, published_at=None):
+    now = now or datetime(2024, 6, 1, 12)
+    area_id, area_name = area or rnd.choice(AREAS)
+    experience_id, experience_name = rnd.choice(EXPERIENCE)
+    employer_id = rnd.randrange(1, 20000)
+    salary = None
+    if rnd.random() < mix['salary']:
+        salary_from = rnd.randrange(50, 400) * 1000 if rnd.random() < mix['salary_from'] else None
+        salary_to = (salary_from or 100000) + rnd.randrange(0, 200) * 1000 if rnd.random() < mix['salary_to'] else None
+        if salary_from is None and salary_to is None:
+            #the api sends at least one bound
+            salary_from = rnd.randrange(50, 400) * 1000
+        salary = {'from': salary_from, 'to': salary_to, 'currency': rnd.choice(mix['currencies']), 'gross': rnd.random() < mix['gross']}
+    if published_at is None:
+        published_at = now - timedelta(seconds=rnd.randrange(0, 30 * 86400))
+    vacancy = {'id': str(vacancy_id),
+               'premium': False,
+               'name': title or rnd.choice(TITLES),
+               'department': None,
+               'has_test': False,
+               'response_letter_required': False,
+               'area': {'id': area_id, 'name': area_name, 'url': f'https://api.hh.ru/areas/{area_id}'},
+               'salary': salary,
+               'type': {'id': 'open', 'name': 'Открытая'},
+               'address': {'city': area_name, 'street': 'улица Льва Толстого', 'building': '16',
+                           'lat': 55.733974, 'lng': 37.587093, 'description': None, 'raw': f'{area_name}, улица Льва Толстого, 16',
+                           'metro': {'station_name': 'Парк культуры', 'line_name': 'Сокольническая', 'station_id': '1.97',
+                                     'line_id': '1', 'lat': 55.735221, 'lng': 37.593095},
+                           'metro_stations': [], 'id': str(rnd.randrange(1, 10 ** 7))},
+               'response_url': None,
+               'sort_point_distance': None,
+               'published_at': published_at.strftime('%Y-%m-%dT%H:%M:%S+0300'),
+               'created_at': published_at.strftime('%Y-%m-%dT%H:%M:%S+0300'),
+               'archived': rnd.random() < 0.02,
+               'apply_alternate_url': f'https://hh.ru/applicant/vacancy_response?vacancyId={vacancy_id}',
+               'url': f'https://api.hh.ru/vacancies/{vacancy_id}?host=hh.ru',
+               'alternate_url': f'https://hh.ru/vacancy/{vacancy_id}',
+               'relations': [],
+               'employer': {'id': str(employer_id), 'name': f'Employer {employer_id}',
+                            'url': f'https://api.hh.ru/employers/{employer_id}',
+                            'alternate_url': f'https://hh.ru/employer/{employer_id}',
+                            'logo_urls': {'90': f'https://hhcdn.ru/employer-logo/{employer_id}_90.png',
+                                          '240': f'https://hhcdn.ru/employer-logo/{employer_id}_240.png',
+                                          'original': f'https://hhcdn.ru/employer-logo-original/{employer_id}.png'},
+                            'vacancies_url': f'https://api.hh.ru/vacancies?employer_id={employer_id}',
+                            'accredited_it_employer': employer_id % 10 < 3,
+                            'trusted': True},
+               'snippet': {'requirement': 'Опыт работы с <highlighttext>SQL</highlighttext>, Python, Airflow. ' * 3,
+                           'responsibility': 'Разработка и поддержка ETL-процессов, построение витрин данных. ' * 3},
+               'contacts': None,
+               'schedule': {'id': 'fullDay', 'name': 'Полный день'},
+               'working_days': [],
+               'working_time_intervals': [],
+               'working_time_modes': [],
+               'accept_temporary': False,
+               'professional_roles': [{'id': '156', 'name': 'BI-аналитик, аналитик данных'}],
+               'accept_incomplete_resumes': False,
+               'experience': {'id': experience_id, 'name': experience_name},
+               'employment': {'id': 'full', 'name': 'Полная занятость'},
+               'adv_response_url': None,
+               'is_adv_vacancy': False}
+    if mix['nulls'] and rnd.random() < mix['nulls']:
+        #anonymous employer
+        vacancy['employer'] = {'name': 'Анонимный работодатель', 'trusted': True}
+    if mix['nulls'] and rnd.random() < mix['nulls']:
+        vacancy['experience'] = None
+    if mix['nulls'] and vacancy['employer'].get('id') and employer_id % 97 < mix['nulls'] * 97:
+        #attributes of an employer stay the same across its vacancies
+        vacancy['employer']['accredited_it_employer'] = None
+    if mix['nulls'] and salary and rnd.random() < mix['nulls']:
+        salary['currency'] = None
+    return vacancy
+
+#/vacancies/{id} response: the vacancy with its description, key skills, schedule and employment
+def make_detail(vacancy, rnd):
+    detail = dict(vacancy)
+    schedule_id, schedule_name = rnd.choice(SCHEDULES)
+    employment_id, employment_name = rnd.choice(EMPLOYMENTS)
+    detail.update({'description': '<p>' + vacancy['snippet']['responsibility'] + '</p><p>' + vacancy['snippet']['requirement'] + '</p>',
+                   'branded_description': None,
+                   'key_skills': [{'name': skill} for skill in rnd.sample(SKILLS, rnd.randrange(0, 8))],
+                   'schedule': {'id': schedule_id, 'name': schedule_name},
+                   'employment': {'id': employment_id, 'name': employment_name},
+                   'languages': [],
+                   'driver_license_types': []})
+    return detail
+
+def make_detail_bytes(vacancy_id, seed=0):
+    rnd = random.Random(seed * 1000003 + vacancy_id)
+    return json.dumps(make_detail(make_vacancy(vacancy_id, rnd), rnd), ensure_ascii=False).encode()
+
+#404 body of api.hh.ru for a removed vacancy
+NOT_FOUND = json.dumps({'description': 'Not Found', 'errors': [{'type': 'not_found'}]}).encode()
+
+#400 body of api.hh.ru for a page past the search depth limit
+BAD_ARGUMENT = json.dumps({'description': 'Bad Request', 'errors': [{'type': 'bad_argument', 'value': 'page'}]}).encode()
+
+def make_page(items, page=0, per_page=100, found=None):
+    found = len(items) if found is None else found
+    return {'items': items[page * per_page:(page + 1) * per_page],
+            'found': found,
+            'pages': (min(found, 2000) + per_page - 1) // per_page,
+            'page': page,
+            'per_page': per_page,
+            'clusters': None,
+            'arguments': None,
+            'alternate_url': 'https://hh.ru/search/vacancy?enable_snippets=true&items_on_page=100'}
+
+def make_page_bytes(count=100, seed=0):
+    rnd = random.Random(seed)
+    items = [make_vacancy(seed * count + i + 1, rnd) for i in range(count)]
+    return json.dumps(make_page(items, per_page=count), ensure_ascii=False).encode()
+
+#currency dictionary of api.hh.ru/dictionaries, rate is the amount of the currency per 1 RUR
+def make_dictionaries_bytes():
+    rates = {'RUR': 1.0, 'USD': 0.011, 'EUR': 0.01, 'KZT': 5.2}
+    return json.dumps({'currency': [{'code': code, 'abbr': code, 'name': code, 'default': code == 'RUR',
+                                     'rate': rate, 'in_use': True}
+                                    for code, rate in rates.items()]}).encode()
+
+#count synthetic vacancies published during the days before now, searchable like /vacancies.
+#only title, area and publication time are kept, full vacancies are generated when served
+class Dataset:
+    def __init__(self, count, seed=0, now=None, days=30, mix=DEFAULT_MIX):
+        self.count = count
+        self.seed = seed
+        self.mix = mix
+        self.now = (now or datetime.now()).replace(microsecond=0)
+        self.start = self.now - timedelta(days=days)
+        rnd = random.Random(seed)
+        keys = sorted((rnd.randrange(days * 86400), rnd.randrange(len(TITLES)), rnd.randrange(len(AREAS)))
+                      for _ in range(count))
+        self.offsets = array('l', [key[0] for key in keys])
+        self.titles = bytes(key[1] for key in keys)
+        self.areas = bytes(key[2] for key in keys)
+        self.index = {}
+
+    #positions and publication offsets of vacancies matching any quoted phrase of text and the area
+    def matches(self, text, area=None):
+        key = (text, area)
+        if key not in self.index:
+            phrases = [phrase.lower() for phrase in re.findall(r'"([^"]+)"', text or '')] or [(text or '').lower()]
+            titles = {i for i, title in enumerate(TITLES) if any(phrase in title.lower() for phrase in phrases)}
+            areas = {i for i, (area_id, _) in enumerate(AREAS) if area is None or area_id == area}
+            positions = array('l', [i for i in range(self.count) if self.titles[i] in titles and self.areas[i] in areas])
+            self.index[key] = (positions, array('l', [self.offsets[i] for i in positions]))
+        return self.index[key]
+
+    def vacancy(self, position):
+        vacancy_id = position + 1
+        rnd = random.Random(self.seed * 1000003 + vacancy_id)
+        return make_vacancy(vacancy_id, rnd, self.now, self.mix,
+                            title=TITLES[self.titles[position]],
+                            area=AREAS[self.areas[position]],
+                            published_at=self.start + timedelta(seconds=self.offsets[position]))
+
+    #/vacancies/{id} response, None for an id outside the dataset
+    def detail(self, vacancy_id):
+        if not 0 < vacancy_id <= self.count:
+            return None
+        rnd = random.Random(self.seed * 1000003 + vacancy_id)
+        return json.dumps(make_detail(self.vacancy(vacancy_id - 1), rnd), ensure_ascii=False).encode()
+
+    #search response, date_from inclusive, date_to exclusive. None past the search depth limit
+    def search(self, text, date_from=None, date_to=None, area=None, page=0, per_page=100, clusters=False, max_found=2000):
+        if (page + 1) * per_page > max_found:
+            return None
+        positions, offsets = self.matches(text, area)
+        lo = bisect_left(offsets, int((date_from - self.start).total_seconds())) if date_from else 0
+        hi = bisect_left(offsets, int((date_to - self.start).total_seconds())) if date_to else len(offsets)
+        found = max(hi - lo, 0)
+        items = [self.vacancy(position) for position in positions[lo + page * per_page:min(lo + (page + 1) * per_page, hi)]]
+        response = make_page(items, 0, per_page, found)
+        response['page'] = page
+        if clusters:
+            counts = [0] * len(AREAS)
+            for position in positions[lo:hi]:
+                counts[self.areas[position]] += 1
+            response['clusters'] = [{'id': 'area', 'name': 'Регион',
+                                     'items': [{'name': name, 'count': counts[i], 'url': f'https://api.hh.ru/vacancies?area={area_id}'}
+                                               for i, (area_id, name) in enumerate(AREAS) if counts[i]]}]
+        return json.dumps(response, ensure_ascii=False).encode()
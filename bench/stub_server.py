@@ -0,0 +1,137 @@
+#local stand-in for api.hh.ru /vacancies, /vacancies/{id} and /dictionaries: keep-alive HTTP/1.1, synthetic pages, optional latency and 429 responses.
+#with --vacancies it searches a generated dataset by text, date window and area like the real api
+#usage: PYTHONPATH=bench python bench/stub_server.py --port 8080 --latency 0.02 --error-rate 0.05 --vacancies 100000
+import argparse
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from generator import BAD_ARGUMENT, NOT_FOUND, Dataset, make_detail_bytes, make_dictionaries_bytes, make_page_bytes
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    #one handler per connection
+    def setup(self):
+        super().setup()
+        self.server.count('connections')
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and server.rnd.random() < server.error_rate:
+            server.count('throttled')
+            self.send_response(429)
+            self.send_header('Retry-After', str(server.retry_after))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        page = int(params.get('page', 0))
+        detail = re.search(r'/vacancies/(\d+)$', url.path)
+        if url.path.endswith('/dictionaries'):
+            body = server.dictionaries
+        elif detail:
+            vacancy_id = int(detail.group(1))
+            body = make_detail_bytes(vacancy_id) if server.dataset is None else server.dataset.detail(vacancy_id)
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(NOT_FOUND)))
+                self.end_headers()
+                self.wfile.write(NOT_FOUND)
+                return
+        elif server.dataset is not None:
+            body = server.dataset.search(params.get('text'),
+                                         datetime.fromisoformat(params['date_from']) if 'date_from' in params else None,
+                                         datetime.fromisoformat(params['date_to']) if 'date_to' in params else None,
+                                         params.get('area'),
+                                         page,
+                                         int(params.get('per_page', 100)),
+                                         params.get('clusters') == 'true')
+            if body is None:
+                self.send_response(400)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(BAD_ARGUMENT)))
+                self.end_headers()
+                self.wfile.write(BAD_ARGUMENT)
+                return
+        else:
+            body = server.pages[page % len(server.pages)]
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, retry_after=0, pages=20, per_page=100, seed=0, dataset=None):
+        super().__init__(('127.0.0.1', port), StubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.dataset = dataset
+        self.dictionaries = make_dictionaries_bytes()
+        self.pages = [make_page_bytes(per_page, seed + page) for page in range(pages)] if dataset is None else []
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counters = {'connections': 0, 'requests': 0, 'throttled': 0}
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/vacancies'
+
+    @property
+    def dictionaries_url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/dictionaries'
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def reset(self):
+        with self.lock:
+            self.counters = dict.fromkeys(self.counters, 0)
+
+    #serve in a background thread
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=0)
+    parser.add_argument('--vacancies', type=int, default=0)
+    args = parser.parse_args()
+
+    dataset = Dataset(args.vacancies) if args.vacancies else None
+    server = StubServer(args.port, args.latency, args.error_rate, args.retry_after, dataset=dataset)
+    print('serving', server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
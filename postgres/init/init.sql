@@ -2,6 +2,10 @@ CREATE SCHEMA IF NOT EXISTS stage;
 CREATE SCHEMA IF NOT EXISTS core;
 CREATE SCHEMA IF NOT EXISTS mart;
 CREATE SCHEMA IF NOT EXISTS proc;
+CREATE SCHEMA IF NOT EXISTS archive;
+
+-- trigram indexes of mart.vacancy_search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 CREATE TABLE IF NOT EXISTS proc.settings
 ( id int NOT NULL PRIMARY KEY
@@ -9,6 +13,187 @@ CREATE TABLE IF NOT EXISTS proc.settings
 , value varchar
 );
 
+CREATE TABLE IF NOT EXISTS proc.crawl_state
+( filter varchar NOT NULL PRIMARY KEY
+, watermark timestamp NOT NULL
+, updated_at timestamp NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS proc.crawl_window
+( run_id varchar NOT NULL
+, filter varchar NOT NULL
+, date_from timestamp NOT NULL
+, date_to timestamp NOT NULL
+
+, PRIMARY KEY (run_id, filter)
+);
+
+CREATE TABLE IF NOT EXISTS proc.crawl_checkpoint
+( run_id varchar NOT NULL
+, filter varchar NOT NULL
+, date_from timestamp NOT NULL
+, date_to timestamp NOT NULL
+, area varchar NOT NULL
+, rows_loaded int NOT NULL
+, loaded_at timestamp NOT NULL
+
+, PRIMARY KEY (run_id, filter, date_from, date_to, area)
+);
+
+CREATE TABLE IF NOT EXISTS proc.core_step_log
+( run_id varchar NOT NULL
+, step varchar NOT NULL
+, started_at timestamp NOT NULL
+, duration decimal NOT NULL
+, rows_affected int
+
+, PRIMARY KEY (run_id, step, started_at)
+);
+
+CREATE TABLE IF NOT EXISTS proc.run_metrics
+( run_id varchar NOT NULL
+, task varchar NOT NULL
+, metric varchar NOT NULL
+, labels varchar NOT NULL
+, value double precision NOT NULL
+, recorded_at timestamp NOT NULL
+
+, PRIMARY KEY (run_id, task, metric, labels)
+);
+
+CREATE INDEX IF NOT EXISTS run_metrics_metric_idx ON proc.run_metrics (metric, recorded_at);
+
+-- EXPLAIN (ANALYZE, BUFFERS) of the core statements and mart functions of runs profiled with load_core(profile=True).
+-- times are milliseconds, rows and blocks of the top plan node, max_misestimate is the largest ratio between
+-- estimated and actual rows of a node. query_hash is the md5 of the statement, a changed statement starts a new history
+CREATE TABLE IF NOT EXISTS proc.query_plan
+( run_id varchar NOT NULL
+, step varchar NOT NULL
+, statement_no int NOT NULL
+, query_hash varchar NOT NULL
+, captured_at timestamp NOT NULL
+, planning_ms double precision NOT NULL
+, execution_ms double precision NOT NULL
+, plan_rows double precision
+, actual_rows double precision
+, max_misestimate double precision
+, shared_hit bigint
+, shared_read bigint
+, shared_dirtied bigint
+, shared_written bigint
+, temp_read bigint
+, temp_written bigint
+, plan jsonb NOT NULL
+
+, PRIMARY KEY (run_id, step, statement_no)
+);
+
+CREATE INDEX IF NOT EXISTS query_plan_history_idx ON proc.query_plan (step, statement_no, query_hash, captured_at);
+
+-- profiled statements of a run against the median of the same statement over its last history profiled runs,
+-- flagged once it has at least min_runs of them.
+-- slower: execution time over ratio times the median and at least min_ms,
+-- more_blocks: shared blocks hit or read over ratio times the median and at least min_blocks.
+-- blocks hit plus read is the work of a plan, the split between them only shows what was cached
+CREATE OR REPLACE FUNCTION proc.plan_regressions( run varchar
+												, ratio double precision DEFAULT 2
+												, history int DEFAULT 10
+												, min_runs int DEFAULT 3
+												, min_ms double precision DEFAULT 10
+												, min_blocks bigint DEFAULT 1000)
+RETURNS TABLE ( step varchar
+			  , statement_no int
+			  , execution_ms double precision
+			  , median_ms double precision
+			  , blocks bigint
+			  , median_blocks double precision
+			  , shared_read bigint
+			  , max_misestimate double precision
+			  , runs int
+			  , slower bool
+			  , more_blocks bool
+			  ) AS $$
+	SELECT		  q.step
+				, q.statement_no
+				, q.execution_ms
+				, h.median_ms
+				, q.shared_hit + q.shared_read
+				, h.median_blocks
+				, q.shared_read
+				, q.max_misestimate
+				, h.runs
+				, h.runs >= min_runs AND q.execution_ms >= min_ms AND q.execution_ms > ratio * h.median_ms
+				, h.runs >= min_runs AND q.shared_hit + q.shared_read >= min_blocks AND q.shared_hit + q.shared_read > ratio * h.median_blocks
+	FROM		proc.query_plan AS q
+	CROSS JOIN LATERAL
+				(	SELECT	  percentile_cont(0.5) WITHIN GROUP (ORDER BY p.execution_ms) AS median_ms
+							, percentile_cont(0.5) WITHIN GROUP (ORDER BY p.shared_hit + p.shared_read) AS median_blocks
+							, count(*)::int AS runs
+					FROM	(	SELECT	  qp.execution_ms
+										, qp.shared_hit
+										, qp.shared_read
+								FROM	proc.query_plan AS qp
+								WHERE	qp.step = q.step
+										AND qp.statement_no = q.statement_no
+										AND qp.query_hash = q.query_hash
+										AND qp.captured_at < q.captured_at
+								ORDER BY qp.captured_at DESC
+								LIMIT	history
+							) AS p
+				) AS h
+	WHERE		q.run_id = run
+	ORDER BY	q.execution_ms DESC;
+$$ LANGUAGE sql STABLE;
+
+-- title patterns classifying vacancy type and grade during the transform (hh_parsing.classify).
+-- pattern is a regular expression matched case-insensitively anywhere in the title,
+-- the matching rule with the lowest priority wins, type falls back to 'Another'
+CREATE TABLE IF NOT EXISTS proc.vacancy_rules
+( attribute varchar NOT NULL CHECK (attribute IN ('type', 'grade'))
+, pattern varchar NOT NULL
+, value varchar NOT NULL
+, priority int NOT NULL
+, is_active bool NOT NULL DEFAULT TRUE
+
+, PRIMARY KEY (attribute, pattern)
+);
+
+INSERT INTO proc.vacancy_rules (attribute, pattern, value, priority)
+VALUES    ('type', 'Data Engineer', 'Data Engineer', 10)
+        , ('type', 'Инженер данных', 'Data Engineer', 10)
+        , ('type', 'Дата Инженер', 'Data Engineer', 10)
+        , ('type', 'Data Analyst', 'Data Analyst', 20)
+        , ('type', 'Аналитик данных', 'Data Analyst', 20)
+        , ('type', 'Data Scientist', 'Data Scientist', 30)
+        , ('grade', 'Стаж[её]р', 'Intern', 10)
+        , ('grade', 'Intern', 'Intern', 10)
+        , ('grade', 'Младший', 'Junior', 20)
+        , ('grade', 'Junior', 'Junior', 20)
+        , ('grade', 'Старший', 'Middle', 30)
+        , ('grade', 'Middle', 'Middle', 30)
+        , ('grade', 'Ведущий', 'Senior', 40)
+        , ('grade', 'Senior', 'Senior', 40)
+        , ('grade', 'Руководитель группы', 'Team Lead', 50)
+        , ('grade', 'Team Lead', 'Team Lead', 50)
+ON CONFLICT DO NOTHING;
+
+-- marker of the search payload of a vacancy its detail was fetched for. unlike vacancy_hd it leaves out type and grade,
+-- a change of proc.vacancy_rules reclassifies vacancies without fetching their details again
+CREATE OR REPLACE FUNCTION proc.detail_marker(vacancy_name varchar, published_at timestamp, is_archive bool, is_open bool)
+RETURNS uuid AS $$
+	SELECT md5(concat_ws('|', vacancy_name, published_at, is_archive, is_open))::uuid;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- vacancies enriched from /vacancies/{id} (hh_parsing.details). marker is the proc.detail_marker of the vacancy the detail was fetched for,
+-- a vacancy is fetched again only when its marker changes. is_found is false for vacancies the api no longer has
+CREATE TABLE IF NOT EXISTS proc.vacancy_detail_state
+( vacancy_hk uuid NOT NULL PRIMARY KEY
+, marker uuid NOT NULL
+, is_found bool NOT NULL
+, enriched_at timestamp NOT NULL
+);
+
+-- one unlogged partition per dag run, see stage.create_run_partition
 CREATE TABLE IF NOT EXISTS stage.vacancy
 ( id int
 , vacancy_name varchar
@@ -26,19 +211,100 @@ CREATE TABLE IF NOT EXISTS stage.vacancy
 , salary_to decimal
 , salary_currency varchar
 , is_gross bool
-);
+, vacancy_hk uuid
+, employer_hk uuid
+, experience_hk uuid
+, area_hk uuid
+, salary_hk uuid
+, vacancy_employer_hk uuid
+, vacancy_experience_hk uuid
+, vacancy_area_hk uuid
+, vacancy_salary_hk uuid
+, type varchar
+, grade varchar
+, vacancy_hd uuid
+, employer_hd uuid
+, experience_hd uuid
+, area_hd uuid
+, salary_hd uuid
+, run_id varchar NOT NULL
+) PARTITION BY LIST (run_id);
+
+CREATE INDEX IF NOT EXISTS vacancy_vacancy_hk_idx ON stage.vacancy (vacancy_hk);
+
+-- /vacancies/{id} details of the run, one unlogged partition per dag run like stage.vacancy.
+-- key_skills is a json array of skill names, detail_hd the hashdiff of core.sat_vacancy_detail
+CREATE TABLE IF NOT EXISTS stage.vacancy_detail
+( vacancy_hk uuid
+, marker uuid
+, is_found bool
+, description varchar
+, schedule_id varchar
+, schedule_name varchar
+, employment_id varchar
+, employment_name varchar
+, key_skills jsonb
+, detail_hd uuid
+, run_id varchar NOT NULL
+) PARTITION BY LIST (run_id);
+
+-- stage tables with a partition per run
+CREATE OR REPLACE FUNCTION stage.run_tables()
+RETURNS SETOF varchar AS $$
+	VALUES ('vacancy'::varchar), ('vacancy_detail');
+$$ LANGUAGE sql IMMUTABLE;
+
+DROP FUNCTION IF EXISTS stage.run_partition(varchar);
+
+-- partition name of a run of a stage table
+CREATE OR REPLACE FUNCTION stage.run_partition(run varchar, stage_table varchar DEFAULT 'vacancy')
+RETURNS varchar AS $$
+	SELECT stage_table || '_' || left(md5(run), 16);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- unlogged partitions of a run of every stage table, emptied when fresh. returns the name of the stage.vacancy partition
+-- for loading the rows straight into it, run_id of those rows comes from the column default of the partition
+CREATE OR REPLACE FUNCTION stage.create_run_partition(run varchar, fresh bool DEFAULT TRUE)
+RETURNS varchar AS $$
+DECLARE
+	stage_table varchar;
+	partition_name varchar;
+BEGIN
+	FOR stage_table IN SELECT * FROM stage.run_tables() LOOP
+		partition_name := stage.run_partition(run, stage_table);
+		IF fresh THEN
+			EXECUTE format('DROP TABLE IF EXISTS stage.%I', partition_name);
+		END IF;
+		IF to_regclass('stage.' || partition_name) IS NULL THEN
+			EXECUTE format('CREATE UNLOGGED TABLE stage.%I PARTITION OF stage.%I FOR VALUES IN (%L)', partition_name, stage_table, run);
+			EXECUTE format('ALTER TABLE stage.%I ALTER COLUMN run_id SET DEFAULT %L', partition_name, run);
+		END IF;
+	END LOOP;
+	RETURN 'stage.' || stage.run_partition(run);
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION stage.drop_run_partition(run varchar)
+RETURNS void AS $$
+DECLARE
+	stage_table varchar;
+BEGIN
+	FOR stage_table IN SELECT * FROM stage.run_tables() LOOP
+		EXECUTE format('DROP TABLE IF EXISTS stage.%I', stage.run_partition(run, stage_table));
+	END LOOP;
+END;
+$$ LANGUAGE plpgsql;
 
 CREATE TABLE IF NOT EXISTS core.hub_vacancy
-( vacancy_id serial NOT NULL PRIMARY KEY
+( vacancy_hk uuid NOT NULL PRIMARY KEY
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , external_id varchar NOT NULL
-
-, UNIQUE (vacancy_id, record_source, external_id)
 );
 
+-- monthly partitions by published_at, see core.create_partitions and core.archive_partitions
 CREATE TABLE IF NOT EXISTS core.sat_vacancy
-( vacancy_id int NOT NULL PRIMARY KEY
+( vacancy_hk uuid NOT NULL
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , vacancy_name varchar
@@ -48,135 +314,749 @@ CREATE TABLE IF NOT EXISTS core.sat_vacancy
 , type varchar
 , grade varchar
 , created_at timestamp
-, updated_at timestamp
 , deleted_at timestamp
+, load_end_date timestamp
+, hash_diff uuid
+
+, PRIMARY KEY (vacancy_hk, load_date, published_at)
+) PARTITION BY RANGE (published_at);
+
+CREATE TABLE IF NOT EXISTS core.sat_vacancy_default PARTITION OF core.sat_vacancy DEFAULT;
+
+CREATE INDEX IF NOT EXISTS sat_vacancy_current_idx ON core.sat_vacancy (vacancy_hk) WHERE load_end_date IS NULL;
+
+-- current vacancies not expired yet, for load_sat_vacancy expiry
+CREATE INDEX IF NOT EXISTS sat_vacancy_current_expiry_idx ON core.sat_vacancy (published_at) WHERE deleted_at IS NULL AND load_end_date IS NULL;
+
+-- /vacancies/{id} attributes of a vacancy, see hh_parsing.details
+CREATE TABLE IF NOT EXISTS core.sat_vacancy_detail
+( vacancy_hk uuid NOT NULL
+, record_source varchar NOT NULL
+, load_date timestamp NOT NULL
+, description varchar
+, schedule_id varchar
+, schedule_name varchar
+, employment_id varchar
+, employment_name varchar
+, created_at timestamp
+, load_end_date timestamp
+, hash_diff uuid
+
+, PRIMARY KEY (vacancy_hk, load_date)
+);
+
+CREATE INDEX IF NOT EXISTS sat_vacancy_detail_current_idx ON core.sat_vacancy_detail (vacancy_hk) WHERE load_end_date IS NULL;
+
+-- key skills of a vacancy, one row per skill. a skill removed from the vacancy gets load_end_date
+CREATE TABLE IF NOT EXISTS core.sat_vacancy_skill
+( vacancy_hk uuid NOT NULL
+, skill varchar NOT NULL
+, record_source varchar NOT NULL
+, load_date timestamp NOT NULL
+, load_end_date timestamp
 
-, FOREIGN KEY (vacancy_id) REFERENCES core.hub_vacancy (vacancy_id)
+, PRIMARY KEY (vacancy_hk, skill, load_date)
 );
 
+CREATE INDEX IF NOT EXISTS sat_vacancy_skill_current_idx ON core.sat_vacancy_skill (vacancy_hk) WHERE load_end_date IS NULL;
+CREATE INDEX IF NOT EXISTS sat_vacancy_skill_skill_idx ON core.sat_vacancy_skill (skill) WHERE load_end_date IS NULL;
+
 CREATE TABLE IF NOT EXISTS core.hub_employer
-( employer_id serial NOT NULL PRIMARY KEY
+( employer_hk uuid NOT NULL PRIMARY KEY
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , external_id varchar NOT NULL
-
-, UNIQUE (employer_id, record_source, external_id)
 );
 
 CREATE TABLE IF NOT EXISTS core.sat_employer
-( employer_id int NOT NULL PRIMARY KEY
+( employer_hk uuid NOT NULL
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , employer_name varchar
 , is_accredited_it_employer bool
 , created_at timestamp
-, updated_at timestamp
 , deleted_at timestamp
+, load_end_date timestamp
+, hash_diff uuid
 
-, FOREIGN KEY (employer_id) REFERENCES core.hub_employer (employer_id)
+, PRIMARY KEY (employer_hk, load_date)
 );
 
+CREATE INDEX IF NOT EXISTS sat_employer_current_idx ON core.sat_employer (employer_hk) WHERE load_end_date IS NULL;
+
 CREATE TABLE IF NOT EXISTS core.hub_experience
-( experience_id serial NOT NULL PRIMARY KEY
+( experience_hk uuid NOT NULL PRIMARY KEY
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , external_id varchar NOT NULL
-
-, UNIQUE (experience_id, record_source, external_id)
 );
 
 CREATE TABLE IF NOT EXISTS core.sat_experience
-( experience_id int NOT NULL PRIMARY KEY
+( experience_hk uuid NOT NULL
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , experience_name varchar
 , created_at timestamp
-, updated_at timestamp
 , deleted_at timestamp
+, load_end_date timestamp
+, hash_diff uuid
 
-, FOREIGN KEY (experience_id) REFERENCES core.hub_experience (experience_id)
+, PRIMARY KEY (experience_hk, load_date)
 );
 
+CREATE INDEX IF NOT EXISTS sat_experience_current_idx ON core.sat_experience (experience_hk) WHERE load_end_date IS NULL;
+
 CREATE TABLE IF NOT EXISTS core.hub_area
-( area_id serial NOT NULL PRIMARY KEY
+( area_hk uuid NOT NULL PRIMARY KEY
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , external_id varchar NOT NULL
 , created_at timestamp
 , updated_at timestamp
 , deleted_at timestamp
-
-, UNIQUE (area_id, record_source, external_id)
 );
 
 CREATE TABLE IF NOT EXISTS core.sat_area
-( area_id int NOT NULL PRIMARY KEY
+( area_hk uuid NOT NULL
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , area_name varchar
 , created_at timestamp
-, updated_at timestamp
 , deleted_at timestamp
+, load_end_date timestamp
+, hash_diff uuid
 
-, FOREIGN KEY (area_id) REFERENCES core.hub_area (area_id)
+, PRIMARY KEY (area_hk, load_date)
 );
 
+CREATE INDEX IF NOT EXISTS sat_area_current_idx ON core.sat_area (area_hk) WHERE load_end_date IS NULL;
+
 CREATE TABLE IF NOT EXISTS core.hub_salary
-( salary_id serial NOT NULL PRIMARY KEY
+( salary_hk uuid NOT NULL PRIMARY KEY
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , external_id varchar NOT NULL
-
-, UNIQUE (salary_id, record_source, external_id)
 );
 
 CREATE TABLE IF NOT EXISTS core.sat_salary
-( salary_id int NOT NULL PRIMARY KEY
+( salary_hk uuid NOT NULL
 , record_source varchar NOT NULL
 , load_date timestamp NOT NULL
 , salary_from decimal
 , salary_to decimal
 , salary_currency varchar
 , is_gross bool
+, exchange_rate decimal
+, salary_from_gross_rub decimal
+, salary_to_gross_rub decimal
+, salary_from_net_rub decimal
+, salary_to_net_rub decimal
+, salary_mid_gross_rub decimal
 , created_at timestamp
-, updated_at timestamp
 , deleted_at timestamp
+, load_end_date timestamp
+, hash_diff uuid
+
+, PRIMARY KEY (salary_hk, load_date)
+);
+
+CREATE INDEX IF NOT EXISTS sat_salary_current_idx ON core.sat_salary (salary_hk) WHERE load_end_date IS NULL;
+
+-- RUR per unit of currency, loaded by hh_parsing.rates from api.hh.ru/dictionaries or a local file
+CREATE TABLE IF NOT EXISTS core.ref_exchange_rate
+( currency varchar NOT NULL
+, rate_date date NOT NULL
+, rate decimal NOT NULL
+, record_source varchar NOT NULL
+, load_date timestamp NOT NULL
 
-, FOREIGN KEY (salary_id) REFERENCES core.hub_salary (salary_id)
+, PRIMARY KEY (currency, rate_date)
 );
 
+INSERT INTO core.ref_exchange_rate (currency, rate_date, rate, record_source, load_date)
+VALUES ('RUR', '2000-01-01', 1, 'init', now())
+ON CONFLICT DO NOTHING;
+
+-- monthly salary bound in RUR before and after the 13% personal income tax, NULL for a missing bound
+CREATE OR REPLACE FUNCTION core.gross_rub(amount decimal, rate decimal, is_gross bool)
+RETURNS decimal AS $$
+	SELECT round(nullif(amount, 0) * rate / CASE WHEN coalesce(is_gross, FALSE) THEN 1 ELSE 0.87 END, 2);
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION core.net_rub(amount decimal, rate decimal, is_gross bool)
+RETURNS decimal AS $$
+	SELECT round(nullif(amount, 0) * rate * CASE WHEN coalesce(is_gross, FALSE) THEN 0.87 ELSE 1 END, 2);
+$$ LANGUAGE sql IMMUTABLE;
+
 CREATE TABLE IF NOT EXISTS core.link_vacancy_employer
-( link_id serial NOT NULL PRIMARY KEY
-, vacancy_id int NOT NULL REFERENCES core.hub_vacancy (vacancy_id)
-, employer_id int NOT NULL REFERENCES core.hub_employer (employer_id)
+( link_hk uuid NOT NULL
+, vacancy_hk uuid NOT NULL
+, employer_hk uuid NOT NULL
 , date_from timestamp NOT NULL
 , date_to timestamp
-);
+
+, PRIMARY KEY (link_hk, date_from)
+) PARTITION BY RANGE (date_from);
+
+CREATE TABLE IF NOT EXISTS core.link_vacancy_employer_default PARTITION OF core.link_vacancy_employer DEFAULT;
+
+CREATE INDEX IF NOT EXISTS link_vacancy_employer_vacancy_hk_idx ON core.link_vacancy_employer (vacancy_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_employer_employer_hk_idx ON core.link_vacancy_employer (employer_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_employer_open_idx ON core.link_vacancy_employer (vacancy_hk) WHERE date_to IS NULL;
 
 CREATE TABLE IF NOT EXISTS core.link_vacancy_experience
-( link_id serial NOT NULL PRIMARY KEY
-, vacancy_id int NOT NULL REFERENCES core.hub_vacancy (vacancy_id)
-, experience_id int NOT NULL REFERENCES core.hub_experience (experience_id)
+( link_hk uuid NOT NULL
+, vacancy_hk uuid NOT NULL
+, experience_hk uuid NOT NULL
 , date_from timestamp NOT NULL
 , date_to timestamp
-);
+
+, PRIMARY KEY (link_hk, date_from)
+) PARTITION BY RANGE (date_from);
+
+CREATE TABLE IF NOT EXISTS core.link_vacancy_experience_default PARTITION OF core.link_vacancy_experience DEFAULT;
+
+CREATE INDEX IF NOT EXISTS link_vacancy_experience_vacancy_hk_idx ON core.link_vacancy_experience (vacancy_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_experience_experience_hk_idx ON core.link_vacancy_experience (experience_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_experience_open_idx ON core.link_vacancy_experience (vacancy_hk) WHERE date_to IS NULL;
 
 CREATE TABLE IF NOT EXISTS core.link_vacancy_area
-( link_id serial NOT NULL PRIMARY KEY
-, vacancy_id int NOT NULL REFERENCES core.hub_vacancy (vacancy_id)
-, area_id int NOT NULL REFERENCES core.hub_area (area_id)
+( link_hk uuid NOT NULL
+, vacancy_hk uuid NOT NULL
+, area_hk uuid NOT NULL
 , date_from timestamp NOT NULL
 , date_to timestamp
-);
+
+, PRIMARY KEY (link_hk, date_from)
+) PARTITION BY RANGE (date_from);
+
+CREATE TABLE IF NOT EXISTS core.link_vacancy_area_default PARTITION OF core.link_vacancy_area DEFAULT;
+
+CREATE INDEX IF NOT EXISTS link_vacancy_area_vacancy_hk_idx ON core.link_vacancy_area (vacancy_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_area_area_hk_idx ON core.link_vacancy_area (area_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_area_open_idx ON core.link_vacancy_area (vacancy_hk) WHERE date_to IS NULL;
 
 CREATE TABLE IF NOT EXISTS core.link_vacancy_salary
-( link_id serial NOT NULL PRIMARY KEY
-, vacancy_id int NOT NULL REFERENCES core.hub_vacancy (vacancy_id)
-, salary_id int NOT NULL REFERENCES core.hub_salary (salary_id)
+( link_hk uuid NOT NULL
+, vacancy_hk uuid NOT NULL
+, salary_hk uuid NOT NULL
 , date_from timestamp NOT NULL
 , date_to timestamp
+
+, PRIMARY KEY (link_hk, date_from)
+) PARTITION BY RANGE (date_from);
+
+CREATE TABLE IF NOT EXISTS core.link_vacancy_salary_default PARTITION OF core.link_vacancy_salary DEFAULT;
+
+CREATE INDEX IF NOT EXISTS link_vacancy_salary_vacancy_hk_idx ON core.link_vacancy_salary (vacancy_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_salary_salary_hk_idx ON core.link_vacancy_salary (salary_hk);
+CREATE INDEX IF NOT EXISTS link_vacancy_salary_open_idx ON core.link_vacancy_salary (vacancy_hk) WHERE date_to IS NULL;
+
+-- append-only change feed of the core load: a row per record a run added (new), versioned (changed),
+-- reopened or closed. entity is the core table, hk its hash key (link_hk of a link), vacancy_hk the vacancy of the record.
+-- monthly partitions by changed_at like the satellites, hh_parsing.changes exports the changes of a run
+CREATE TABLE IF NOT EXISTS core.change_log
+( run_id varchar NOT NULL
+, entity varchar NOT NULL
+, hk uuid NOT NULL
+, vacancy_hk uuid
+, change_type varchar NOT NULL CHECK (change_type IN ('new', 'changed', 'reopened', 'closed'))
+, changed_at timestamp NOT NULL
+) PARTITION BY RANGE (changed_at);
+
+CREATE TABLE IF NOT EXISTS core.change_log_default PARTITION OF core.change_log DEFAULT;
+
+CREATE INDEX IF NOT EXISTS change_log_run_id_idx ON core.change_log (run_id);
+
+-- vacancies as they were at moment: the satellite versions and links valid at that time
+CREATE OR REPLACE FUNCTION core.vacancies_at(moment timestamp)
+RETURNS TABLE ( vacancy_hk uuid
+			  , vacancy_name varchar
+			  , published_at timestamp
+			  , is_open bool
+			  , type varchar
+			  , grade varchar
+			  , employer_name varchar
+			  , experience_name varchar
+			  , area_name varchar
+			  , salary_mid_gross_rub decimal
+			  ) AS $$
+	SELECT		  sv.vacancy_hk
+				, sv.vacancy_name
+				, sv.published_at
+				, sv.is_open
+				, sv.type
+				, sv.grade
+				, semp.employer_name
+				, sexp.experience_name
+				, sa.area_name
+				, ss.salary_mid_gross_rub
+	FROM		core.sat_vacancy AS sv
+	LEFT JOIN	core.link_vacancy_employer AS lemp ON lemp.vacancy_hk = sv.vacancy_hk
+				AND lemp.date_from <= moment AND (lemp.date_to IS NULL OR lemp.date_to > moment)
+	LEFT JOIN	core.sat_employer AS semp ON semp.employer_hk = lemp.employer_hk
+				AND semp.load_date <= moment AND (semp.load_end_date IS NULL OR semp.load_end_date > moment)
+	LEFT JOIN	core.link_vacancy_experience AS lexp ON lexp.vacancy_hk = sv.vacancy_hk
+				AND lexp.date_from <= moment AND (lexp.date_to IS NULL OR lexp.date_to > moment)
+	LEFT JOIN	core.sat_experience AS sexp ON sexp.experience_hk = lexp.experience_hk
+				AND sexp.load_date <= moment AND (sexp.load_end_date IS NULL OR sexp.load_end_date > moment)
+	LEFT JOIN	core.link_vacancy_area AS la ON la.vacancy_hk = sv.vacancy_hk
+				AND la.date_from <= moment AND (la.date_to IS NULL OR la.date_to > moment)
+	LEFT JOIN	core.sat_area AS sa ON sa.area_hk = la.area_hk
+				AND sa.load_date <= moment AND (sa.load_end_date IS NULL OR sa.load_end_date > moment)
+	LEFT JOIN	core.link_vacancy_salary AS ls ON ls.vacancy_hk = sv.vacancy_hk
+				AND ls.date_from <= moment AND (ls.date_to IS NULL OR ls.date_to > moment)
+	LEFT JOIN	core.sat_salary AS ss ON ss.salary_hk = ls.salary_hk
+				AND ss.load_date <= moment AND (ss.load_end_date IS NULL OR ss.load_end_date > moment)
+	WHERE		sv.load_date <= moment
+				AND (sv.load_end_date IS NULL OR sv.load_end_date > moment);
+$$ LANGUAGE sql STABLE;
+
+-- partitioned core tables and their partition keys
+CREATE OR REPLACE FUNCTION core.partitioned_tables()
+RETURNS TABLE (table_name varchar, partition_key varchar) AS $$
+	VALUES	  ('sat_vacancy'::varchar, 'published_at'::varchar)
+			, ('link_vacancy_employer', 'date_from')
+			, ('link_vacancy_experience', 'date_from')
+			, ('link_vacancy_area', 'date_from')
+			, ('link_vacancy_salary', 'date_from')
+			, ('change_log', 'changed_at');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- monthly partitions <table>_pYYYYMM of the partitioned core tables for every month from date_from to date_to,
+-- by default from the oldest row in the default partition to the next month.
+-- rows of a new month already in the default partition are moved to its partition
+CREATE OR REPLACE FUNCTION core.create_partitions(date_from date DEFAULT NULL, date_to date DEFAULT NULL)
+RETURNS void AS $$
+DECLARE
+	tbl record;
+	first_month date;
+	month_start date;
+	month_end date;
+	partition_name varchar;
+BEGIN
+	FOR tbl IN SELECT * FROM core.partitioned_tables() LOOP
+		first_month := date_from;
+		IF first_month IS NULL THEN
+			EXECUTE format('SELECT min(%I)::date FROM core.%I', tbl.partition_key, tbl.table_name || '_default')
+			INTO first_month;
+		END IF;
+		month_start := date_trunc('month', least(coalesce(first_month, now()::date), now()::date));
+
+		WHILE month_start <= coalesce(date_to, (now() + interval '1 month')::date) LOOP
+			month_end := month_start + interval '1 month';
+			partition_name := tbl.table_name || '_p' || to_char(month_start, 'YYYYMM');
+			IF to_regclass('core.' || partition_name) IS NULL THEN
+				EXECUTE format('CREATE TEMP TABLE moved_rows ON COMMIT DROP AS
+								WITH moved AS (DELETE FROM core.%I WHERE %I >= %L AND %I < %L RETURNING *)
+								SELECT * FROM moved',
+							   tbl.table_name || '_default', tbl.partition_key, month_start, tbl.partition_key, month_end);
+				EXECUTE format('CREATE TABLE core.%I PARTITION OF core.%I FOR VALUES FROM (%L) TO (%L)',
+							   partition_name, tbl.table_name, month_start, month_end);
+				EXECUTE format('INSERT INTO core.%I SELECT * FROM moved_rows', tbl.table_name);
+				DROP TABLE moved_rows;
+			END IF;
+			month_start := month_end;
+		END LOOP;
+	END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT core.create_partitions();
+
+-- detach monthly partitions that ended more than retention ago and move them to the archive schema,
+-- a link partition is kept while it has open links. returns the archived partitions
+CREATE OR REPLACE FUNCTION core.archive_partitions(retention interval DEFAULT '12 months')
+RETURNS SETOF varchar AS $$
+DECLARE
+	part record;
+	has_open bool;
+BEGIN
+	FOR part IN SELECT		  child.relname::varchar AS partition_name
+							, parent.relname::varchar AS table_name
+							, to_date(right(child.relname, 6), 'YYYYMM') AS month_start
+				FROM		pg_inherits AS i
+				JOIN		pg_class AS child ON child.oid = i.inhrelid
+				JOIN		pg_class AS parent ON parent.oid = i.inhparent
+				JOIN		pg_namespace AS n ON n.oid = parent.relnamespace
+				WHERE		n.nspname = 'core'
+							AND parent.relname IN (SELECT table_name FROM core.partitioned_tables())
+							AND child.relname ~ '_p[0-9]{6}$'
+				ORDER BY	month_start
+	LOOP
+		CONTINUE WHEN part.month_start + interval '1 month' > now() - retention;
+
+		IF part.table_name LIKE 'link%' THEN
+			EXECUTE format('SELECT EXISTS (SELECT 1 FROM core.%I WHERE date_to IS NULL)', part.partition_name)
+			INTO has_open;
+			IF has_open THEN
+				RAISE NOTICE 'partition % has open links, kept', part.partition_name;
+				CONTINUE;
+			END IF;
+		END IF;
+
+		EXECUTE format('ALTER TABLE core.%I DETACH PARTITION core.%I', part.table_name, part.partition_name);
+		-- a month archived before and recreated by a late vacancy is appended to its archive
+		IF to_regclass('archive.' || part.partition_name) IS NULL THEN
+			EXECUTE format('ALTER TABLE core.%I SET SCHEMA archive', part.partition_name);
+		ELSE
+			EXECUTE format('INSERT INTO archive.%I SELECT * FROM core.%I', part.partition_name, part.partition_name);
+			EXECUTE format('DROP TABLE core.%I', part.partition_name);
+		END IF;
+		RETURN NEXT part.partition_name;
+	END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- region and employer stats per vacancy type, mergeable across types so the mart functions only sum rows
+CREATE TABLE IF NOT EXISTS mart.vacancy_by_region
+( type varchar NOT NULL
+, area_name varchar NOT NULL
+, cnt_open int NOT NULL
+, cnt_salary int NOT NULL
+, salary_sum decimal
+, salary_n int NOT NULL
+, salary_min decimal
+, salary_max decimal
+, intern_cnt int NOT NULL
+, intern_sum decimal
+, intern_n int NOT NULL
+, intern_min decimal
+, intern_max decimal
+, junior_cnt int NOT NULL
+, junior_sum decimal
+, junior_n int NOT NULL
+, junior_min decimal
+, junior_max decimal
+, middle_cnt int NOT NULL
+, middle_sum decimal
+, middle_n int NOT NULL
+, middle_min decimal
+, middle_max decimal
+, senior_cnt int NOT NULL
+, senior_sum decimal
+, senior_n int NOT NULL
+, senior_min decimal
+, senior_max decimal
+, lead_cnt int NOT NULL
+, lead_sum decimal
+, lead_n int NOT NULL
+, lead_min decimal
+, lead_max decimal
+, no_exp_cnt int NOT NULL
+, no_exp_sum decimal
+, no_exp_n int NOT NULL
+, no_exp_min decimal
+, no_exp_max decimal
+, low_exp_cnt int NOT NULL
+, low_exp_sum decimal
+, low_exp_n int NOT NULL
+, low_exp_min decimal
+, low_exp_max decimal
+, mid_exp_cnt int NOT NULL
+, mid_exp_sum decimal
+, mid_exp_n int NOT NULL
+, mid_exp_min decimal
+, mid_exp_max decimal
+, high_exp_cnt int NOT NULL
+, high_exp_sum decimal
+, high_exp_n int NOT NULL
+, high_exp_min decimal
+, high_exp_max decimal
+
+, PRIMARY KEY (area_name, type)
+);
+
+CREATE TABLE IF NOT EXISTS mart.vacancy_by_employer
+( type varchar NOT NULL
+, employer_name varchar NOT NULL
+, cnt_open int NOT NULL
+, cnt_salary int NOT NULL
+, salary_sum decimal
+, salary_n int NOT NULL
+, salary_min decimal
+, salary_max decimal
+, intern_cnt int NOT NULL
+, intern_sum decimal
+, intern_n int NOT NULL
+, intern_min decimal
+, intern_max decimal
+, junior_cnt int NOT NULL
+, junior_sum decimal
+, junior_n int NOT NULL
+, junior_min decimal
+, junior_max decimal
+, middle_cnt int NOT NULL
+, middle_sum decimal
+, middle_n int NOT NULL
+, middle_min decimal
+, middle_max decimal
+, senior_cnt int NOT NULL
+, senior_sum decimal
+, senior_n int NOT NULL
+, senior_min decimal
+, senior_max decimal
+, lead_cnt int NOT NULL
+, lead_sum decimal
+, lead_n int NOT NULL
+, lead_min decimal
+, lead_max decimal
+, no_exp_cnt int NOT NULL
+, no_exp_sum decimal
+, no_exp_n int NOT NULL
+, no_exp_min decimal
+, no_exp_max decimal
+, low_exp_cnt int NOT NULL
+, low_exp_sum decimal
+, low_exp_n int NOT NULL
+, low_exp_min decimal
+, low_exp_max decimal
+, mid_exp_cnt int NOT NULL
+, mid_exp_sum decimal
+, mid_exp_n int NOT NULL
+, mid_exp_min decimal
+, mid_exp_max decimal
+, high_exp_cnt int NOT NULL
+, high_exp_sum decimal
+, high_exp_n int NOT NULL
+, high_exp_min decimal
+, high_exp_max decimal
+
+, PRIMARY KEY (employer_name, type)
 );
 
+DROP FUNCTION IF EXISTS mart.refresh_vacancy_stats(bool);
+
+-- recompute the stats of regions and employers of the vacancies in the stage of run (all of stage without run),
+-- or of everything with full_refresh. a vacancy counts under its open area and employer links only,
+-- the region or employer a vacancy of run moved away from and the old name of a region or employer renamed by run
+-- are recomputed as well
+CREATE OR REPLACE FUNCTION mart.refresh_vacancy_stats(full_refresh bool DEFAULT FALSE, run varchar DEFAULT NULL)
+RETURNS void AS $$
+DECLARE
+	areas varchar[];
+	employers varchar[];
+BEGIN
+	SELECT		array_agg(DISTINCT a.area_name)
+	INTO		areas
+	FROM		(	SELECT		sa.area_name
+					FROM		(	SELECT		lva.area_hk
+									FROM		stage.vacancy AS v
+									JOIN		core.link_vacancy_area AS lva ON lva.vacancy_hk = v.vacancy_hk AND lva.date_to IS NULL
+									WHERE		run IS NULL OR v.run_id = run
+									UNION
+									SELECT		lva.area_hk
+									FROM		core.change_log AS cl
+									JOIN		core.link_vacancy_area AS lva ON lva.link_hk = cl.hk
+									WHERE		cl.run_id = run
+												AND cl.entity = 'link_vacancy_area'
+												AND cl.change_type = 'closed'
+								) AS h
+					JOIN		core.sat_area AS sa ON sa.area_hk = h.area_hk AND sa.load_end_date IS NULL
+					UNION
+					-- the name before a rename of the run, closed by the statement that logged the new version
+					SELECT		sa.area_name
+					FROM		core.change_log AS cl
+					JOIN		core.sat_area AS sa ON sa.area_hk = cl.hk AND sa.load_end_date = cl.changed_at
+					WHERE		cl.run_id = run
+								AND cl.entity = 'sat_area'
+								AND cl.change_type = 'changed'
+				) AS a;
+
+	SELECT		array_agg(DISTINCT e.employer_name)
+	INTO		employers
+	FROM		(	SELECT		semp.employer_name
+					FROM		(	SELECT		lve.employer_hk
+									FROM		stage.vacancy AS v
+									JOIN		core.link_vacancy_employer AS lve ON lve.vacancy_hk = v.vacancy_hk AND lve.date_to IS NULL
+									WHERE		run IS NULL OR v.run_id = run
+									UNION
+									SELECT		lve.employer_hk
+									FROM		core.change_log AS cl
+									JOIN		core.link_vacancy_employer AS lve ON lve.link_hk = cl.hk
+									WHERE		cl.run_id = run
+												AND cl.entity = 'link_vacancy_employer'
+												AND cl.change_type = 'closed'
+								) AS h
+					JOIN		core.sat_employer AS semp ON semp.employer_hk = h.employer_hk AND semp.load_end_date IS NULL
+					UNION
+					-- the name before a rename of the run, closed by the statement that logged the new version
+					SELECT		semp.employer_name
+					FROM		core.change_log AS cl
+					JOIN		core.sat_employer AS semp ON semp.employer_hk = cl.hk AND semp.load_end_date = cl.changed_at
+					WHERE		cl.run_id = run
+								AND cl.entity = 'sat_employer'
+								AND cl.change_type = 'changed'
+				) AS e;
+
+	DELETE FROM mart.vacancy_by_region
+	WHERE		full_refresh OR area_name = ANY(areas);
+
+	INSERT INTO mart.vacancy_by_region
+	WITH tbl AS (	SELECT		  sv.vacancy_hk
+								, sv.is_open
+								, sv.grade
+								, sv.type
+								, s.area_name
+								, se.experience_name
+								, ss.salary_mid_gross_rub AS avg_salary
+					FROM		core.sat_vacancy AS sv
+					JOIN		core.link_vacancy_area AS l ON l.vacancy_hk = sv.vacancy_hk AND l.date_to IS NULL
+					JOIN		core.sat_area AS s ON s.area_hk = l.area_hk AND s.load_end_date IS NULL
+					JOIN		core.link_vacancy_experience AS lve ON lve.vacancy_hk = sv.vacancy_hk AND lve.date_to IS NULL
+					JOIN		core.sat_experience AS se ON se.experience_hk = lve.experience_hk AND se.load_end_date IS NULL
+					LEFT JOIN	core.link_vacancy_salary as lvs ON lvs.vacancy_hk = sv.vacancy_hk AND lvs.date_to IS NULL
+					LEFT JOIN	core.sat_salary as ss ON ss.salary_hk = lvs.salary_hk AND ss.load_end_date IS NULL
+
+					WHERE		sv.load_end_date IS NULL
+								AND sv.type IS NOT NULL
+								AND s.area_name IS NOT NULL
+								AND (full_refresh OR s.area_name = ANY(areas))
+				)
+
+	SELECT	  t.type
+			, t.area_name
+			, count(*) FILTER (WHERE t.is_open = True)
+			, count(*) FILTER (WHERE t.avg_salary IS NOT NULL)
+			, sum(t.avg_salary)
+			, count(t.avg_salary)
+			, min(t.avg_salary)
+			, max(t.avg_salary)
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Intern')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Junior')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Middle')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Senior')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Team Lead')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'Нет опыта')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'От 1 года до 3 лет')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'От 3 до 6 лет')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'Более 6 лет')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+
+	FROM		tbl AS t
+	GROUP BY	  t.type
+				, t.area_name;
+
+	DELETE FROM mart.vacancy_by_employer
+	WHERE		full_refresh OR employer_name = ANY(employers);
+
+	INSERT INTO mart.vacancy_by_employer
+	WITH tbl AS (	SELECT		  sv.vacancy_hk
+								, sv.is_open
+								, sv.grade
+								, sv.type
+								, s.employer_name
+								, se.experience_name
+								, ss.salary_mid_gross_rub AS avg_salary
+					FROM		core.sat_vacancy AS sv
+					JOIN		core.link_vacancy_employer AS l ON l.vacancy_hk = sv.vacancy_hk AND l.date_to IS NULL
+					JOIN		core.sat_employer AS s ON s.employer_hk = l.employer_hk AND s.load_end_date IS NULL
+					JOIN		core.link_vacancy_experience AS lve ON lve.vacancy_hk = sv.vacancy_hk AND lve.date_to IS NULL
+					JOIN		core.sat_experience AS se ON se.experience_hk = lve.experience_hk AND se.load_end_date IS NULL
+					LEFT JOIN	core.link_vacancy_salary as lvs ON lvs.vacancy_hk = sv.vacancy_hk AND lvs.date_to IS NULL
+					LEFT JOIN	core.sat_salary as ss ON ss.salary_hk = lvs.salary_hk AND ss.load_end_date IS NULL
+
+					WHERE		sv.load_end_date IS NULL
+								AND sv.type IS NOT NULL
+								AND s.employer_name IS NOT NULL
+								AND (full_refresh OR s.employer_name = ANY(employers))
+				)
+
+	SELECT	  t.type
+			, t.employer_name
+			, count(*) FILTER (WHERE t.is_open = True)
+			, count(*) FILTER (WHERE t.avg_salary IS NOT NULL)
+			, sum(t.avg_salary)
+			, count(t.avg_salary)
+			, min(t.avg_salary)
+			, max(t.avg_salary)
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Intern')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Intern')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Junior')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Junior')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Middle')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Middle')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Senior')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Senior')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.grade = 'Team Lead')
+			, sum(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, count(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, min(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, max(t.avg_salary) FILTER (WHERE t.grade = 'Team Lead')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'Нет опыта')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'Нет опыта')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'От 1 года до 3 лет')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'От 1 года до 3 лет')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'От 3 до 6 лет')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'От 3 до 6 лет')
+			, count(DISTINCT t.vacancy_hk) FILTER (WHERE t.avg_salary IS NOT NULL AND t.experience_name = 'Более 6 лет')
+			, sum(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+			, count(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+			, min(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+			, max(t.avg_salary) FILTER (WHERE t.experience_name = 'Более 6 лет')
+
+	FROM		tbl AS t
+	GROUP BY	  t.type
+				, t.employer_name;
+END;
+$$ LANGUAGE plpgsql;
+
 CREATE OR REPLACE FUNCTION mart.get_vacancies_by_region(filter varchar[])
 RETURNS TABLE (	  id int
 				, area_name varchar
@@ -224,124 +1104,55 @@ RETURNS TABLE (	  id int
 				, high_exp_max decimal
 			) AS $$
 
-	WITH tbl AS (	SELECT		  sv.vacancy_id
-								, sv.vacancy_name
-								, sv.is_open
-								, sv.grade
-								, sv.type
-								, sa.area_id
-								, sa.area_name
-								, se.experience_name
-								, ss.salary_from
-								, ss.salary_to
-					FROM		core.sat_vacancy AS sv
-					JOIN		core.link_vacancy_area AS lva ON lva.vacancy_id = sv.vacancy_id
-					JOIN		core.sat_area AS sa ON sa.area_id = lva.area_id
-					JOIN		core.link_vacancy_experience AS lve ON lve.vacancy_id = sv.vacancy_id
-					JOIN		core.sat_experience AS se ON se.experience_id = lve.experience_id
-					LEFT JOIN	core.link_vacancy_salary as lvs ON lvs.vacancy_id = sv.vacancy_id
-					LEFT JOIN	core.sat_salary as ss ON ss.salary_id = lvs.salary_id
-
-					WHERE		sv.type = ANY(filter)
-				)
+	SELECT	  row_number() OVER (ORDER BY m.area_name) AS id
+			, m.area_name
+			, sum(m.cnt_open)::int AS cnt_open
+			, sum(m.cnt_salary)::int AS cnt_salary
+			, coalesce(sum(m.salary_sum)/nullif(sum(m.salary_n), 0), 0.0) AS avg_salary
+			, coalesce(min(m.salary_min), 0.0) AS min_salary
+			, coalesce(max(m.salary_max), 0.0) AS max_salary
+			, coalesce(sum(m.salary_sum)/nullif(sum(m.salary_n), 0), 0.0)/(CASE WHEN coalesce(max(m.salary_max), 0.0) = 0 THEN 1 ELSE max(m.salary_max) END) AS ratio
+			, sum(m.intern_cnt)::int AS intern_cnt
+			, coalesce(sum(m.intern_sum)/nullif(sum(m.intern_n), 0), 0.0) AS intern_avg
+			, coalesce(min(m.intern_min), 0.0) AS intern_min
+			, coalesce(max(m.intern_max), 0.0) AS intern_max
+			, sum(m.junior_cnt)::int AS junior_cnt
+			, coalesce(sum(m.junior_sum)/nullif(sum(m.junior_n), 0), 0.0) AS junior_avg
+			, coalesce(min(m.junior_min), 0.0) AS junior_min
+			, coalesce(max(m.junior_max), 0.0) AS junior_max
+			, sum(m.middle_cnt)::int AS middle_cnt
+			, coalesce(sum(m.middle_sum)/nullif(sum(m.middle_n), 0), 0.0) AS middle_avg
+			, coalesce(min(m.middle_min), 0.0) AS middle_min
+			, coalesce(max(m.middle_max), 0.0) AS middle_max
+			, sum(m.senior_cnt)::int AS senior_cnt
+			, coalesce(sum(m.senior_sum)/nullif(sum(m.senior_n), 0), 0.0) AS senior_avg
+			, coalesce(min(m.senior_min), 0.0) AS senior_min
+			, coalesce(max(m.senior_max), 0.0) AS senior_max
+			, sum(m.lead_cnt)::int AS lead_cnt
+			, coalesce(sum(m.lead_sum)/nullif(sum(m.lead_n), 0), 0.0) AS lead_avg
+			, coalesce(min(m.lead_min), 0.0) AS lead_min
+			, coalesce(max(m.lead_max), 0.0) AS lead_max
+			, sum(m.no_exp_cnt)::int AS no_exp_cnt
+			, coalesce(sum(m.no_exp_sum)/nullif(sum(m.no_exp_n), 0), 0.0) AS no_exp_avg
+			, coalesce(min(m.no_exp_min), 0.0) AS no_exp_min
+			, coalesce(max(m.no_exp_max), 0.0) AS no_exp_max
+			, sum(m.low_exp_cnt)::int AS low_exp_cnt
+			, coalesce(sum(m.low_exp_sum)/nullif(sum(m.low_exp_n), 0), 0.0) AS low_exp_avg
+			, coalesce(min(m.low_exp_min), 0.0) AS low_exp_min
+			, coalesce(max(m.low_exp_max), 0.0) AS low_exp_max
+			, sum(m.mid_exp_cnt)::int AS mid_exp_cnt
+			, coalesce(sum(m.mid_exp_sum)/nullif(sum(m.mid_exp_n), 0), 0.0) AS mid_exp_avg
+			, coalesce(min(m.mid_exp_min), 0.0) AS mid_exp_min
+			, coalesce(max(m.mid_exp_max), 0.0) AS mid_exp_max
+			, sum(m.high_exp_cnt)::int AS high_exp_cnt
+			, coalesce(sum(m.high_exp_sum)/nullif(sum(m.high_exp_n), 0), 0.0) AS high_exp_avg
+			, coalesce(min(m.high_exp_min), 0.0) AS high_exp_min
+			, coalesce(max(m.high_exp_max), 0.0) AS high_exp_max
 
-		, avg_salary AS	(	SELECT	  sv.vacancy_id
-									, coalesce((coalesce(salary_from, salary_to) + coalesce(salary_to, salary_from)/2), 0.0) AS avg_salary
-
-							FROM	core.sat_vacancy AS sv
-							JOIN	core.link_vacancy_salary AS lvs ON lvs.vacancy_id = sv.vacancy_id
-							JOIN	core.sat_salary AS ss ON ss.salary_id = lvs.salary_id)
-
-		, grade AS (	SELECT		  t.area_name
-									, t.grade
-									, count(DISTINCT t.vacancy_id) AS cnt
-									, avg(avg_salary) AS avg
-									, min(avg_salary) AS min
-									, max(avg_salary) AS max
-						FROM		tbl AS t
-						JOIN		avg_salary AS av ON av.vacancy_id = t.vacancy_id
-						GROUP BY	  t.area_name
-									, t.grade)
-
-		, expirience AS (	SELECT		  t.area_name
-										, t.experience_name
-										, count(DISTINCT t.vacancy_id) AS cnt
-										, avg(avg_salary) AS avg
-										, min(avg_salary) AS min
-										, max(avg_salary) AS max
-							FROM		tbl AS t
-							JOIN		avg_salary AS av ON av.vacancy_id = t.vacancy_id
-							GROUP BY	  t.area_name
-										, t.experience_name)
-
-	select	  row_number() over () as id
-			, tbl.area_name
-			, tbl.cnt_open
-			, tbl.cnt_salary
-			, tbl.avg_salary
-			, tbl.min_salary
-			, tbl.max_salary
-			, tbl.avg_salary/(case when tbl.max_salary = 0 then 1 else tbl.max_salary end) as ratio
-			, coalesce(intern.cnt, 0.0) AS intern_cnt
-			, coalesce(intern.avg, 0.0) AS intern_avg
-			, coalesce(intern.min, 0.0) AS intern_min
-			, coalesce(intern.max, 0.0) AS intern_max
-			, coalesce(junior.cnt, 0.0) AS junior_cnt
-			, coalesce(junior.avg, 0.0) AS junior_avg
-			, coalesce(junior.min, 0.0) AS junior_min
-			, coalesce(junior.max, 0.0) AS junior_max
-			, coalesce(middle.cnt, 0.0) AS middle_cnt
-			, coalesce(middle.avg, 0.0) AS middle_avg
-			, coalesce(middle.min, 0.0) AS middle_min
-			, coalesce(middle.max, 0.0) AS middle_max
-			, coalesce(senior.cnt, 0.0) AS senior_cnt
-			, coalesce(senior.avg, 0.0) AS senior_avg
-			, coalesce(senior.min, 0.0) AS senior_min
-			, coalesce(senior.max, 0.0) AS senior_max
-			, coalesce(lead.cnt, 0.0) AS lead_cnt
-			, coalesce(lead.avg, 0.0) AS lead_avg
-			, coalesce(lead.min, 0.0) AS lead_min
-			, coalesce(lead.max, 0.0) AS lead_max
-			, coalesce(no_exp.cnt, 0.0) AS no_exp_cnt
-			, coalesce(no_exp.avg, 0.0) AS no_exp_avg
-			, coalesce(no_exp.min, 0.0) AS no_exp_min
-			, coalesce(no_exp.max, 0.0) AS no_exp_max
-			, coalesce(low_exp.cnt, 0.0) AS low_exp_cnt
-			, coalesce(low_exp.avg, 0.0) AS low_exp_avg
-			, coalesce(low_exp.min, 0.0) AS low_exp_min
-			, coalesce(low_exp.max, 0.0) AS low_exp_max
-			, coalesce(mid_exp.cnt, 0.0) AS mid_exp_cnt
-			, coalesce(mid_exp.avg, 0.0) AS mid_exp_avg
-			, coalesce(mid_exp.min, 0.0) AS mid_exp_min
-			, coalesce(mid_exp.max, 0.0) AS mid_exp_max
-			, coalesce(high_exp.cnt, 0.0) AS high_exp_cnt
-			, coalesce(high_exp.avg, 0.0) AS high_exp_avg
-			, coalesce(high_exp.min, 0.0) AS high_exp_min
-			, coalesce(high_exp.max, 0.0) AS high_exp_max
-
-	FROM	(	SELECT		  t.area_name
-							, count(CASE WHEN t.is_open = True THEN 1 END) AS cnt_open
-							, count(CASE WHEN t.salary_from <> 0 or salary_from <> 0 THEN 1 END) AS cnt_salary
-							, coalesce(min(av.avg_salary), 0.0) as min_salary
-							, coalesce(max(av.avg_salary), 0.0) as max_salary
-							, coalesce(avg(av.avg_salary), 0.0) as avg_salary
-				FROM		tbl as t
-				LEFT JOIN	avg_salary as av ON av.vacancy_id = t.vacancy_id
-				GROUP BY	t.area_name
-			) AS tbl
-
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Intern') AS intern ON intern.area_name = tbl.area_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Junior') AS junior ON junior.area_name = tbl.area_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Middle') AS middle ON middle.area_name = tbl.area_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Senior') AS senior ON senior.area_name = tbl.area_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Team Lead') AS lead ON lead.area_name = tbl.area_name
-
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'Нет опыта') AS no_exp ON no_exp.area_name = tbl.area_name
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'От 1 года до 3 лет') AS low_exp ON low_exp.area_name = tbl.area_name
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'От 3 до 6 лет') AS mid_exp ON mid_exp.area_name = tbl.area_name
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'Более 6 лет') AS high_exp ON high_exp.area_name = tbl.area_name
-
-	ORDER BY tbl.area_name;
+	FROM		mart.vacancy_by_region AS m
+	WHERE		m.type = ANY(filter)
+	GROUP BY	m.area_name
+	ORDER BY	m.area_name;
 $$ LANGUAGE SQL;
 
 CREATE OR REPLACE FUNCTION mart.get_vacancies_by_employer(filter varchar[])
@@ -391,123 +1202,55 @@ RETURNS TABLE (	  id int
 				, high_exp_max decimal
 			) AS $$
 
-	WITH tbl AS (	SELECT		  sv.vacancy_id
-								, sv.vacancy_name
-								, sv.is_open
-								, sv.grade
-								, semp.employer_name
-								, semp.is_accredited_it_employer
-								, se.experience_name
-								, ss.salary_from
-								, ss.salary_to
-					FROM		core.sat_vacancy AS sv
-					JOIN		core.link_vacancy_employer AS lva ON lva.vacancy_id = sv.vacancy_id
-					JOIN		core.sat_employer AS semp ON semp.employer_id = lva.employer_id
-					JOIN		core.link_vacancy_experience AS lve ON lve.vacancy_id = sv.vacancy_id
-					JOIN		core.sat_experience AS se ON se.experience_id = lve.experience_id
-					LEFT JOIN	core.link_vacancy_salary as lvs ON lvs.vacancy_id = sv.vacancy_id
-					LEFT JOIN	core.sat_salary as ss ON ss.salary_id = lvs.salary_id
-
-					WHERE		sv.type = ANY(filter)
-				)
+	SELECT	  row_number() OVER (ORDER BY m.employer_name) AS id
+			, m.employer_name
+			, sum(m.cnt_open)::int AS cnt_open
+			, sum(m.cnt_salary)::int AS cnt_salary
+			, coalesce(sum(m.salary_sum)/nullif(sum(m.salary_n), 0), 0.0) AS avg_salary
+			, coalesce(min(m.salary_min), 0.0) AS min_salary
+			, coalesce(max(m.salary_max), 0.0) AS max_salary
+			, coalesce(sum(m.salary_sum)/nullif(sum(m.salary_n), 0), 0.0)/(CASE WHEN coalesce(max(m.salary_max), 0.0) = 0 THEN 1 ELSE max(m.salary_max) END) AS ratio
+			, sum(m.intern_cnt)::int AS intern_cnt
+			, coalesce(sum(m.intern_sum)/nullif(sum(m.intern_n), 0), 0.0) AS intern_avg
+			, coalesce(min(m.intern_min), 0.0) AS intern_min
+			, coalesce(max(m.intern_max), 0.0) AS intern_max
+			, sum(m.junior_cnt)::int AS junior_cnt
+			, coalesce(sum(m.junior_sum)/nullif(sum(m.junior_n), 0), 0.0) AS junior_avg
+			, coalesce(min(m.junior_min), 0.0) AS junior_min
+			, coalesce(max(m.junior_max), 0.0) AS junior_max
+			, sum(m.middle_cnt)::int AS middle_cnt
+			, coalesce(sum(m.middle_sum)/nullif(sum(m.middle_n), 0), 0.0) AS middle_avg
+			, coalesce(min(m.middle_min), 0.0) AS middle_min
+			, coalesce(max(m.middle_max), 0.0) AS middle_max
+			, sum(m.senior_cnt)::int AS senior_cnt
+			, coalesce(sum(m.senior_sum)/nullif(sum(m.senior_n), 0), 0.0) AS senior_avg
+			, coalesce(min(m.senior_min), 0.0) AS senior_min
+			, coalesce(max(m.senior_max), 0.0) AS senior_max
+			, sum(m.lead_cnt)::int AS lead_cnt
+			, coalesce(sum(m.lead_sum)/nullif(sum(m.lead_n), 0), 0.0) AS lead_avg
+			, coalesce(min(m.lead_min), 0.0) AS lead_min
+			, coalesce(max(m.lead_max), 0.0) AS lead_max
+			, sum(m.no_exp_cnt)::int AS no_exp_cnt
+			, coalesce(sum(m.no_exp_sum)/nullif(sum(m.no_exp_n), 0), 0.0) AS no_exp_avg
+			, coalesce(min(m.no_exp_min), 0.0) AS no_exp_min
+			, coalesce(max(m.no_exp_max), 0.0) AS no_exp_max
+			, sum(m.low_exp_cnt)::int AS low_exp_cnt
+			, coalesce(sum(m.low_exp_sum)/nullif(sum(m.low_exp_n), 0), 0.0) AS low_exp_avg
+			, coalesce(min(m.low_exp_min), 0.0) AS low_exp_min
+			, coalesce(max(m.low_exp_max), 0.0) AS low_exp_max
+			, sum(m.mid_exp_cnt)::int AS mid_exp_cnt
+			, coalesce(sum(m.mid_exp_sum)/nullif(sum(m.mid_exp_n), 0), 0.0) AS mid_exp_avg
+			, coalesce(min(m.mid_exp_min), 0.0) AS mid_exp_min
+			, coalesce(max(m.mid_exp_max), 0.0) AS mid_exp_max
+			, sum(m.high_exp_cnt)::int AS high_exp_cnt
+			, coalesce(sum(m.high_exp_sum)/nullif(sum(m.high_exp_n), 0), 0.0) AS high_exp_avg
+			, coalesce(min(m.high_exp_min), 0.0) AS high_exp_min
+			, coalesce(max(m.high_exp_max), 0.0) AS high_exp_max
 
-		, avg_salary AS	(	SELECT	  sv.vacancy_id
-									, coalesce((coalesce(salary_from, salary_to) + coalesce(salary_to, salary_from)/2), 0.0) AS avg_salary
-
-							FROM		core.sat_vacancy AS sv
-							JOIN		core.link_vacancy_salary AS lvs ON lvs.vacancy_id = sv.vacancy_id
-							JOIN		core.sat_salary AS ss ON ss.salary_id = lvs.salary_id)
-
-		, grade AS (	SELECT		  t.employer_name
-									, t.grade
-									, count(DISTINCT t.vacancy_id) AS cnt
-									, avg(avg_salary) AS avg
-									, min(avg_salary) AS min
-									, max(avg_salary) AS max
-						FROM		tbl AS t
-						JOIN		avg_salary AS av ON av.vacancy_id = t.vacancy_id
-						GROUP BY	  t.employer_name
-									, t.grade)
-
-		, expirience AS (	SELECT		  t.employer_name
-										, t.experience_name
-										, count(distinct t.vacancy_id) AS cnt
-										, avg(avg_salary) AS avg
-										, min(avg_salary) AS min
-										, max(avg_salary) AS max
-							FROM		tbl AS t
-							JOIN		avg_salary AS av ON av.vacancy_id = t.vacancy_id
-							GROUP BY	  t.employer_name
-										, t.experience_name)
-
-	SELECT	  row_number() OVER () AS id
-			, tbl.employer_name
-			, tbl.cnt_open
-			, tbl.cnt_salary
-			, tbl.avg_salary
-			, tbl.min_salary
-			, tbl.max_salary
-			, tbl.avg_salary/(CASE WHEN tbl.max_salary = 0 THEN 1 ELSE tbl.max_salary END) AS ratio
-			, coalesce(intern.cnt, 0.0) AS intern_cnt
-			, coalesce(intern.avg, 0.0) AS intern_avg
-			, coalesce(intern.min, 0.0) AS intern_min
-			, coalesce(intern.max, 0.0) AS intern_max
-			, coalesce(junior.cnt, 0.0) AS junior_cnt
-			, coalesce(junior.avg, 0.0) AS junior_avg
-			, coalesce(junior.min, 0.0) AS junior_min
-			, coalesce(junior.max, 0.0) AS junior_max
-			, coalesce(middle.cnt, 0.0) AS middle_cnt
-			, coalesce(middle.avg, 0.0) AS middle_avg
-			, coalesce(middle.min, 0.0) AS middle_min
-			, coalesce(middle.max, 0.0) AS middle_max
-			, coalesce(senior.cnt, 0.0) AS senior_cnt
-			, coalesce(senior.avg, 0.0) AS senior_avg
-			, coalesce(senior.min, 0.0) AS senior_min
-			, coalesce(senior.max, 0.0) AS senior_max
-			, coalesce(lead.cnt, 0.0) AS lead_cnt
-			, coalesce(lead.avg, 0.0) AS lead_avg
-			, coalesce(lead.min, 0.0) AS lead_min
-			, coalesce(lead.max, 0.0) AS lead_max
-			, coalesce(no_exp.cnt, 0.0) AS no_exp_cnt
-			, coalesce(no_exp.avg, 0.0) AS no_exp_avg
-			, coalesce(no_exp.min, 0.0) AS no_exp_min
-			, coalesce(no_exp.max, 0.0) AS no_exp_max
-			, coalesce(low_exp.cnt, 0.0) AS low_exp_cnt
-			, coalesce(low_exp.avg, 0.0) AS low_exp_avg
-			, coalesce(low_exp.min, 0.0) AS low_exp_min
-			, coalesce(low_exp.max, 0.0) AS low_exp_max
-			, coalesce(mid_exp.cnt, 0.0) AS mid_exp_cnt
-			, coalesce(mid_exp.avg, 0.0) AS mid_exp_avg
-			, coalesce(mid_exp.min, 0.0) AS mid_exp_min
-			, coalesce(mid_exp.max, 0.0) AS mid_exp_max
-			, coalesce(high_exp.cnt, 0.0) AS high_exp_cnt
-			, coalesce(high_exp.avg, 0.0) AS high_exp_avg
-			, coalesce(high_exp.min, 0.0) AS high_exp_min
-			, coalesce(high_exp.max, 0.0) AS high_exp_max
-
-	FROM	(	SELECT t.employer_name
-						, count(case when t.is_open = True then 1 end) as cnt_open
-						, count(case when t.salary_from <> 0 or salary_from <> 0 then 1 end) as cnt_salary
-						, coalesce(min(av.avg_salary), 0.0) as min_salary
-						, coalesce(max(av.avg_salary), 0.0) as max_salary
-						, coalesce(avg(av.avg_salary), 0.0) as avg_salary
-				FROM tbl as t
-				LEFT JOIN avg_salary as av ON av.vacancy_id = t.vacancy_id
-				GROUP BY	t.employer_name
-			) AS tbl
-
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Intern') AS intern ON intern.employer_name = tbl.employer_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Junior') AS junior ON junior.employer_name = tbl.employer_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Middle') AS middle ON middle.employer_name = tbl.employer_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Senior') AS senior ON senior.employer_name = tbl.employer_name
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Team Lead') AS lead ON lead.employer_name = tbl.employer_name
-
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'Нет опыта') AS no_exp ON no_exp.employer_name = tbl.employer_name
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'От 1 года до 3 лет') AS low_exp ON low_exp.employer_name = tbl.employer_name
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'От 3 до 6 лет') AS mid_exp ON mid_exp.employer_name = tbl.employer_name
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'Более 6 лет') AS high_exp ON high_exp.employer_name = tbl.employer_name
-
-	ORDER BY tbl.employer_name;
+	FROM		mart.vacancy_by_employer AS m
+	WHERE		m.type = ANY(filter)
+	GROUP BY	m.employer_name
+	ORDER BY	m.employer_name;
 $$ LANGUAGE SQL;
 
 CREATE OR REPLACE FUNCTION mart.get_vacancies()
@@ -557,122 +1300,380 @@ RETURNS TABLE (	  id int
 				, high_exp_max decimal
 			) AS $$
 
-	WITH tbl AS (	SELECT		  sv.vacancy_id
-								, sv.vacancy_name
-								, sv.is_open
-								, sv.grade
-								, sv.type
-								, sa.area_id
-								, sa.area_name
-								, se.experience_name
-								, ss.salary_from
-								, ss.salary_to
-					FROM		core.sat_vacancy AS sv
-					JOIN		core.link_vacancy_area AS lva ON lva.vacancy_id = sv.vacancy_id
-					JOIN		core.sat_area AS sa ON sa.area_id = lva.area_id
-					JOIN		core.link_vacancy_experience AS lve ON lve.vacancy_id = sv.vacancy_id
-					JOIN		core.sat_experience AS se ON se.experience_id = lve.experience_id
-					LEFT JOIN	core.link_vacancy_salary as lvs ON lvs.vacancy_id = sv.vacancy_id
-					LEFT JOIN	core.sat_salary as ss ON ss.salary_id = lvs.salary_id
-
-					WHERE		sv.type <> 'Another'
+	SELECT	  row_number() OVER (ORDER BY m.type) AS id
+			, m.type
+			, sum(m.cnt_open)::int AS cnt_open
+			, sum(m.cnt_salary)::int AS cnt_salary
+			, coalesce(sum(m.salary_sum)/nullif(sum(m.salary_n), 0), 0.0) AS avg_salary
+			, coalesce(min(m.salary_min), 0.0) AS min_salary
+			, coalesce(max(m.salary_max), 0.0) AS max_salary
+			, coalesce(sum(m.salary_sum)/nullif(sum(m.salary_n), 0), 0.0)/(CASE WHEN coalesce(max(m.salary_max), 0.0) = 0 THEN 1 ELSE max(m.salary_max) END) AS ratio
+			, sum(m.intern_cnt)::int AS intern_cnt
+			, coalesce(sum(m.intern_sum)/nullif(sum(m.intern_n), 0), 0.0) AS intern_avg
+			, coalesce(min(m.intern_min), 0.0) AS intern_min
+			, coalesce(max(m.intern_max), 0.0) AS intern_max
+			, sum(m.junior_cnt)::int AS junior_cnt
+			, coalesce(sum(m.junior_sum)/nullif(sum(m.junior_n), 0), 0.0) AS junior_avg
+			, coalesce(min(m.junior_min), 0.0) AS junior_min
+			, coalesce(max(m.junior_max), 0.0) AS junior_max
+			, sum(m.middle_cnt)::int AS middle_cnt
+			, coalesce(sum(m.middle_sum)/nullif(sum(m.middle_n), 0), 0.0) AS middle_avg
+			, coalesce(min(m.middle_min), 0.0) AS middle_min
+			, coalesce(max(m.middle_max), 0.0) AS middle_max
+			, sum(m.senior_cnt)::int AS senior_cnt
+			, coalesce(sum(m.senior_sum)/nullif(sum(m.senior_n), 0), 0.0) AS senior_avg
+			, coalesce(min(m.senior_min), 0.0) AS senior_min
+			, coalesce(max(m.senior_max), 0.0) AS senior_max
+			, sum(m.lead_cnt)::int AS lead_cnt
+			, coalesce(sum(m.lead_sum)/nullif(sum(m.lead_n), 0), 0.0) AS lead_avg
+			, coalesce(min(m.lead_min), 0.0) AS lead_min
+			, coalesce(max(m.lead_max), 0.0) AS lead_max
+			, sum(m.no_exp_cnt)::int AS no_exp_cnt
+			, coalesce(sum(m.no_exp_sum)/nullif(sum(m.no_exp_n), 0), 0.0) AS no_exp_avg
+			, coalesce(min(m.no_exp_min), 0.0) AS no_exp_min
+			, coalesce(max(m.no_exp_max), 0.0) AS no_exp_max
+			, sum(m.low_exp_cnt)::int AS low_exp_cnt
+			, coalesce(sum(m.low_exp_sum)/nullif(sum(m.low_exp_n), 0), 0.0) AS low_exp_avg
+			, coalesce(min(m.low_exp_min), 0.0) AS low_exp_min
+			, coalesce(max(m.low_exp_max), 0.0) AS low_exp_max
+			, sum(m.mid_exp_cnt)::int AS mid_exp_cnt
+			, coalesce(sum(m.mid_exp_sum)/nullif(sum(m.mid_exp_n), 0), 0.0) AS mid_exp_avg
+			, coalesce(min(m.mid_exp_min), 0.0) AS mid_exp_min
+			, coalesce(max(m.mid_exp_max), 0.0) AS mid_exp_max
+			, sum(m.high_exp_cnt)::int AS high_exp_cnt
+			, coalesce(sum(m.high_exp_sum)/nullif(sum(m.high_exp_n), 0), 0.0) AS high_exp_avg
+			, coalesce(min(m.high_exp_min), 0.0) AS high_exp_min
+			, coalesce(max(m.high_exp_max), 0.0) AS high_exp_max
+
+	FROM		mart.vacancy_by_region AS m
+	WHERE		m.type <> 'Another'
+	GROUP BY	m.type
+	ORDER BY	m.type;
+$$ LANGUAGE SQL;
+
+-- vacancies open on a day per type, grade, area and experience with a histogram of their salaries, see hh_parsing.snapshot.
+-- salary_buckets and salary_counts are a sparse histogram of log-sized buckets, histograms of several rows merge by adding
+-- the counts of equal buckets. '' stands for a missing grade, area or experience
+CREATE TABLE IF NOT EXISTS mart.vacancy_daily
+( snapshot_date date NOT NULL
+, type varchar NOT NULL
+, grade varchar NOT NULL
+, area_name varchar NOT NULL
+, experience_name varchar NOT NULL
+, cnt int NOT NULL
+, cnt_salary int NOT NULL
+, salary_sum decimal
+, salary_min decimal
+, salary_max decimal
+, salary_buckets smallint[] NOT NULL
+, salary_counts int[] NOT NULL
+
+, PRIMARY KEY (snapshot_date, type, grade, area_name, experience_name)
+);
+
+-- salary a histogram bucket stands for, the middle of the bucket. same buckets as hh_parsing.sketch
+CREATE OR REPLACE FUNCTION mart.salary_bucket_value(bucket int)
+RETURNS decimal AS $$
+	SELECT round((1000 * power(1.02, bucket) * (1 + 1.02) / 2)::numeric, 2);
+$$ LANGUAGE sql IMMUTABLE;
+
+-- salary percentiles of vacancies of the types in filter per day, week or month from date_from to date_to,
+-- optionally of some areas, grades and experiences only. the histograms of the period are merged, so a percentile is
+-- within 1% of the exact one and a vacancy open on several days of a period counts once for every day.
+-- cnt_open is the average number of open vacancies per snapshot day of the period
+CREATE OR REPLACE FUNCTION mart.get_salary_trend(	  filter varchar[]
+													, date_from date DEFAULT current_date - 180
+													, date_to date DEFAULT current_date
+													, period varchar DEFAULT 'day'
+													, areas varchar[] DEFAULT NULL
+													, grades varchar[] DEFAULT NULL
+													, experiences varchar[] DEFAULT NULL)
+RETURNS TABLE (	  period_start date
+				, days int
+				, cnt_open int
+				, cnt_salary bigint
+				, avg_salary decimal
+				, min_salary decimal
+				, max_salary decimal
+				, p10_salary decimal
+				, p25_salary decimal
+				, median_salary decimal
+				, p75_salary decimal
+				, p90_salary decimal
+			) AS $$
+
+	WITH snapshots AS (	SELECT		  date_trunc(period, d.snapshot_date)::date AS period_start
+									, d.*
+						FROM		mart.vacancy_daily AS d
+						WHERE		d.snapshot_date BETWEEN date_from AND date_to
+									AND d.type = ANY(filter)
+									AND (areas IS NULL OR d.area_name = ANY(areas))
+									AND (grades IS NULL OR d.grade = ANY(grades))
+									AND (experiences IS NULL OR d.experience_name = ANY(experiences))
+					)
+	, totals AS (	SELECT		  s.period_start
+								, count(DISTINCT s.snapshot_date)::int AS days
+								, sum(s.cnt) AS cnt
+								, sum(s.cnt_salary) AS cnt_salary
+								, sum(s.salary_sum) AS salary_sum
+								, min(s.salary_min) AS salary_min
+								, max(s.salary_max) AS salary_max
+					FROM		snapshots AS s
+					GROUP BY	s.period_start
 				)
+	, buckets AS (	SELECT		  s.period_start
+								, h.bucket
+								, sum(h.cnt) AS cnt
+					FROM		snapshots AS s
+					CROSS JOIN	LATERAL unnest(s.salary_buckets, s.salary_counts) AS h(bucket, cnt)
+					GROUP BY	  s.period_start
+								, h.bucket
+				)
+	, running AS (	SELECT		  b.period_start
+								, b.bucket
+								, sum(b.cnt) OVER (PARTITION BY b.period_start ORDER BY b.bucket) AS running
+								, sum(b.cnt) OVER (PARTITION BY b.period_start) AS total
+					FROM		buckets AS b
+				)
+	, percentiles AS (	SELECT		  r.period_start
+									, min(r.bucket) FILTER (WHERE r.running >= 0.1 * r.total) AS p10
+									, min(r.bucket) FILTER (WHERE r.running >= 0.25 * r.total) AS p25
+									, min(r.bucket) FILTER (WHERE r.running >= 0.5 * r.total) AS p50
+									, min(r.bucket) FILTER (WHERE r.running >= 0.75 * r.total) AS p75
+									, min(r.bucket) FILTER (WHERE r.running >= 0.9 * r.total) AS p90
+						FROM		running AS r
+						GROUP BY	r.period_start
+					)
+
+	SELECT	  t.period_start
+			, t.days
+			, round(t.cnt::decimal / t.days)::int AS cnt_open
+			, t.cnt_salary
+			, t.salary_sum / nullif(t.cnt_salary, 0) AS avg_salary
+			, t.salary_min
+			, t.salary_max
+			, mart.salary_bucket_value(p.p10)
+			, mart.salary_bucket_value(p.p25)
+			, mart.salary_bucket_value(p.p50)
+			, mart.salary_bucket_value(p.p75)
+			, mart.salary_bucket_value(p.p90)
+
+	FROM		totals AS t
+	LEFT JOIN	percentiles AS p ON p.period_start = t.period_start
+	ORDER BY	t.period_start;
+$$ LANGUAGE SQL STABLE;
+
+
+-- current vacancies with their current employer, area, experience and salary for mart.search_vacancies,
+-- kept up to date by mart.refresh_vacancy_search. deleted_at is set for vacancies no longer listed
+CREATE TABLE IF NOT EXISTS mart.vacancy_search
+( vacancy_hk uuid NOT NULL
+, vacancy_id varchar NOT NULL
+, vacancy_name varchar
+, employer_name varchar
+, area_name varchar
+, experience_name varchar
+, type varchar
+, grade varchar
+, salary_mid_gross_rub decimal
+, published_at timestamp
+, is_open bool
+, deleted_at timestamp
+, updated_at timestamp NOT NULL
+
+, PRIMARY KEY (vacancy_hk)
+);
+
+-- substring search on titles and employers, ILIKE '%...%' of at least 3 characters reads only the matching rows
+CREATE INDEX IF NOT EXISTS vacancy_search_name_trgm_idx ON mart.vacancy_search USING gin (vacancy_name gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS vacancy_search_employer_trgm_idx ON mart.vacancy_search USING gin (employer_name gin_trgm_ops);
+
+-- upsert the search rows of the vacancies changed by run: their satellites or links, or the satellites of their employer,
+-- area, experience or salary. full_refresh rebuilds the table from the whole core.
+-- rows whose values did not change are not rewritten, so the gin indexes only grow with real changes
+CREATE OR REPLACE FUNCTION mart.refresh_vacancy_search(full_refresh bool DEFAULT FALSE, run varchar DEFAULT NULL)
+RETURNS void AS $$
+BEGIN
+	IF full_refresh THEN
+		TRUNCATE mart.vacancy_search;
+	END IF;
+
+	INSERT INTO mart.vacancy_search AS trg
+	WITH changed AS (	SELECT		cl.vacancy_hk
+						FROM		core.change_log AS cl
+						WHERE		cl.run_id = run
+									AND cl.vacancy_hk IS NOT NULL
+						UNION
+						-- a new employer, area, experience or salary comes with a new link, only changed ones are looked up
+						SELECT		l.vacancy_hk
+						FROM		core.change_log AS cl
+						JOIN		core.link_vacancy_employer AS l ON l.employer_hk = cl.hk AND l.date_to IS NULL
+						WHERE		cl.run_id = run
+									AND cl.entity = 'sat_employer'
+									AND cl.change_type = 'changed'
+						UNION
+						SELECT		l.vacancy_hk
+						FROM		core.change_log AS cl
+						JOIN		core.link_vacancy_area AS l ON l.area_hk = cl.hk AND l.date_to IS NULL
+						WHERE		cl.run_id = run
+									AND cl.entity = 'sat_area'
+									AND cl.change_type = 'changed'
+						UNION
+						SELECT		l.vacancy_hk
+						FROM		core.change_log AS cl
+						JOIN		core.link_vacancy_experience AS l ON l.experience_hk = cl.hk AND l.date_to IS NULL
+						WHERE		cl.run_id = run
+									AND cl.entity = 'sat_experience'
+									AND cl.change_type = 'changed'
+						UNION
+						SELECT		l.vacancy_hk
+						FROM		core.change_log AS cl
+						JOIN		core.link_vacancy_salary AS l ON l.salary_hk = cl.hk AND l.date_to IS NULL
+						WHERE		cl.run_id = run
+									AND cl.entity = 'sat_salary'
+									AND cl.change_type = 'changed'
+					)
+
+	SELECT		  sv.vacancy_hk
+				, hv.external_id
+				, sv.vacancy_name
+				, se.employer_name
+				, sa.area_name
+				, sx.experience_name
+				, sv.type
+				, sv.grade
+				, ss.salary_mid_gross_rub
+				, sv.published_at
+				, sv.is_open
+				, sv.deleted_at
+				, now()
+	FROM		core.sat_vacancy AS sv
+	JOIN		core.hub_vacancy AS hv ON hv.vacancy_hk = sv.vacancy_hk
+	LEFT JOIN	LATERAL
+				(	SELECT	s.employer_name
+					FROM	core.link_vacancy_employer AS l
+					JOIN	core.sat_employer AS s ON s.employer_hk = l.employer_hk AND s.load_end_date IS NULL
+					WHERE	l.vacancy_hk = sv.vacancy_hk
+							AND l.date_to IS NULL
+					LIMIT	1
+				) AS se ON TRUE
+	LEFT JOIN	LATERAL
+				(	SELECT	s.area_name
+					FROM	core.link_vacancy_area AS l
+					JOIN	core.sat_area AS s ON s.area_hk = l.area_hk AND s.load_end_date IS NULL
+					WHERE	l.vacancy_hk = sv.vacancy_hk
+							AND l.date_to IS NULL
+					LIMIT	1
+				) AS sa ON TRUE
+	LEFT JOIN	LATERAL
+				(	SELECT	s.experience_name
+					FROM	core.link_vacancy_experience AS l
+					JOIN	core.sat_experience AS s ON s.experience_hk = l.experience_hk AND s.load_end_date IS NULL
+					WHERE	l.vacancy_hk = sv.vacancy_hk
+							AND l.date_to IS NULL
+					LIMIT	1
+				) AS sx ON TRUE
+	LEFT JOIN	LATERAL
+				(	SELECT	s.salary_mid_gross_rub
+					FROM	core.link_vacancy_salary AS l
+					JOIN	core.sat_salary AS s ON s.salary_hk = l.salary_hk AND s.load_end_date IS NULL
+					WHERE	l.vacancy_hk = sv.vacancy_hk
+							AND l.date_to IS NULL
+					LIMIT	1
+				) AS ss ON TRUE
+	WHERE		sv.load_end_date IS NULL
+				AND (full_refresh OR sv.vacancy_hk IN (SELECT c.vacancy_hk FROM changed AS c))
+
+	ON CONFLICT (vacancy_hk) DO UPDATE
+	SET		  vacancy_name = EXCLUDED.vacancy_name
+			, employer_name = EXCLUDED.employer_name
+			, area_name = EXCLUDED.area_name
+			, experience_name = EXCLUDED.experience_name
+			, type = EXCLUDED.type
+			, grade = EXCLUDED.grade
+			, salary_mid_gross_rub = EXCLUDED.salary_mid_gross_rub
+			, published_at = EXCLUDED.published_at
+			, is_open = EXCLUDED.is_open
+			, deleted_at = EXCLUDED.deleted_at
+			, updated_at = EXCLUDED.updated_at
+	WHERE	(trg.vacancy_name, trg.employer_name, trg.area_name, trg.experience_name, trg.type, trg.grade,
+			 trg.salary_mid_gross_rub, trg.published_at, trg.is_open, trg.deleted_at)
+			IS DISTINCT FROM
+			(EXCLUDED.vacancy_name, EXCLUDED.employer_name, EXCLUDED.area_name, EXCLUDED.experience_name, EXCLUDED.type, EXCLUDED.grade,
+			 EXCLUDED.salary_mid_gross_rub, EXCLUDED.published_at, EXCLUDED.is_open, EXCLUDED.deleted_at);
+END;
+$$ LANGUAGE plpgsql;
+
+-- ILIKE pattern of the values containing query, % and _ in query match themselves
+CREATE OR REPLACE FUNCTION mart.like_pattern(query varchar)
+RETURNS varchar AS $$
+	SELECT '%' || replace(replace(replace(query, '\', '\\'), '%', '\%'), '_', '\_') || '%';
+$$ LANGUAGE sql IMMUTABLE;
+
+-- vacancies whose title or employer contains query, case-insensitive, optionally of some types, areas, grades and experiences
+-- and with a salary of at least salary_from. vacancies no longer listed are left out unless with_deleted.
+-- every match contains query, so title matches rank above employer matches and among them by the share of the title
+-- or employer query takes, 1 for the exact title. newer vacancies come first among equal ranks,
+-- page_no counts from 1 and total is the number of matches on all pages.
+-- a query of 3 characters and more is looked up in the trigram indexes, shorter ones read the whole table.
+-- an empty query matches nothing
+CREATE OR REPLACE FUNCTION mart.search_vacancies(	  query varchar
+													, filter varchar[] DEFAULT NULL
+													, areas varchar[] DEFAULT NULL
+													, grades varchar[] DEFAULT NULL
+													, experiences varchar[] DEFAULT NULL
+													, salary_from decimal DEFAULT NULL
+													, with_deleted bool DEFAULT FALSE
+													, page_size int DEFAULT 20
+													, page_no int DEFAULT 1)
+RETURNS TABLE (	  vacancy_id varchar
+				, vacancy_name varchar
+				, employer_name varchar
+				, area_name varchar
+				, experience_name varchar
+				, type varchar
+				, grade varchar
+				, salary decimal
+				, published_at timestamp
+				, deleted_at timestamp
+				, rank real
+				, total bigint
+			) AS $$
+
+	-- the function is inlined into the calling query, so query is a constant there and the pattern can use the indexes
+	WITH matches AS (	SELECT		  s.*
+									, CASE WHEN s.vacancy_name ILIKE mart.like_pattern(query)
+										   THEN 0.5 + 0.5 * length(query) / nullif(length(s.vacancy_name), 0)
+										   ELSE 0.5 * length(query) / nullif(length(s.employer_name), 0)
+									  END::real AS rank
+						FROM		mart.vacancy_search AS s
+						WHERE		query <> ''
+									AND (s.vacancy_name ILIKE mart.like_pattern(query) OR s.employer_name ILIKE mart.like_pattern(query))
+									AND (with_deleted OR s.deleted_at IS NULL)
+									AND (filter IS NULL OR s.type = ANY(filter))
+									AND (areas IS NULL OR s.area_name = ANY(areas))
+									AND (grades IS NULL OR s.grade = ANY(grades))
+									AND (experiences IS NULL OR s.experience_name = ANY(experiences))
+									AND (salary_from IS NULL OR s.salary_mid_gross_rub >= salary_from)
+					)
+
+	SELECT	  m.vacancy_id
+			, m.vacancy_name
+			, m.employer_name
+			, m.area_name
+			, m.experience_name
+			, m.type
+			, m.grade
+			, m.salary_mid_gross_rub
+			, m.published_at
+			, m.deleted_at
+			, m.rank
+			, count(*) OVER ()
 
-		, avg_salary AS	(	SELECT	  sv.vacancy_id
-									, coalesce((coalesce(salary_from, salary_to) + coalesce(salary_to, salary_from)/2), 0.0) AS avg_salary
-
-							FROM		core.sat_vacancy AS sv
-							JOIN		core.link_vacancy_salary AS lvs ON lvs.vacancy_id = sv.vacancy_id
-							JOIN		core.sat_salary AS ss ON ss.salary_id = lvs.salary_id)
-
-		, grade AS (	SELECT		  t.type
-									, t.grade
-									, count(DISTINCT t.vacancy_id) AS cnt
-									, avg(avg_salary) AS avg
-									, min(avg_salary) AS min
-									, max(avg_salary) AS max
-						FROM		tbl AS t
-						JOIN		avg_salary AS av ON av.vacancy_id = t.vacancy_id
-						GROUP BY	  t.type
-									, t.grade)
-
-		, expirience AS (	SELECT		  t.type
-										, t.experience_name
-										, count(distinct t.vacancy_id) AS cnt
-										, avg(avg_salary) AS avg
-										, min(avg_salary) AS min
-										, max(avg_salary) AS max
-							FROM		tbl AS t
-							JOIN		avg_salary AS av ON av.vacancy_id = t.vacancy_id
-							GROUP BY	  t.type
-										, t.experience_name)
-
-	SELECT	  row_number() OVER () AS id
-			, tbl.type
-			, tbl.cnt_open
-			, tbl.cnt_salary
-			, tbl.avg_salary
-			, tbl.min_salary
-			, tbl.max_salary
-			, tbl.avg_salary/(CASE WHEN tbl.max_salary = 0 THEN 1 ELSE tbl.max_salary END) AS ratio
-			, coalesce(intern.cnt, 0.0) AS intern_cnt
-			, coalesce(intern.avg, 0.0) AS intern_avg
-			, coalesce(intern.min, 0.0) AS intern_min
-			, coalesce(intern.max, 0.0) AS intern_max
-			, coalesce(junior.cnt, 0.0) AS junior_cnt
-			, coalesce(junior.avg, 0.0) AS junior_avg
-			, coalesce(junior.min, 0.0) AS junior_min
-			, coalesce(junior.max, 0.0) AS junior_max
-			, coalesce(middle.cnt, 0.0) AS middle_cnt
-			, coalesce(middle.avg, 0.0) AS middle_avg
-			, coalesce(middle.min, 0.0) AS middle_min
-			, coalesce(middle.max, 0.0) AS middle_max
-			, coalesce(senior.cnt, 0.0) AS senior_cnt
-			, coalesce(senior.avg, 0.0) AS senior_avg
-			, coalesce(senior.min, 0.0) AS senior_min
-			, coalesce(senior.max, 0.0) AS senior_max
-			, coalesce(lead.cnt, 0.0) AS lead_cnt
-			, coalesce(lead.avg, 0.0) AS lead_avg
-			, coalesce(lead.min, 0.0) AS lead_min
-			, coalesce(lead.max, 0.0) AS lead_max
-			, coalesce(no_exp.cnt, 0.0) AS no_exp_cnt
-			, coalesce(no_exp.avg, 0.0) AS no_exp_avg
-			, coalesce(no_exp.min, 0.0) AS no_exp_min
-			, coalesce(no_exp.max, 0.0) AS no_exp_max
-			, coalesce(low_exp.cnt, 0.0) AS low_exp_cnt
-			, coalesce(low_exp.avg, 0.0) AS low_exp_avg
-			, coalesce(low_exp.min, 0.0) AS low_exp_min
-			, coalesce(low_exp.max, 0.0) AS low_exp_max
-			, coalesce(mid_exp.cnt, 0.0) AS mid_exp_cnt
-			, coalesce(mid_exp.avg, 0.0) AS mid_exp_avg
-			, coalesce(mid_exp.min, 0.0) AS mid_exp_min
-			, coalesce(mid_exp.max, 0.0) AS mid_exp_max
-			, coalesce(high_exp.cnt, 0.0) AS high_exp_cnt
-			, coalesce(high_exp.avg, 0.0) AS high_exp_avg
-			, coalesce(high_exp.min, 0.0) AS high_exp_min
-			, coalesce(high_exp.max, 0.0) AS high_exp_max
-
-	FROM	(	SELECT		  t.type
-							, count(CASE WHEN t.is_open = True THEN 1 END) AS cnt_open
-							, count(CASE WHEN t.salary_from <> 0 OR salary_from <> 0 THEN 1 END) AS cnt_salary
-							, coalesce(min(av.avg_salary), 0.0) AS min_salary
-							, coalesce(max(av.avg_salary), 0.0) AS max_salary
-							, coalesce(avg(av.avg_salary), 0.0) AS avg_salary
-				FROM		tbl AS t
-				LEFT JOIN	avg_salary as av ON av.vacancy_id = t.vacancy_id
-				GROUP BY	t.type
-			) AS tbl
-
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Intern') AS intern ON intern.type = tbl.type
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Junior') AS junior ON junior.type = tbl.type
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Middle') AS middle ON middle.type = tbl.type
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Senior') AS senior ON senior.type = tbl.type
-	LEFT JOIN (SELECT * FROM grade WHERE grade = 'Team Lead') AS lead ON lead.type = tbl.type
-
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'Нет опыта') AS no_exp ON no_exp.type = tbl.type
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'От 1 года до 3 лет') AS low_exp ON low_exp.type = tbl.type
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'От 3 до 6 лет') AS mid_exp ON mid_exp.type = tbl.type
-	LEFT JOIN (SELECT * FROM expirience WHERE experience_name = 'Более 6 лет') AS high_exp ON high_exp.type = tbl.type
-
-	ORDER BY tbl.type;
-$$ LANGUAGE SQL;
\ No newline at end of file
+	FROM		matches AS m
+	ORDER BY	  m.rank DESC
+				, m.published_at DESC
+				, m.vacancy_id
+	LIMIT		page_size
+	OFFSET		(page_no - 1) * page_size;
+$$ LANGUAGE SQL STABLE;
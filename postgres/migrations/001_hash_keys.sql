@@ -0,0 +1,158 @@
+-- serial surrogate keys -> md5 hash keys computed from the business keys.
+-- hub hash key: md5(external_id)::uuid, link hash key: md5(concat_ws('|', vacancy external_id, external_id))::uuid,
+-- the same values hh_parsing.keys computes during the transform.
+-- apply with psql before re-running postgres/init/init.sql
+
+BEGIN;
+
+ALTER TABLE stage.vacancy
+    ADD COLUMN IF NOT EXISTS vacancy_hk uuid
+  , ADD COLUMN IF NOT EXISTS employer_hk uuid
+  , ADD COLUMN IF NOT EXISTS experience_hk uuid
+  , ADD COLUMN IF NOT EXISTS area_hk uuid
+  , ADD COLUMN IF NOT EXISTS salary_hk uuid
+  , ADD COLUMN IF NOT EXISTS vacancy_employer_hk uuid
+  , ADD COLUMN IF NOT EXISTS vacancy_experience_hk uuid
+  , ADD COLUMN IF NOT EXISTS vacancy_area_hk uuid
+  , ADD COLUMN IF NOT EXISTS vacancy_salary_hk uuid;
+
+-- hubs
+ALTER TABLE core.hub_vacancy ADD COLUMN vacancy_hk uuid;
+UPDATE core.hub_vacancy SET vacancy_hk = md5(external_id)::uuid;
+ALTER TABLE core.hub_employer ADD COLUMN employer_hk uuid;
+UPDATE core.hub_employer SET employer_hk = md5(external_id)::uuid;
+ALTER TABLE core.hub_experience ADD COLUMN experience_hk uuid;
+UPDATE core.hub_experience SET experience_hk = md5(external_id)::uuid;
+ALTER TABLE core.hub_area ADD COLUMN area_hk uuid;
+UPDATE core.hub_area SET area_hk = md5(external_id)::uuid;
+ALTER TABLE core.hub_salary ADD COLUMN salary_hk uuid;
+UPDATE core.hub_salary SET salary_hk = md5(external_id)::uuid;
+
+-- satellites
+ALTER TABLE core.sat_vacancy ADD COLUMN vacancy_hk uuid;
+UPDATE  core.sat_vacancy AS s
+SET     vacancy_hk = h.vacancy_hk
+FROM    core.hub_vacancy AS h
+WHERE   h.vacancy_id = s.vacancy_id;
+ALTER TABLE core.sat_vacancy DROP COLUMN vacancy_id;
+ALTER TABLE core.sat_vacancy ALTER COLUMN vacancy_hk SET NOT NULL, ADD PRIMARY KEY (vacancy_hk);
+ALTER TABLE core.sat_employer ADD COLUMN employer_hk uuid;
+UPDATE  core.sat_employer AS s
+SET     employer_hk = h.employer_hk
+FROM    core.hub_employer AS h
+WHERE   h.employer_id = s.employer_id;
+ALTER TABLE core.sat_employer DROP COLUMN employer_id;
+ALTER TABLE core.sat_employer ALTER COLUMN employer_hk SET NOT NULL, ADD PRIMARY KEY (employer_hk);
+ALTER TABLE core.sat_experience ADD COLUMN experience_hk uuid;
+UPDATE  core.sat_experience AS s
+SET     experience_hk = h.experience_hk
+FROM    core.hub_experience AS h
+WHERE   h.experience_id = s.experience_id;
+ALTER TABLE core.sat_experience DROP COLUMN experience_id;
+ALTER TABLE core.sat_experience ALTER COLUMN experience_hk SET NOT NULL, ADD PRIMARY KEY (experience_hk);
+ALTER TABLE core.sat_area ADD COLUMN area_hk uuid;
+UPDATE  core.sat_area AS s
+SET     area_hk = h.area_hk
+FROM    core.hub_area AS h
+WHERE   h.area_id = s.area_id;
+ALTER TABLE core.sat_area DROP COLUMN area_id;
+ALTER TABLE core.sat_area ALTER COLUMN area_hk SET NOT NULL, ADD PRIMARY KEY (area_hk);
+ALTER TABLE core.sat_salary ADD COLUMN salary_hk uuid;
+UPDATE  core.sat_salary AS s
+SET     salary_hk = h.salary_hk
+FROM    core.hub_salary AS h
+WHERE   h.salary_id = s.salary_id;
+ALTER TABLE core.sat_salary DROP COLUMN salary_id;
+ALTER TABLE core.sat_salary ALTER COLUMN salary_hk SET NOT NULL, ADD PRIMARY KEY (salary_hk);
+
+-- links, duplicate pairs keep the earliest row
+ALTER TABLE core.link_vacancy_employer ADD COLUMN link_hk uuid, ADD COLUMN vacancy_hk uuid, ADD COLUMN employer_hk uuid;
+UPDATE  core.link_vacancy_employer AS l
+SET       link_hk = md5(concat_ws('|', hv.external_id, h.external_id))::uuid
+        , vacancy_hk = hv.vacancy_hk
+        , employer_hk = h.employer_hk
+FROM    core.hub_vacancy AS hv
+      , core.hub_employer AS h
+WHERE   hv.vacancy_id = l.vacancy_id
+        AND h.employer_id = l.employer_id;
+DELETE FROM core.link_vacancy_employer AS l
+USING   core.link_vacancy_employer AS d
+WHERE   d.link_hk = l.link_hk
+        AND (d.date_from, d.link_id) < (l.date_from, l.link_id);
+ALTER TABLE core.link_vacancy_employer DROP COLUMN link_id, DROP COLUMN vacancy_id, DROP COLUMN employer_id;
+ALTER TABLE core.link_vacancy_employer
+    ALTER COLUMN link_hk SET NOT NULL
+  , ALTER COLUMN vacancy_hk SET NOT NULL
+  , ALTER COLUMN employer_hk SET NOT NULL
+  , ADD PRIMARY KEY (link_hk);
+ALTER TABLE core.link_vacancy_experience ADD COLUMN link_hk uuid, ADD COLUMN vacancy_hk uuid, ADD COLUMN experience_hk uuid;
+UPDATE  core.link_vacancy_experience AS l
+SET       link_hk = md5(concat_ws('|', hv.external_id, h.external_id))::uuid
+        , vacancy_hk = hv.vacancy_hk
+        , experience_hk = h.experience_hk
+FROM    core.hub_vacancy AS hv
+      , core.hub_experience AS h
+WHERE   hv.vacancy_id = l.vacancy_id
+        AND h.experience_id = l.experience_id;
+DELETE FROM core.link_vacancy_experience AS l
+USING   core.link_vacancy_experience AS d
+WHERE   d.link_hk = l.link_hk
+        AND (d.date_from, d.link_id) < (l.date_from, l.link_id);
+ALTER TABLE core.link_vacancy_experience DROP COLUMN link_id, DROP COLUMN vacancy_id, DROP COLUMN experience_id;
+ALTER TABLE core.link_vacancy_experience
+    ALTER COLUMN link_hk SET NOT NULL
+  , ALTER COLUMN vacancy_hk SET NOT NULL
+  , ALTER COLUMN experience_hk SET NOT NULL
+  , ADD PRIMARY KEY (link_hk);
+ALTER TABLE core.link_vacancy_area ADD COLUMN link_hk uuid, ADD COLUMN vacancy_hk uuid, ADD COLUMN area_hk uuid;
+UPDATE  core.link_vacancy_area AS l
+SET       link_hk = md5(concat_ws('|', hv.external_id, h.external_id))::uuid
+        , vacancy_hk = hv.vacancy_hk
+        , area_hk = h.area_hk
+FROM    core.hub_vacancy AS hv
+      , core.hub_area AS h
+WHERE   hv.vacancy_id = l.vacancy_id
+        AND h.area_id = l.area_id;
+DELETE FROM core.link_vacancy_area AS l
+USING   core.link_vacancy_area AS d
+WHERE   d.link_hk = l.link_hk
+        AND (d.date_from, d.link_id) < (l.date_from, l.link_id);
+ALTER TABLE core.link_vacancy_area DROP COLUMN link_id, DROP COLUMN vacancy_id, DROP COLUMN area_id;
+ALTER TABLE core.link_vacancy_area
+    ALTER COLUMN link_hk SET NOT NULL
+  , ALTER COLUMN vacancy_hk SET NOT NULL
+  , ALTER COLUMN area_hk SET NOT NULL
+  , ADD PRIMARY KEY (link_hk);
+ALTER TABLE core.link_vacancy_salary ADD COLUMN link_hk uuid, ADD COLUMN vacancy_hk uuid, ADD COLUMN salary_hk uuid;
+UPDATE  core.link_vacancy_salary AS l
+SET       link_hk = md5(concat_ws('|', hv.external_id, h.external_id))::uuid
+        , vacancy_hk = hv.vacancy_hk
+        , salary_hk = h.salary_hk
+FROM    core.hub_vacancy AS hv
+      , core.hub_salary AS h
+WHERE   hv.vacancy_id = l.vacancy_id
+        AND h.salary_id = l.salary_id;
+DELETE FROM core.link_vacancy_salary AS l
+USING   core.link_vacancy_salary AS d
+WHERE   d.link_hk = l.link_hk
+        AND (d.date_from, d.link_id) < (l.date_from, l.link_id);
+ALTER TABLE core.link_vacancy_salary DROP COLUMN link_id, DROP COLUMN vacancy_id, DROP COLUMN salary_id;
+ALTER TABLE core.link_vacancy_salary
+    ALTER COLUMN link_hk SET NOT NULL
+  , ALTER COLUMN vacancy_hk SET NOT NULL
+  , ALTER COLUMN salary_hk SET NOT NULL
+  , ADD PRIMARY KEY (link_hk);
+
+-- hubs lose the serial keys last, after nothing references them
+ALTER TABLE core.hub_vacancy DROP COLUMN vacancy_id;
+ALTER TABLE core.hub_vacancy ALTER COLUMN vacancy_hk SET NOT NULL, ADD PRIMARY KEY (vacancy_hk);
+ALTER TABLE core.hub_employer DROP COLUMN employer_id;
+ALTER TABLE core.hub_employer ALTER COLUMN employer_hk SET NOT NULL, ADD PRIMARY KEY (employer_hk);
+ALTER TABLE core.hub_experience DROP COLUMN experience_id;
+ALTER TABLE core.hub_experience ALTER COLUMN experience_hk SET NOT NULL, ADD PRIMARY KEY (experience_hk);
+ALTER TABLE core.hub_area DROP COLUMN area_id;
+ALTER TABLE core.hub_area ALTER COLUMN area_hk SET NOT NULL, ADD PRIMARY KEY (area_hk);
+ALTER TABLE core.hub_salary DROP COLUMN salary_id;
+ALTER TABLE core.hub_salary ALTER COLUMN salary_hk SET NOT NULL, ADD PRIMARY KEY (salary_hk);
+
+COMMIT;
@@ -0,0 +1,6 @@
+-- type and grade are classified by hh_parsing.classify from proc.vacancy_rules and loaded with the stage rows.
+-- apply with psql before re-running postgres/init/init.sql, which creates and fills proc.vacancy_rules
+
+ALTER TABLE stage.vacancy
+    ADD COLUMN IF NOT EXISTS type varchar
+  , ADD COLUMN IF NOT EXISTS grade varchar;
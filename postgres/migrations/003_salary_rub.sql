@@ -0,0 +1,11 @@
+-- salaries normalized to monthly RUR with core.ref_exchange_rate, computed once per salary row by load_sat_salary.
+-- apply with psql before re-running postgres/init/init.sql. existing rows keep the new columns empty until a load
+-- sees their salary with a rate and adds a converted version
+
+ALTER TABLE core.sat_salary
+    ADD COLUMN IF NOT EXISTS exchange_rate decimal
+  , ADD COLUMN IF NOT EXISTS salary_from_gross_rub decimal
+  , ADD COLUMN IF NOT EXISTS salary_to_gross_rub decimal
+  , ADD COLUMN IF NOT EXISTS salary_from_net_rub decimal
+  , ADD COLUMN IF NOT EXISTS salary_to_net_rub decimal
+  , ADD COLUMN IF NOT EXISTS salary_mid_gross_rub decimal;
@@ -0,0 +1,86 @@
+-- core.sat_vacancy partitioned by month of published_at, core.link_vacancy_* by month of date_from.
+-- moves the rows of the existing tables to the default partitions of the new ones. apply with psql before
+-- re-running postgres/init/init.sql, which creates the indexes and moves the rows into monthly partitions
+
+BEGIN;
+
+DO $$
+DECLARE
+	tbl varchar;
+BEGIN
+	FOREACH tbl IN ARRAY ARRAY['sat_vacancy', 'link_vacancy_employer', 'link_vacancy_experience',
+							   'link_vacancy_area', 'link_vacancy_salary'] LOOP
+		CONTINUE WHEN (SELECT c.relkind FROM pg_class AS c WHERE c.oid = to_regclass('core.' || tbl)) IS DISTINCT FROM 'r';
+		EXECUTE format('ALTER TABLE core.%I RENAME TO %I', tbl, tbl || '_unpartitioned');
+		EXECUTE format('ALTER INDEX core.%I RENAME TO %I', tbl || '_pkey', tbl || '_unpartitioned_pkey');
+	END LOOP;
+END;
+$$;
+
+DROP INDEX IF EXISTS core.link_vacancy_employer_vacancy_hk_idx
+				   , core.link_vacancy_employer_employer_hk_idx
+				   , core.link_vacancy_employer_open_idx
+				   , core.link_vacancy_experience_vacancy_hk_idx
+				   , core.link_vacancy_experience_experience_hk_idx
+				   , core.link_vacancy_experience_open_idx
+				   , core.link_vacancy_area_vacancy_hk_idx
+				   , core.link_vacancy_area_area_hk_idx
+				   , core.link_vacancy_area_open_idx
+				   , core.link_vacancy_salary_vacancy_hk_idx
+				   , core.link_vacancy_salary_salary_hk_idx
+				   , core.link_vacancy_salary_open_idx;
+
+CREATE TABLE IF NOT EXISTS core.sat_vacancy
+( vacancy_hk uuid NOT NULL
+, record_source varchar NOT NULL
+, load_date timestamp NOT NULL
+, vacancy_name varchar
+, published_at timestamp
+, is_archive bool
+, is_open bool
+, type varchar
+, grade varchar
+, created_at timestamp
+, updated_at timestamp
+, deleted_at timestamp
+
+, PRIMARY KEY (vacancy_hk, published_at)
+) PARTITION BY RANGE (published_at);
+
+CREATE TABLE IF NOT EXISTS core.sat_vacancy_default PARTITION OF core.sat_vacancy DEFAULT;
+
+DO $$
+DECLARE
+	x varchar;
+BEGIN
+	FOREACH x IN ARRAY ARRAY['employer', 'experience', 'area', 'salary'] LOOP
+		EXECUTE format('CREATE TABLE IF NOT EXISTS core.%I
+						( link_hk uuid NOT NULL
+						, vacancy_hk uuid NOT NULL
+						, %I uuid NOT NULL
+						, date_from timestamp NOT NULL
+						, date_to timestamp
+
+						, PRIMARY KEY (link_hk, date_from)
+						) PARTITION BY RANGE (date_from)', 'link_vacancy_' || x, x || '_hk');
+		EXECUTE format('CREATE TABLE IF NOT EXISTS core.%I PARTITION OF core.%I DEFAULT',
+					   'link_vacancy_' || x || '_default', 'link_vacancy_' || x);
+		IF to_regclass('core.link_vacancy_' || x || '_unpartitioned') IS NOT NULL THEN
+			EXECUTE format('INSERT INTO core.%I (link_hk, vacancy_hk, %I, date_from, date_to)
+							SELECT link_hk, vacancy_hk, %I, date_from, date_to FROM core.%I',
+						   'link_vacancy_' || x, x || '_hk', x || '_hk', 'link_vacancy_' || x || '_unpartitioned');
+			EXECUTE format('DROP TABLE core.%I', 'link_vacancy_' || x || '_unpartitioned');
+		END IF;
+	END LOOP;
+
+	IF to_regclass('core.sat_vacancy_unpartitioned') IS NOT NULL THEN
+		INSERT INTO core.sat_vacancy
+		SELECT	  vacancy_hk, record_source, load_date, vacancy_name, COALESCE(published_at, created_at, load_date), is_archive, is_open
+				, type, grade, created_at, updated_at, deleted_at
+		FROM	core.sat_vacancy_unpartitioned;
+		DROP TABLE core.sat_vacancy_unpartitioned;
+	END IF;
+END;
+$$;
+
+COMMIT;
@@ -0,0 +1,47 @@
+-- satellites keep every version of their payload: rows are (hash key, load_date) with the hashdiff of the payload
+-- computed in hh_parsing.keys, the current version has load_end_date NULL. apply with psql before re-running
+-- postgres/init/init.sql. existing rows get no hashdiff, so the next load of an entity adds one new version of it
+
+ALTER TABLE stage.vacancy
+    ADD COLUMN IF NOT EXISTS vacancy_hd uuid
+  , ADD COLUMN IF NOT EXISTS employer_hd uuid
+  , ADD COLUMN IF NOT EXISTS experience_hd uuid
+  , ADD COLUMN IF NOT EXISTS area_hd uuid
+  , ADD COLUMN IF NOT EXISTS salary_hd uuid;
+
+ALTER TABLE core.sat_vacancy
+    ADD COLUMN IF NOT EXISTS load_end_date timestamp
+  , ADD COLUMN IF NOT EXISTS hash_diff uuid
+  , DROP COLUMN IF EXISTS updated_at
+  , DROP CONSTRAINT IF EXISTS sat_vacancy_pkey
+  , ADD PRIMARY KEY (vacancy_hk, load_date, published_at);
+
+DROP INDEX IF EXISTS core.sat_vacancy_expiry_idx;
+
+ALTER TABLE core.sat_employer
+    ADD COLUMN IF NOT EXISTS load_end_date timestamp
+  , ADD COLUMN IF NOT EXISTS hash_diff uuid
+  , DROP COLUMN IF EXISTS updated_at
+  , DROP CONSTRAINT IF EXISTS sat_employer_pkey
+  , ADD PRIMARY KEY (employer_hk, load_date);
+
+ALTER TABLE core.sat_experience
+    ADD COLUMN IF NOT EXISTS load_end_date timestamp
+  , ADD COLUMN IF NOT EXISTS hash_diff uuid
+  , DROP COLUMN IF EXISTS updated_at
+  , DROP CONSTRAINT IF EXISTS sat_experience_pkey
+  , ADD PRIMARY KEY (experience_hk, load_date);
+
+ALTER TABLE core.sat_area
+    ADD COLUMN IF NOT EXISTS load_end_date timestamp
+  , ADD COLUMN IF NOT EXISTS hash_diff uuid
+  , DROP COLUMN IF EXISTS updated_at
+  , DROP CONSTRAINT IF EXISTS sat_area_pkey
+  , ADD PRIMARY KEY (area_hk, load_date);
+
+ALTER TABLE core.sat_salary
+    ADD COLUMN IF NOT EXISTS load_end_date timestamp
+  , ADD COLUMN IF NOT EXISTS hash_diff uuid
+  , DROP COLUMN IF EXISTS updated_at
+  , DROP CONSTRAINT IF EXISTS sat_salary_pkey
+  , ADD PRIMARY KEY (salary_hk, load_date);
@@ -0,0 +1,11 @@
+-- stage.vacancy becomes a table partitioned by run_id with an unlogged partition per dag run.
+-- stage only holds data of unfinished runs, the old table is dropped and postgres/init/init.sql recreates it,
+-- so apply with psql before re-running init.sql
+
+DO $$
+BEGIN
+	IF (SELECT c.relkind FROM pg_class AS c WHERE c.oid = to_regclass('stage.vacancy')) = 'r' THEN
+		DROP TABLE stage.vacancy;
+	END IF;
+END;
+$$;
@@ -0,0 +1,16 @@
+-- proc.vacancy_detail_state.marker becomes proc.detail_marker of the search payload instead of vacancy_hd.
+-- the markers of details fetched for the current version of a vacancy are converted, so the change fetches nothing again.
+-- the expression is the body of proc.detail_marker, which postgres/init/init.sql creates
+
+DO $$
+BEGIN
+	IF to_regclass('proc.vacancy_detail_state') IS NOT NULL THEN
+		UPDATE	proc.vacancy_detail_state AS s
+		SET		marker = md5(concat_ws('|', sv.vacancy_name, sv.published_at, sv.is_archive, sv.is_open))::uuid
+		FROM	core.sat_vacancy AS sv
+		WHERE	sv.vacancy_hk = s.vacancy_hk
+				AND sv.load_end_date IS NULL
+				AND sv.hash_diff = s.marker;
+	END IF;
+END;
+$$;